@@ -1,8 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Response
+from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
+from ai.cache import response_cache
+from ai.files import file_registry
+from ai.governor import governor
+from ai.limits import rate_limiter, usage_meter
+from ai.semantic_cache import semantic_cache
+from authz import access_cache
+from courses import CourseOut
 from deps import get_db, require_role
-from models import User, Course, Enrollment, Lesson, Quiz, QuizAttempt
+from extraction import chat_texts
+from grading_cache import grading_cache
+from hashing import hasher
+from pagination import PageParams, apply_filters, apply_search, keyset_page, page_params, project, select_fields
+from question_bank import delete_lesson_quizzes
+import auth_sessions
+import course_progress
+import student_stats
+from quiz_jobs import job_queue
+from security import invalidate_user, mark_sessions_revoked, session_cache, token_cache, user_cache
+from models import User, Course, Enrollment, Lesson, QuizAttempt
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -22,10 +42,50 @@ def stats(db: Session = Depends(get_db), user=Depends(require_role("admin"))):
     }
 
 
+@router.get("/metrics")
+def metrics(user=Depends(require_role("admin"))):
+    # in-process cache counters (per worker)
+    return {
+        "ai_response_cache": response_cache.stats(),
+        "ai_semantic_cache": semantic_cache.stats(),
+        "gemini_file_registry": file_registry.stats(),
+        "chat_text_cache": chat_texts.stats(),
+        "quiz_job_queue_depth": job_queue.depth(),
+        "grading_plan_cache": grading_cache.stats(),
+        "authz_cache": access_cache.stats(),
+        "token_cache": token_cache.stats(),
+        "user_profile_cache": user_cache.stats(),
+        "session_cache": session_cache.stats(),
+        "password_hashing": hasher.stats(),
+        "ai_rate_limit": rate_limiter.stats(),
+        "ai_usage": usage_meter.stats(),
+        "llm_governor": governor.stats(),
+    }
+
+
+USER_FIELDS = {"id": User.id, "email": User.email, "role": User.role, "plan": User.plan}
+COURSE_FIELDS = {"id": Course.id, "title": Course.title, "subject": Course.subject, "teacher_email": Course.teacher_email}
+
+
 @router.get("/users")
-def users(db: Session = Depends(get_db), user=Depends(require_role("admin"))):
-    rows = db.query(User).all()
-    return [{"id": u.id, "email": u.email, "role": u.role} for u in rows]
+def users(
+    response: Response,
+    role: Optional[str] = None,
+    q: Optional[str] = None,
+    page: PageParams = Depends(page_params(default_limit=100)),
+    db: Session = Depends(get_db),
+    user=Depends(require_role("admin")),
+):
+    names = select_fields(page.fields, USER_FIELDS, default=["id", "email", "role"])
+    query = db.query(*[USER_FIELDS[n].label(n) for n in names])
+    query = apply_filters(query, {User.role: role})
+    query = apply_search(query, [User.email], q)
+    rows, next_cursor = keyset_page(query, [(User.id, "asc")], page)
+
+    # body stays a plain list for the admin UI; the cursor goes in a header
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [project(r, names) for r in rows]
 
 
 @router.patch("/users/{user_id}/role")
@@ -45,13 +105,30 @@ def change_role(
 
     u.role = new_role
     db.commit()
+    invalidate_user(u.email)
     return {"message": "Role updated", "id": u.id, "email": u.email, "role": u.role}
 
 
-@router.get("/courses")
-def courses(db: Session = Depends(get_db), user=Depends(require_role("admin"))):
-    rows = db.query(Course).all()
-    return {"courses": rows}
+class AdminCourseListOut(BaseModel):
+    courses: List[CourseOut]
+    next_cursor: Optional[str] = None
+
+
+@router.get("/courses", response_model=AdminCourseListOut, response_model_exclude_unset=True)
+def courses(
+    teacher_email: Optional[str] = None,
+    subject: Optional[str] = None,
+    q: Optional[str] = None,
+    page: PageParams = Depends(page_params(default_limit=100)),
+    db: Session = Depends(get_db),
+    user=Depends(require_role("admin")),
+):
+    names = select_fields(page.fields, COURSE_FIELDS)
+    query = db.query(*[COURSE_FIELDS[n].label(n) for n in names])
+    query = apply_filters(query, {Course.teacher_email: teacher_email, Course.subject: subject})
+    query = apply_search(query, [Course.title], q)
+    rows, next_cursor = keyset_page(query, [(Course.id, "asc")], page)
+    return {"courses": [project(r, names) for r in rows], "next_cursor": next_cursor}
 
 
 @router.delete("/courses/{course_id}")
@@ -61,14 +138,15 @@ def delete_course(course_id: int, db: Session = Depends(get_db), user=Depends(re
         raise HTTPException(status_code=404, detail="Course not found")
 
     db.query(Enrollment).filter(Enrollment.course_id == course_id).delete()
+    lesson_ids = [lid for (lid,) in db.query(Lesson.id).filter(Lesson.course_id == course_id).all()]
+    delete_lesson_quizzes(db, lesson_ids)
     db.query(Lesson).filter(Lesson.course_id == course_id).delete()
-    db.query(Quiz).filter(Quiz.lesson_id.in_(
-        [l.id for l in db.query(Lesson).filter(Lesson.course_id == course_id).all()]
-    )).delete(synchronize_session=False)
-    db.query(QuizAttempt).delete(synchronize_session=False)
+    course_progress.forget_courses(db, [course_id])
 
     db.delete(c)
     db.commit()
+    grading_cache.invalidate_course(course_id)
+    access_cache.invalidate_course(course_id)
     return {"message": "Course deleted", "course_id": course_id}
 @router.delete("/users/{user_id}")
 def delete_user(
@@ -80,20 +158,37 @@ def delete_user(
     if not u:
         raise HTTPException(status_code=404, detail="User not found")
 
+    u_email = u.email
+
     # remove enrollments first
     db.query(Enrollment).filter(Enrollment.student_email == u.email).delete()
 
     # remove attempts (if your QuizAttempt has student_email)
     db.query(QuizAttempt).filter(QuizAttempt.student_email == u.email).delete()
+    student_stats.forget_students(db, [u.email])
+    course_progress.forget_student(db, u.email)
 
     # if user is teacher, remove their courses and related data
+    teacher_course_ids = []
     if u.role == "teacher":
         teacher_courses = db.query(Course).filter(Course.teacher_email == u.email).all()
         for c in teacher_courses:
+            teacher_course_ids.append(c.id)
             db.query(Enrollment).filter(Enrollment.course_id == c.id).delete()
+            lesson_ids = [lid for (lid,) in db.query(Lesson.id).filter(Lesson.course_id == c.id).all()]
+            delete_lesson_quizzes(db, lesson_ids)
             db.query(Lesson).filter(Lesson.course_id == c.id).delete()
+            course_progress.forget_courses(db, [c.id])
             db.delete(c)
 
+    sids = auth_sessions.revoke_user_sessions(db, u_email)
+
     db.delete(u)
     db.commit()
+    mark_sessions_revoked(sids)
+    access_cache.invalidate_student(u_email)
+    invalidate_user(u_email)
+    for course_id in teacher_course_ids:
+        grading_cache.invalidate_course(course_id)
+        access_cache.invalidate_course(course_id)
     return {"message": "User deleted", "user_id": user_id}
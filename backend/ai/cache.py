@@ -0,0 +1,142 @@
+# cache.py
+# Content-addressed cache for AI tutor replies.
+# Key = sha256(normalized message | model name | max_tokens).
+# Tier 1: bounded in-memory LRU. Tier 2 (optional): SQLite file with TTL eviction.
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "512"))
+TTL_SECONDS = int(os.getenv("AI_CACHE_TTL_SECONDS", str(24 * 3600)))
+CACHE_DB = os.getenv("AI_CACHE_DB")  # e.g. "ai_cache.db"; unset = memory tier only
+
+# purge expired SQLite rows every N writes
+PURGE_EVERY = 200
+
+
+def normalize_message(message: str) -> str:
+    # "Explain  recursion?" and "explain recursion" should share one entry
+    t = (message or "").strip().casefold()
+    t = re.sub(r"\s+", " ", t)
+    return t.rstrip(" ?!.")
+
+
+def make_key(message: str, model_name: str, max_tokens: int) -> str:
+    raw = f"{normalize_message(message)}|{model_name}|{max_tokens}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = MAX_ENTRIES, ttl_seconds: int = TTL_SECONDS, db_path: Optional[str] = None):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+
+        self._lock = threading.Lock()
+        self._mem = OrderedDict()  # key -> (reply, expires_at)
+        self._conn = None
+        self._writes = 0
+
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.stores = 0
+        self.evictions = 0
+
+        if db_path:
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS ai_response_cache ("
+                "key TEXT PRIMARY KEY, reply TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_ai_response_cache_expires ON ai_response_cache (expires_at)"
+            )
+            self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            item = self._mem.get(key)
+            if item is not None:
+                reply, expires_at = item
+                if expires_at > now:
+                    self._mem.move_to_end(key)
+                    self.hits_memory += 1
+                    return reply
+                del self._mem[key]
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT reply, expires_at FROM ai_response_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row and row[1] > now:
+                    # promote into the memory tier
+                    self._put_memory(key, row[0], row[1])
+                    self.hits_disk += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, reply: str):
+        if not reply:
+            return
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._put_memory(key, reply, expires_at)
+            self.stores += 1
+
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO ai_response_cache (key, reply, expires_at) VALUES (?, ?, ?)",
+                    (key, reply, expires_at),
+                )
+                self._writes += 1
+                if self._writes % PURGE_EVERY == 0:
+                    self._conn.execute("DELETE FROM ai_response_cache WHERE expires_at <= ?", (time.time(),))
+                self._conn.commit()
+
+    def note_bypass(self):
+        with self._lock:
+            self.bypassed += 1
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM ai_response_cache")
+                self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits_memory + self.hits_disk + self.misses
+            return {
+                "size": len(self._mem),
+                "max_entries": self.max_entries,
+                "persistent": self._conn is not None,
+                "hits_memory": self.hits_memory,
+                "hits_disk": self.hits_disk,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits_memory + self.hits_disk) / lookups, 4) if lookups else 0.0,
+            }
+
+    def _put_memory(self, key: str, reply: str, expires_at: float):
+        # caller holds self._lock
+        self._mem[key] = (reply, expires_at)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+            self.evictions += 1
+
+
+response_cache = ResponseCache(db_path=CACHE_DB)
@@ -0,0 +1,169 @@
+# files.py
+# Registry of files already uploaded to Gemini, keyed by SHA-256 of the bytes.
+# The same lesson PDF / chat attachment is uploaded once and its remote handle
+# is reused until shortly before Gemini expires it (48h by default).
+import asyncio
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from io import BytesIO
+from typing import Optional
+
+from ai import llm
+
+# Gemini keeps uploaded files for 48 hours
+DEFAULT_TTL = timedelta(hours=48)
+# stop reusing a handle this long before it expires
+SAFETY_MARGIN = timedelta(minutes=int(os.getenv("GEMINI_FILE_SAFETY_MARGIN_MINUTES", "60")))
+MAX_ENTRIES = int(os.getenv("GEMINI_FILE_REGISTRY_MAX", "1000"))
+
+
+def sha256_bytes(raw: bytes) -> str:
+    return hashlib.sha256(raw).hexdigest()
+
+
+class PathHashes:
+    """SHA-256 of files in uploads/, memoized by (path, mtime, size).
+    Lesson attachments never change after upload, so a file is only read on a miss."""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max(1, max_entries)
+        self._hashes = OrderedDict()  # (path, mtime, size) -> sha256, LRU
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def stamp(path: str) -> tuple:
+        st = os.stat(path)
+        return (path, st.st_mtime, st.st_size)
+
+    def get(self, stamp: tuple) -> Optional[str]:
+        with self._lock:
+            digest = self._hashes.get(stamp)
+            if digest is not None:
+                self._hashes.move_to_end(stamp)
+            return digest
+
+    def put(self, stamp: tuple, digest: str):
+        with self._lock:
+            self._hashes[stamp] = digest
+            self._hashes.move_to_end(stamp)
+            while len(self._hashes) > self.max_entries:
+                self._hashes.popitem(last=False)
+
+    def digest(self, path: str) -> str:
+        stamp = self.stamp(path)
+        digest = self.get(stamp)
+        if digest is None:
+            digest = sha256_bytes(_read_bytes(path))
+            self.put(stamp, digest)
+        return digest
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._hashes)
+
+
+class FileRegistry:
+    def __init__(self, max_entries: int = MAX_ENTRIES, path_hashes: Optional[PathHashes] = None):
+        self.max_entries = max_entries
+        self._entries = {}   # sha256 -> (gemini file handle, expires_at)
+        self._inflight = {}  # sha256 -> asyncio.Task (concurrent callers share one upload)
+        self.path_hashes = path_hashes or PathHashes(max_entries)
+        self._lock = threading.Lock()
+
+        self.uploads = 0
+        self.reuses = 0
+
+    async def get_or_upload(self, raw: bytes, mime_type: str, digest: Optional[str] = None):
+        digest = digest or sha256_bytes(raw)
+
+        handle = self._get_valid(digest)
+        if handle is not None:
+            return handle
+
+        task = self._inflight.get(digest)
+        if task is None:
+            task = asyncio.ensure_future(self._upload(digest, raw, mime_type))
+            self._inflight[digest] = task
+            task.add_done_callback(lambda _t: self._inflight.pop(digest, None))
+        else:
+            with self._lock:
+                self.reuses += 1
+        # shielded: a caller that is cancelled (client disconnected) must not
+        # cancel the upload the other callers are waiting on
+        return await asyncio.shield(task)
+
+    async def get_or_upload_path(self, path: str, mime_type: str):
+        # a known hash with a live handle needs no read at all
+        stamp = PathHashes.stamp(path)
+        digest = self.path_hashes.get(stamp)
+        if digest is not None:
+            handle = self._get_valid(digest)
+            if handle is not None:
+                return handle
+
+        raw = await asyncio.to_thread(_read_bytes, path)
+        digest = sha256_bytes(raw)
+        self.path_hashes.put(stamp, digest)
+        return await self.get_or_upload(raw, mime_type, digest=digest)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "path_hashes": len(self.path_hashes),
+                "uploads": self.uploads,
+                "reuses": self.reuses,
+            }
+
+    def _get_valid(self, digest: str):
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            item = self._entries.get(digest)
+            if item is None:
+                return None
+            handle, expires_at = item
+            if expires_at - SAFETY_MARGIN <= now:
+                del self._entries[digest]
+                return None
+            self.reuses += 1
+            return handle
+
+    async def _upload(self, digest: str, raw: bytes, mime_type: str):
+        # upload straight from memory, no temp file
+        handle = await llm.upload_file(BytesIO(raw), mime_type=mime_type)
+
+        expires_at = getattr(handle, "expiration_time", None)
+        if not isinstance(expires_at, datetime):
+            expires_at = datetime.now(timezone.utc) + DEFAULT_TTL
+        elif expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+
+        with self._lock:
+            self.uploads += 1
+            self._entries[digest] = (handle, expires_at)
+            self._prune()
+        return handle
+
+    def _prune(self):
+        # caller holds self._lock
+        if len(self._entries) <= self.max_entries:
+            return
+        now = datetime.now(timezone.utc)
+        for key in [k for k, (_h, exp) in self._entries.items() if exp - SAFETY_MARGIN <= now]:
+            del self._entries[key]
+        while len(self._entries) > self.max_entries:
+            # dicts keep insertion order -> drop the oldest upload
+            del self._entries[next(iter(self._entries))]
+
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+# shared with extraction.py, which looks up extracted text by the same hashes
+path_hashes = PathHashes()
+file_registry = FileRegistry(path_hashes=path_hashes)
@@ -1,20 +1,27 @@
 # gemini_chat.py
+import asyncio
+import json
 import os
-import tempfile
 from io import BytesIO
 from pathlib import Path
-from datetime import datetime
 from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile, File, Form
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 from dotenv import load_dotenv
-import google.generativeai as genai
-from jose import JWTError, jwt
 from sqlalchemy.orm import Session
 
-from database import SessionLocal
-from models import User
+from ai import llm
+from ai.cache import make_key, response_cache
+from ai.files import file_registry
+from ai.governor import governor
+from ai.limits import PLAN_LIMITS, rate_limiter, usage_meter
+from ai import semantic_cache as semantic
+from authz import course_access, require_member
+from deps import get_db
+import extraction
+from security import get_current_user, get_profile, is_premium
 
 # Optional libs 
 try:
@@ -22,11 +29,6 @@ try:
 except Exception:
     Image = None
 
-try:
-    from docx import Document  
-except Exception:
-    Document = None
-
 
 # ENV
 env_path = Path(__file__).resolve().parents[1] / ".env"
@@ -34,111 +36,242 @@ load_dotenv(env_path)
 
 router = APIRouter(prefix="/ai", tags=["AI"])
 
-API_KEY = os.getenv("GEMINI_API_KEY")
-if API_KEY:
-    genai.configure(api_key=API_KEY)
-
 # models
 FREE_MODEL = os.getenv("GEMINI_FREE_MODEL", "gemini-2.0-flash")
 PREMIUM_MODEL = os.getenv("GEMINI_PREMIUM_MODEL", "gemini-3-flash-preview")
 
-#Secrect key
-SECRET_KEY = os.getenv("SECRET_KEY", "CHANGE_ME_LATER")
-ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
+# PDFs whose extracted text is longer than this are sent as files instead
+PDF_TEXT_MAX_CHARS = 30000
 
 class ChatRequest(BaseModel):
     message: str
+    no_cache: bool = False  # skip the cached reply and ask Gemini again
+    # optional scope for the semantic cache (answers are only reused within it)
+    course_id: Optional[int] = None  # must be one of the caller's courses
+    topic: Optional[str] = Field(None, max_length=semantic.TOPIC_MAX_CHARS)
 
 
-# DB
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+def _resolve_plan(request: Request, db: Session, course_id: Optional[int] = None):
+    # caller + free/premium model + output token cap
+    # (cached token + profile: no DB round trip when warm). May query the
+    # database, so the async handlers run it with asyncio.to_thread.
+    user = get_current_user(request)
+    if course_id is not None:
+        # a cache scope is a course the caller teaches or is enrolled in
+        require_member(course_access(db, user["email"], course_id), user["role"])
+    premium = is_premium(get_profile(db, user["email"]))
 
+    # every AI request takes a rate token, cached replies included
+    rate_limiter.check(user["email"], "premium" if premium else "free")
 
-# AUTH HELPERS
-def _get_bearer_token(request: Request) -> Optional[str]:
-    auth_header = request.headers.get("Authorization") or request.headers.get("authorization")
-    if not auth_header:
-        return None
-    parts = auth_header.split()
-    if len(parts) == 2 and parts[0].lower() == "bearer":
-        return parts[1]
-    return None
-
+    model_name = PREMIUM_MODEL if premium else FREE_MODEL
+    max_tokens = 2048 if premium else 1024
+    return user["email"], premium, model_name, max_tokens
 
-def get_current_user_email(request: Request) -> str:
-    token = _get_bearer_token(request)
-    if not token:
-        raise HTTPException(status_code=401, detail="Missing Authorization Bearer token")
 
+async def _generate(email: str, premium: bool, model_name: str, contents, generation_config: dict) -> str:
+    # llm.generate (premium callers admitted first) + daily token accounting
+    usage = {}
+    reply = ""
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email = payload.get("sub") or payload.get("email")
-        if not email:
-            raise HTTPException(status_code=401, detail="Invalid token: no email")
-        return email
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+        reply = await llm.generate(model_name, contents, generation_config=generation_config, usage=usage, premium=premium)
+    finally:
+        _record_usage(email, usage, contents, reply)
+    return reply
 
 
-def is_premium_user(user: Optional[User]) -> bool:
-    if not user:
-        return False
+def _record_usage(email: str, usage: dict, prompt, reply: str):
+    # only calls that reached the model count; a request the governor refused
+    # (breaker open, queue timeout) or that failed before any output costs nothing
+    if usage or reply:
+        usage_meter.record(email, usage, prompt, reply)
 
-    # expected: user.plan in ("free", "premium")
-    if getattr(user, "plan", "free") != "premium":
-        return False
 
-    premium_until = getattr(user, "premium_until", None)
-    if premium_until is None:
-        return True
+def _tutor_prompt(msg: str) -> str:
+    return (
+        "You are EduMate AI Tutor.\n"
+        "Answer clearly and step-by-step.\n"
+        "Use simple language.\n\n"
+        f"Student message: {msg}"
+    )
+
 
-    # premium_until is usually stored as UTC datetime
-    return premium_until > datetime.utcnow()
+async def _cache_get(key: str):
+    # the optional SQLite tier does file I/O; keep it off the event loop
+    if response_cache.db_path:
+        return await asyncio.to_thread(response_cache.get, key)
+    return response_cache.get(key)
+
+
+async def _cache_set(key: str, reply: str):
+    if response_cache.db_path:
+        await asyncio.to_thread(response_cache.set, key, reply)
+    else:
+        response_cache.set(key, reply)
+
+
+async def _lookup_cached_reply(req: ChatRequest, msg: str, email: str, premium: bool, model_name: str, max_tokens: int):
+    # exact tier first, then the semantic (paraphrase) tier.
+    # Returns (reply, tier, lookup); lookup is handed back to _store_reply on a miss.
+    lookup = {"key": make_key(msg, model_name, max_tokens), "scope": None, "vec": None}
+    if req.no_cache:
+        response_cache.note_bypass()
+        return None, None, lookup
+
+    cached = await _cache_get(lookup["key"])
+    if cached is not None:
+        return cached, "exact", lookup
+
+    if semantic.ENABLED:
+        lookup["scope"] = semantic.make_scope(model_name, max_tokens, req.course_id, req.topic)
+        usage = {}
+        try:
+            lookup["vec"] = await semantic.semantic_cache.embed(msg, usage=usage, premium=premium)
+        except Exception:
+            # embedding is best-effort; fall through to Gemini
+            return None, None, lookup
+        finally:
+            if usage:
+                # Gemini embeddings count toward the daily budget (the local embedder is free)
+                usage_meter.record(email, usage, msg)
+
+        answer, _score = semantic.semantic_cache.lookup(lookup["scope"], lookup["vec"])
+        if answer is not None:
+            # not promoted to the exact tier: that key is unscoped, and this
+            # answer was only matched within the course/topic scope
+            return answer, "semantic", lookup
+
+    return None, None, lookup
+
+
+async def _store_reply(lookup: dict, reply: str):
+    await _cache_set(lookup["key"], reply)
+    if lookup["vec"] is not None:
+        semantic.semantic_cache.add(lookup["scope"], lookup["vec"], reply)
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+# TODAY'S USAGE (for showing the remaining allowance)
+@router.get("/usage")
+def usage(request: Request, db: Session = Depends(get_db)):
+    user = get_current_user(request)
+    plan = "premium" if is_premium(get_profile(db, user["email"])) else "free"
+    budget = PLAN_LIMITS[plan]["daily_tokens"]
+    used = usage_meter.used_today(db, user["email"])
+    return {
+        "plan": plan,
+        "tokens_used": used,
+        "daily_tokens": budget or None,
+        "tokens_left": max(0, budget - used) if budget else None,
+        "requests_per_minute": PLAN_LIMITS[plan]["per_minute"],
+    }
 
 
 # TEXT CHAT
 @router.post("/chat")
-def chat(req: ChatRequest, request: Request, db: Session = Depends(get_db)):
-    if not API_KEY:
+async def chat(req: ChatRequest, request: Request, db: Session = Depends(get_db)):
+    if not llm.is_configured():
         raise HTTPException(status_code=500, detail="GEMINI_API_KEY not set in backend/.env")
 
     msg = (req.message or "").strip()
     if not msg:
         raise HTTPException(status_code=400, detail="Message is empty")
 
-    email = get_current_user_email(request)
-    user = db.query(User).filter(User.email == email).first()
-    premium = is_premium_user(user)
+    email, premium, model_name, max_tokens = await asyncio.to_thread(_resolve_plan, request, db, req.course_id)
+    plan = "premium" if premium else "free"
 
-    model_name = PREMIUM_MODEL if premium else FREE_MODEL
-    max_tokens = 2048 if premium else 1024
+    cached, tier, lookup = await _lookup_cached_reply(req, msg, email, premium, model_name, max_tokens)
+    if cached is not None:
+        return {"reply": cached, "plan": plan, "model": model_name, "cached": True, "cache_tier": tier}
 
-    prompt = (
-        "You are EduMate AI Tutor.\n"
-        "Answer clearly and step-by-step.\n"
-        "Use simple language.\n\n"
-        f"Student message: {msg}"
-    )
+    # cached replies cost no tokens, so only a real Gemini call needs budget left
+    await asyncio.to_thread(usage_meter.check, db, email, plan)
+    prompt = _tutor_prompt(msg)
 
     try:
-        model = genai.GenerativeModel(model_name)
-        result = model.generate_content(
+        reply = await _generate(
+            email,
+            premium,
+            model_name,
             prompt,
             generation_config={"max_output_tokens": max_tokens},
         )
-        return {
-            "reply": (result.text or "").strip(),
-            "plan": "premium" if premium else "free",
-            "model": model_name,
-        }
+    except HTTPException:
+        # 502/503/504 from the governor carry Retry-After
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    await _store_reply(lookup, reply)
+    return {
+        "reply": reply,
+        "plan": plan,
+        "model": model_name,
+        "cached": False,
+    }
+
+
+# TEXT CHAT (streamed as server-sent events)
+# event: chunk -> {"text": "..."} for every Gemini chunk
+# event: done  -> {"plan": ..., "model": ...}
+# event: error -> {"detail": "..."} if Gemini fails mid-stream
+@router.post("/chat/stream")
+async def chat_stream(req: ChatRequest, request: Request, db: Session = Depends(get_db)):
+    if not llm.is_configured():
+        raise HTTPException(status_code=500, detail="GEMINI_API_KEY not set in backend/.env")
+
+    msg = (req.message or "").strip()
+    if not msg:
+        raise HTTPException(status_code=400, detail="Message is empty")
+
+    email, premium, model_name, max_tokens = await asyncio.to_thread(_resolve_plan, request, db, req.course_id)
+    plan = "premium" if premium else "free"
+
+    cached, tier, lookup = await _lookup_cached_reply(req, msg, email, premium, model_name, max_tokens)
+    if cached is None:
+        await asyncio.to_thread(usage_meter.check, db, email, plan)
+        # refuse with a real 503 now rather than an error event inside the stream
+        governor.ensure_available(model_name)
+
+    prompt = _tutor_prompt(msg)
+
+    async def events():
+        if cached is not None:
+            yield _sse("chunk", {"text": cached})
+            yield _sse("done", {"plan": plan, "model": model_name, "cached": True, "cache_tier": tier})
+            return
+
+        parts = []
+        usage = {}
+        try:
+            async for text in llm.stream(
+                model_name,
+                prompt,
+                generation_config={"max_output_tokens": max_tokens},
+                usage=usage,
+                premium=premium,
+            ):
+                parts.append(text)
+                yield _sse("chunk", {"text": text})
+        except Exception as e:
+            yield _sse("error", {"detail": e.detail if isinstance(e, HTTPException) else str(e)})
+            return
+        finally:
+            # also counts replies cut short by an error or a client disconnect
+            _record_usage(email, usage, prompt, "".join(parts))
+
+        await _store_reply(lookup, "".join(parts).strip())
+        yield _sse("done", {"plan": plan, "model": model_name, "cached": False})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 
 # FILE CHAT (PDF/IMAGE/DOCX/TEXT)
 @router.post("/chat-file")
@@ -148,19 +281,16 @@ async def chat_file(
     message: str = Form(""),
     file: UploadFile = File(...),
 ):
-    if not API_KEY:
+    if not llm.is_configured():
         raise HTTPException(status_code=500, detail="GEMINI_API_KEY not set in backend/.env")
 
     msg = (message or "").strip() or "Please help me with this file."
 
-    # Auth + premium
-    email = get_current_user_email(request)
-    user = db.query(User).filter(User.email == email).first()
-    premium = is_premium_user(user)
-
-    model_name = PREMIUM_MODEL if premium else FREE_MODEL
-    max_tokens = 2048 if premium else 1024
-    model = genai.GenerativeModel(model_name)
+    # Auth + premium + limits
+    email, premium, model_name, max_tokens = await asyncio.to_thread(_resolve_plan, request, db)
+    await asyncio.to_thread(usage_meter.check, db, email, "premium" if premium else "free")
+    governor.ensure_available(model_name)
+    generation_config = {"max_output_tokens": max_tokens}
 
     prompt = (
         "You are EduMate AI Tutor.\n"
@@ -185,75 +315,50 @@ async def chat_file(
         # 1) IMAGES
         if content_type in ("image/png", "image/jpeg", "image/jpg") or filename.endswith((".png", ".jpg", ".jpeg")):
             if Image is not None:
-                img = Image.open(BytesIO(raw)).convert("RGB")
-                result = model.generate_content(
-                    [prompt, img],
-                    generation_config={"max_output_tokens": max_tokens},
-                )
-                return {"reply": (result.text or "").strip(), "plan": "premium" if premium else "free", "model": model_name}
-
-            # Fallback: upload image as file
-            with tempfile.NamedTemporaryFile(delete=False, suffix=Path(filename).suffix or ".jpg") as tmp:
-                tmp.write(raw)
-                tmp_path = tmp.name
-            try:
-                gfile = genai.upload_file(tmp_path)
-                result = model.generate_content(
-                    [prompt, gfile],
-                    generation_config={"max_output_tokens": max_tokens},
-                )
-                return {"reply": (result.text or "").strip(), "plan": "premium" if premium else "free", "model": model_name}
-            finally:
-                try:
-                    os.remove(tmp_path)
-                except Exception:
-                    pass
-
-        # 2) PDF
+                img = await asyncio.to_thread(lambda: Image.open(BytesIO(raw)).convert("RGB"))
+                reply = await _generate(email, premium, model_name, [prompt, img], generation_config=generation_config)
+                return {"reply": reply, "plan": "premium" if premium else "free", "model": model_name}
+
+            # Fallback: upload image as file (reused by content hash)
+            mime_type = content_type if content_type.startswith("image/") else "image/jpeg"
+            if filename.endswith(".png"):
+                mime_type = "image/png"
+            gfile = await file_registry.get_or_upload(raw, mime_type)
+            reply = await _generate(email, premium, model_name, [prompt, gfile], generation_config=generation_config)
+            return {"reply": reply, "plan": "premium" if premium else "free", "model": model_name}
+
+        # 2) PDF (send the extracted text when it covers the document, else the file)
         if content_type == "application/pdf" or filename.endswith(".pdf"):
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-                tmp.write(raw)
-                tmp_path = tmp.name
-
-            try:
-                gfile = genai.upload_file(tmp_path)
-                result = model.generate_content(
-                    [prompt, gfile],
-                    generation_config={"max_output_tokens": max_tokens},
-                )
-                return {"reply": (result.text or "").strip(), "plan": "premium" if premium else "free", "model": model_name}
-            finally:
-                try:
-                    os.remove(tmp_path)
-                except Exception:
-                    pass
+            text = await asyncio.to_thread(extraction.chat_texts.text, raw, "pdf")
+            if extraction.is_useful_text(text) and len(text) <= PDF_TEXT_MAX_CHARS:
+                full_prompt = prompt + "\n\n--- PDF CONTENT ---\n" + text
+                reply = await _generate(email, premium, model_name, full_prompt, generation_config=generation_config)
+                return {"reply": reply, "plan": "premium" if premium else "free", "model": model_name}
+
+            gfile = await file_registry.get_or_upload(raw, "application/pdf")
+            reply = await _generate(email, premium, model_name, [prompt, gfile], generation_config=generation_config)
+            return {"reply": reply, "plan": "premium" if premium else "free", "model": model_name}
 
         # 3) DOCX
         if filename.endswith(".docx") or content_type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
-            if Document is None:
+            if extraction.Document is None:
                 raise HTTPException(status_code=400, detail="DOCX support missing. Install: pip install python-docx")
 
-            doc = Document(BytesIO(raw))
-            extracted = "\n".join([p.text for p in doc.paragraphs if p.text.strip()])
+            # extracted once per file hash (in memory; chat uploads are not stored)
+            extracted = await asyncio.to_thread(extraction.chat_texts.text, raw, "docx")
             if not extracted.strip():
                 raise HTTPException(status_code=400, detail="DOCX has no readable text.")
 
             full_prompt = prompt + "\n\n--- DOCX CONTENT ---\n" + extracted[:12000]
-            result = model.generate_content(
-                full_prompt,
-                generation_config={"max_output_tokens": max_tokens},
-            )
-            return {"reply": (result.text or "").strip(), "plan": "premium" if premium else "free", "model": model_name}
+            reply = await _generate(email, premium, model_name, full_prompt, generation_config=generation_config)
+            return {"reply": reply, "plan": "premium" if premium else "free", "model": model_name}
 
         # 4) TEXT / MARKDOWN
         if content_type.startswith("text/") or filename.endswith((".txt", ".md")):
             extracted = raw.decode("utf-8", errors="ignore")
             full_prompt = prompt + "\n\n--- FILE CONTENT ---\n" + extracted[:12000]
-            result = model.generate_content(
-                full_prompt,
-                generation_config={"max_output_tokens": max_tokens},
-            )
-            return {"reply": (result.text or "").strip(), "plan": "premium" if premium else "free", "model": model_name}
+            reply = await _generate(email, premium, model_name, full_prompt, generation_config=generation_config)
+            return {"reply": reply, "plan": "premium" if premium else "free", "model": model_name}
 
         raise HTTPException(status_code=400, detail="Unsupported file type. Use PDF, PNG/JPG, TXT/MD, or DOCX.")
 
@@ -0,0 +1,365 @@
+# governor.py
+# Admission control around every LLM call (chat, file chat, quiz generation).
+#
+# When Gemini slows down or fails, handlers used to wait out the full SDK timeout
+# and then answer a raw 500, while new requests kept piling in behind them. Per
+# model, the governor now:
+#   - caps calls in flight (LLM_MAX_IN_FLIGHT); callers wait in two lanes and
+#     premium users are admitted first; beyond LLM_QUEUE_MAX waiting -> 503
+#   - gives each call an overall deadline (queueing + retries) and each attempt
+#     its own timeout -> 504 when exceeded
+#   - retries transient upstream errors (429/5xx, timeouts, connection drops)
+#     with jittered exponential backoff
+#   - opens a circuit breaker after LLM_BREAKER_FAILURES transient failures in a
+#     row: calls are refused at once with 503 + Retry-After until the cooldown
+#     passes, then one probe call decides whether to close it again
+#
+# The upstream call is passed in as a coroutine factory (see ai/llm.py), so a
+# fake that injects latency and errors can be governed exactly like Gemini.
+#
+#   LLM_MAX_IN_FLIGHT             concurrent calls per model (default 16)
+#   LLM_QUEUE_MAX                 calls allowed to wait per model (default 64)
+#   LLM_DEADLINE_SECONDS          overall budget per call (default 60)
+#   LLM_ATTEMPT_TIMEOUT_SECONDS   per attempt / per streamed chunk (default 30)
+#   LLM_MAX_RETRIES               extra attempts on transient errors (default 2)
+#   LLM_RETRY_BASE_SECONDS        first backoff, doubled per retry (default 0.5)
+#   LLM_BREAKER_FAILURES          consecutive failures that open the breaker (default 5)
+#   LLM_BREAKER_COOLDOWN_SECONDS  how long it stays open (default 30)
+import asyncio
+import math
+import os
+import random
+import time
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from fastapi import HTTPException
+
+MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "16"))
+QUEUE_MAX = int(os.getenv("LLM_QUEUE_MAX", "64"))
+DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "60"))
+ATTEMPT_TIMEOUT_SECONDS = float(os.getenv("LLM_ATTEMPT_TIMEOUT_SECONDS", "30"))
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "0.5"))
+BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN_SECONDS = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+
+LANES = ("premium", "standard")
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+def is_retryable(e: BaseException) -> bool:
+    """Transient upstream failures: timeouts, dropped connections, 429/5xx (google.api_core
+    exceptions carry the HTTP status as `code`)."""
+    if isinstance(e, HTTPException):
+        return False
+    if isinstance(e, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    code = getattr(e, "code", None)
+    return isinstance(code, int) and code in RETRYABLE_STATUS
+
+
+def _unavailable(detail: str, retry_after: float, status_code: int = 503) -> HTTPException:
+    return HTTPException(
+        status_code=status_code,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+class _Model:
+    """Slots, waiting lanes and breaker state for one model."""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.waiters = {lane: deque() for lane in LANES}
+
+        self.state = "closed"  # closed | open | half_open
+        self.failures = 0      # consecutive transient failures
+        self.opened_at = 0.0
+        self.probing = False
+
+        self.calls = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.retries = 0
+        self.shed = 0          # refused: queue full or breaker open
+        self.timeouts = 0
+        self.breaker_trips = 0
+
+    def waiting(self) -> int:
+        return sum(len(q) for q in self.waiters.values())
+
+
+class LLMGovernor:
+    def __init__(self, max_in_flight: int = MAX_IN_FLIGHT, queue_max: int = QUEUE_MAX,
+                 deadline_seconds: float = DEADLINE_SECONDS, attempt_timeout_seconds: float = ATTEMPT_TIMEOUT_SECONDS,
+                 max_retries: int = MAX_RETRIES, retry_base_seconds: float = RETRY_BASE_SECONDS,
+                 breaker_failures: int = BREAKER_FAILURES, breaker_cooldown_seconds: float = BREAKER_COOLDOWN_SECONDS):
+        self.max_in_flight = max(1, max_in_flight)
+        self.queue_max = max(0, queue_max)
+        self.deadline_seconds = deadline_seconds
+        self.attempt_timeout_seconds = attempt_timeout_seconds
+        self.max_retries = max(0, max_retries)
+        self.retry_base_seconds = retry_base_seconds
+        self.breaker_failures = max(1, breaker_failures)
+        self.breaker_cooldown_seconds = breaker_cooldown_seconds
+        self._models = {}
+
+    def _model(self, model_name: str) -> _Model:
+        m = self._models.get(model_name)
+        if m is None:
+            m = self._models[model_name] = _Model()
+        return m
+
+    # =========================================================
+    # Circuit breaker
+    # =========================================================
+    def ensure_available(self, model_name: str):
+        """Raises 503 while the model's breaker is open (cheap pre-check before starting work)."""
+        m = self._model(model_name)
+        if m.state == "open":
+            remaining = self.breaker_cooldown_seconds - (time.monotonic() - m.opened_at)
+            if remaining > 0:
+                m.shed += 1
+                raise _unavailable("AI service is temporarily unavailable. Please retry shortly.", remaining)
+
+    def _admit(self, m: _Model) -> bool:
+        # True when this call is the half-open probe
+        if m.state == "open":
+            remaining = self.breaker_cooldown_seconds - (time.monotonic() - m.opened_at)
+            if remaining > 0:
+                m.shed += 1
+                raise _unavailable("AI service is temporarily unavailable. Please retry shortly.", remaining)
+            m.state = "half_open"
+        if m.state == "half_open":
+            if m.probing:
+                m.shed += 1
+                raise _unavailable("AI service is recovering. Please retry shortly.", 1)
+            m.probing = True
+            return True
+        return False
+
+    def _on_success(self, m: _Model):
+        m.failures = 0
+        m.state = "closed"
+        m.probing = False
+
+    def _on_failure(self, m: _Model):
+        m.failures += 1
+        if m.state == "half_open" or m.failures >= self.breaker_failures:
+            if m.state != "open":
+                m.breaker_trips += 1
+            m.state = "open"
+            m.opened_at = time.monotonic()
+        m.probing = False
+
+    def _abandon_probe(self, m: _Model):
+        # the probe was cancelled (client gone, stream closed early) before it
+        # settled: reopen, so the next call after the cooldown probes again
+        m.probing = False
+        m.state = "open"
+        m.opened_at = time.monotonic()
+
+    def _settle(self, m: _Model, e: BaseException) -> bool:
+        """Books a failed attempt; True if it may be retried."""
+        if is_retryable(e):
+            self._on_failure(m)
+            return m.state != "open"
+        # the upstream answered (bad request, safety block, ...): it is healthy
+        self._on_success(m)
+        return False
+
+    # =========================================================
+    # Slots and lanes
+    # =========================================================
+    async def _acquire(self, m: _Model, premium: bool, deadline: float):
+        lane = "premium" if premium else "standard"
+        ahead = m.waiters["premium"] if premium else m.waiting()
+        if m.in_flight < self.max_in_flight and not ahead:
+            m.in_flight += 1
+            return
+
+        if m.waiting() >= self.queue_max:
+            m.shed += 1
+            raise _unavailable("AI service is busy. Please retry in a moment.", 1)
+
+        fut = asyncio.get_running_loop().create_future()
+        m.waiters[lane].append(fut)
+        try:
+            await asyncio.wait_for(fut, timeout=max(0.0, deadline - time.monotonic()))
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if fut.done() and not fut.cancelled():
+                self._release(m)  # the slot was handed over just as we gave up
+            else:
+                try:
+                    m.waiters[lane].remove(fut)
+                except ValueError:
+                    pass
+            if isinstance(e, asyncio.TimeoutError):
+                m.timeouts += 1
+                raise _unavailable("AI service is busy. Please retry in a moment.", 1, status_code=504)
+            raise
+
+    def _release(self, m: _Model):
+        # hand the slot straight to the next waiter, premium lane first
+        for lane in LANES:
+            q = m.waiters[lane]
+            while q:
+                fut = q.popleft()
+                if not fut.done():
+                    fut.set_result(None)
+                    return
+        m.in_flight -= 1
+
+    def _backoff(self, attempt: int) -> float:
+        # full jitter around an exponential step
+        return self.retry_base_seconds * (2 ** attempt) * (0.5 + random.random())
+
+    def _timed_out(self, m: _Model) -> HTTPException:
+        m.timeouts += 1
+        return _unavailable("AI service timed out. Please retry.", 1, status_code=504)
+
+    def _upstream_error(self, m: _Model, e: BaseException) -> HTTPException:
+        if isinstance(e, asyncio.TimeoutError):
+            return self._timed_out(m)
+        return _unavailable(f"AI service error: {e}", 1, status_code=502)
+
+    # =========================================================
+    # Calls
+    # =========================================================
+    async def call(self, model_name: str, fn: Callable[[], Awaitable], premium: bool = False,
+                   deadline_seconds: Optional[float] = None):
+        """Runs fn() under the model's limits. Transient failures are retried and end as
+        502/503/504 HTTPExceptions; other errors from fn propagate unchanged."""
+        m = self._model(model_name)
+        deadline = time.monotonic() + (deadline_seconds or self.deadline_seconds)
+        probe = self._admit(m)
+        try:
+            await self._acquire(m, premium, deadline)
+        except BaseException:
+            if probe:
+                m.probing = False
+            raise
+
+        m.calls += 1
+        try:
+            attempt = 0
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._on_failure(m)
+                    raise self._timed_out(m)
+                try:
+                    result = await asyncio.wait_for(fn(), timeout=min(self.attempt_timeout_seconds, remaining))
+                except Exception as e:
+                    retry = self._settle(m, e) and attempt < self.max_retries
+                    delay = self._backoff(attempt)
+                    if not retry or time.monotonic() + delay >= deadline:
+                        m.failed += 1
+                        if is_retryable(e):
+                            raise self._upstream_error(m, e)
+                        raise
+                    attempt += 1
+                    m.retries += 1
+                    await asyncio.sleep(delay)
+                    continue
+                self._on_success(m)
+                m.succeeded += 1
+                return result
+        finally:
+            if probe and m.probing:
+                self._abandon_probe(m)
+            self._release(m)
+
+    async def stream(self, model_name: str, factory: Callable[[], AsyncIterator], premium: bool = False,
+                     deadline_seconds: Optional[float] = None) -> AsyncIterator:
+        """Governed async iteration. The slot is held until the stream ends; failures
+        before the first chunk are retried like call(), later ones are not."""
+        m = self._model(model_name)
+        deadline = time.monotonic() + (deadline_seconds or self.deadline_seconds)
+        probe = self._admit(m)
+        try:
+            await self._acquire(m, premium, deadline)
+        except BaseException:
+            if probe:
+                m.probing = False
+            raise
+
+        m.calls += 1
+        agen = None
+        try:
+            attempt = 0
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._on_failure(m)
+                    raise self._timed_out(m)
+                agen = factory()
+                try:
+                    first = await asyncio.wait_for(agen.__anext__(), timeout=min(self.attempt_timeout_seconds, remaining))
+                    break
+                except StopAsyncIteration:
+                    self._on_success(m)
+                    m.succeeded += 1
+                    return
+                except Exception as e:
+                    await agen.aclose()
+                    retry = self._settle(m, e) and attempt < self.max_retries
+                    delay = self._backoff(attempt)
+                    if not retry or time.monotonic() + delay >= deadline:
+                        m.failed += 1
+                        if is_retryable(e):
+                            raise self._upstream_error(m, e)
+                        raise
+                    attempt += 1
+                    m.retries += 1
+                    await asyncio.sleep(delay)
+
+            yield first
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(agen.__anext__(), timeout=self.attempt_timeout_seconds)
+                except StopAsyncIteration:
+                    break
+                except Exception as e:
+                    m.failed += 1
+                    self._settle(m, e)
+                    if is_retryable(e):
+                        raise self._upstream_error(m, e)
+                    raise
+                yield chunk
+            self._on_success(m)
+            m.succeeded += 1
+        finally:
+            if probe and m.probing:
+                self._abandon_probe(m)
+            self._release(m)
+            if agen is not None:
+                await agen.aclose()
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        out = {}
+        for name, m in self._models.items():
+            out[name] = {
+                "breaker": m.state,
+                "breaker_retry_in": round(max(0.0, self.breaker_cooldown_seconds - (now - m.opened_at)), 1)
+                if m.state == "open" else 0.0,
+                "consecutive_failures": m.failures,
+                "in_flight": m.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "waiting_premium": len(m.waiters["premium"]),
+                "waiting_standard": len(m.waiters["standard"]),
+                "calls": m.calls,
+                "succeeded": m.succeeded,
+                "failed": m.failed,
+                "retries": m.retries,
+                "shed": m.shed,
+                "timeouts": m.timeouts,
+                "breaker_trips": m.breaker_trips,
+            }
+        return out
+
+
+governor = LLMGovernor()
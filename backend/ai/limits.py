@@ -0,0 +1,293 @@
+# limits.py
+# Per-user request rate limits and daily token budgets for the AI tutor.
+#
+# Rate: a token bucket per user email, sized by plan. Each chat request takes one
+# token; tokens refill continuously, so short bursts pass and sustained hammering
+# gets 429 + Retry-After.
+#
+# Budget: LLM tokens (prompt + output, from Gemini's usage metadata) per user per
+# UTC day. Usage is counted in memory and flushed to ai_usage every few seconds
+# by a background task; the flush reads back the stored total, so other workers'
+# usage is picked up too. A user over budget gets 429 until midnight UTC.
+#
+#   AI_RATE_<PLAN>_PER_MINUTE   sustained requests per minute (free 10, premium 30)
+#   AI_RATE_<PLAN>_BURST        bucket size (free 5, premium 15)
+#   AI_DAILY_TOKENS_<PLAN>      daily token budget, 0 = unlimited (free 100k, premium 1M)
+#   AI_USAGE_FLUSH_SECONDS      how often usage is written to the database (default 15)
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, insert_ignore
+from models import AIUsage
+
+PLAN_LIMITS = {
+    "free": {
+        "per_minute": float(os.getenv("AI_RATE_FREE_PER_MINUTE", "10")),
+        "burst": float(os.getenv("AI_RATE_FREE_BURST", "5")),
+        "daily_tokens": int(os.getenv("AI_DAILY_TOKENS_FREE", "100000")),
+    },
+    "premium": {
+        "per_minute": float(os.getenv("AI_RATE_PREMIUM_PER_MINUTE", "30")),
+        "burst": float(os.getenv("AI_RATE_PREMIUM_BURST", "15")),
+        "daily_tokens": int(os.getenv("AI_DAILY_TOKENS_PREMIUM", "1000000")),
+    },
+}
+
+MAX_USERS = int(os.getenv("AI_LIMITS_MAX_USERS", "50000"))
+FLUSH_SECONDS = float(os.getenv("AI_USAGE_FLUSH_SECONDS", "15"))
+
+# when Gemini doesn't report usage (e.g. some streamed replies), estimate from text length
+CHARS_PER_TOKEN = 4
+
+
+def _too_many(detail: str, retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+def _seconds_to_midnight() -> float:
+    now = datetime.utcnow()
+    return (datetime.combine(now.date() + timedelta(days=1), datetime.min.time()) - now).total_seconds()
+
+
+def estimate_tokens(contents) -> int:
+    # text parts only; images/files can't be sized here
+    if isinstance(contents, (list, tuple)):
+        return sum(estimate_tokens(c) for c in contents)
+    if not isinstance(contents, str):
+        return 0
+    return max(1, len(contents) // CHARS_PER_TOKEN)
+
+
+# =========================================================
+# Request rate
+# =========================================================
+class RateLimiter:
+    def __init__(self, plans: dict = PLAN_LIMITS, max_users: int = MAX_USERS):
+        self.plans = plans
+        self.max_users = max(1, max_users)
+        self._buckets = OrderedDict()  # email -> [tokens, updated_at]
+        self._lock = threading.Lock()
+
+        self.allowed = 0
+        self.limited = 0
+
+    def check(self, email: str, plan: str):
+        """Takes one request token for the user or raises 429."""
+        limits = self.plans.get(plan) or self.plans["free"]
+        rate = limits["per_minute"] / 60.0
+        burst = max(1.0, limits["burst"])
+        now = time.monotonic()
+
+        with self._lock:
+            bucket = self._buckets.get(email)
+            if bucket is None:
+                bucket = [burst, now]
+                self._buckets[email] = bucket
+                while len(self._buckets) > self.max_users:
+                    self._buckets.popitem(last=False)
+            self._buckets.move_to_end(email)
+
+            # refill; an upgraded user's bucket grows to the new burst size
+            bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+
+            if bucket[0] >= 1.0:
+                bucket[0] -= 1.0
+                self.allowed += 1
+                return
+            self.limited += 1
+            wait = (1.0 - bucket[0]) / rate if rate > 0 else 60.0
+
+        raise _too_many("Too many AI requests. Please slow down.", wait)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"users": len(self._buckets), "allowed": self.allowed, "limited": self.limited}
+
+
+# =========================================================
+# Daily token budget
+# =========================================================
+class UsageMeter:
+    def __init__(self, plans: dict = PLAN_LIMITS, flush_seconds: float = FLUSH_SECONDS,
+                 max_users: int = MAX_USERS, session_factory=SessionLocal):
+        self.plans = plans
+        self.flush_seconds = flush_seconds
+        self.max_users = max(1, max_users)
+        self.session_factory = session_factory
+
+        # (email, day) -> {"stored": tokens in the db when last read, "loaded_at": monotonic,
+        #                  "requests"/"prompt_tokens"/"output_tokens": not yet flushed}
+        self._usage = OrderedDict()
+        self._lock = threading.Lock()
+        # one flush at a time: the loop's flush may still be running when stop() flushes
+        self._flush_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+        self.over_budget = 0
+        self.flushes = 0
+        self.flush_errors = 0
+
+    @staticmethod
+    def _pending(entry: dict) -> int:
+        return entry["prompt_tokens"] + entry["output_tokens"]
+
+    def _entry(self, key) -> dict:
+        entry = self._usage.get(key)
+        if entry is None:
+            entry = {"stored": None, "loaded_at": 0.0, "requests": 0, "prompt_tokens": 0, "output_tokens": 0}
+            self._usage[key] = entry
+            self._evict()
+        self._usage.move_to_end(key)
+        return entry
+
+    def _evict(self):
+        # only entries with nothing left to flush can go
+        while len(self._usage) > self.max_users:
+            for key, entry in self._usage.items():
+                if not entry["requests"]:
+                    del self._usage[key]
+                    break
+            else:
+                return
+
+    def used_today(self, db: Session, email: str) -> int:
+        key = (email, datetime.utcnow().date())
+        with self._lock:
+            entry = self._entry(key)
+            fresh = entry["stored"] is not None and time.monotonic() - entry["loaded_at"] < self.flush_seconds
+            if fresh:
+                return entry["stored"] + self._pending(entry)
+
+        row = (
+            db.query(AIUsage.prompt_tokens, AIUsage.output_tokens)
+            .filter(AIUsage.user_email == email, AIUsage.day == key[1])
+            .first()
+        )
+        stored = (row[0] + row[1]) if row else 0
+        with self._lock:
+            entry = self._entry(key)
+            entry["stored"] = stored
+            entry["loaded_at"] = time.monotonic()
+            return stored + self._pending(entry)
+
+    def check(self, db: Session, email: str, plan: str):
+        """Raises 429 once the user has spent today's token budget."""
+        budget = (self.plans.get(plan) or self.plans["free"])["daily_tokens"]
+        if budget <= 0:
+            return
+        if self.used_today(db, email) >= budget:
+            self.over_budget += 1
+            raise _too_many(
+                "Daily AI usage limit reached. It resets at midnight UTC."
+                + (" Upgrade to premium for a higher limit." if plan != "premium" else ""),
+                _seconds_to_midnight(),
+            )
+
+    def record(self, email: str, usage: dict, prompt=None, reply=None):
+        """Counts one LLM call. `usage` is what llm.generate/stream filled in; falls back to estimates."""
+        prompt_tokens = usage.get("prompt_tokens") or estimate_tokens(prompt)
+        output_tokens = usage.get("output_tokens") or estimate_tokens(reply)
+        with self._lock:
+            entry = self._entry((email, datetime.utcnow().date()))
+            entry["requests"] += 1
+            entry["prompt_tokens"] += prompt_tokens
+            entry["output_tokens"] += output_tokens
+
+    def flush(self):
+        """Writes pending counts to ai_usage (one upsert per user) and reads back the totals."""
+        with self._flush_lock:
+            # counts stay pending until the commit succeeds, so a failed flush
+            # (or one that never gets a connection) loses nothing
+            with self._lock:
+                batch = [
+                    (key, entry["requests"], entry["prompt_tokens"], entry["output_tokens"])
+                    for key, entry in self._usage.items() if entry["requests"]
+                ]
+            if not batch:
+                return 0
+
+            try:
+                db = self.session_factory()
+                try:
+                    now = datetime.utcnow()
+                    for (email, day), requests, prompt_tokens, output_tokens in batch:
+                        insert_ignore(db, AIUsage, {
+                            "user_email": email, "day": day,
+                            "requests": 0, "prompt_tokens": 0, "output_tokens": 0,
+                        })
+                        db.query(AIUsage).filter(AIUsage.user_email == email, AIUsage.day == day).update({
+                            AIUsage.requests: AIUsage.requests + requests,
+                            AIUsage.prompt_tokens: AIUsage.prompt_tokens + prompt_tokens,
+                            AIUsage.output_tokens: AIUsage.output_tokens + output_tokens,
+                            AIUsage.updated_at: now,
+                        }, synchronize_session=False)
+                    db.commit()
+                except BaseException:
+                    db.rollback()
+                    raise
+                finally:
+                    db.close()
+            except BaseException:
+                self.flush_errors += 1
+                raise
+
+            # written: take the flushed amounts off (more may have been recorded
+            # meanwhile); the next check re-reads the total, which now includes
+            # other workers' usage
+            with self._lock:
+                for key, requests, prompt_tokens, output_tokens in batch:
+                    entry = self._entry(key)
+                    entry["requests"] -= requests
+                    entry["prompt_tokens"] -= prompt_tokens
+                    entry["output_tokens"] -= output_tokens
+                    entry["loaded_at"] = 0.0
+            self.flushes += 1
+            return len(batch)
+
+    async def start(self):
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await asyncio.to_thread(self.flush)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception:
+                # counts were kept; retried on the next tick
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending = sum(1 for e in self._usage.values() if e["requests"])
+            return {
+                "users": len(self._usage),
+                "pending_flush": pending,
+                "over_budget": self.over_budget,
+                "flushes": self.flushes,
+                "flush_errors": self.flush_errors,
+            }
+
+
+rate_limiter = RateLimiter()
+usage_meter = UsageMeter()
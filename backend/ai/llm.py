@@ -0,0 +1,53 @@
+# llm.py
+# Shared async gateway for every LLM call (AI tutor chat, file chat, quiz generation).
+# Handlers await these helpers instead of calling a provider SDK directly, so one
+# uvicorn worker can keep many LLM round trips in flight at once. The backend is
+# picked by LLM_PROVIDER (ai/providers.py: Gemini, or a local fake for load
+# tests), and every generate/stream/embed goes through the governor (ai/governor.py):
+# concurrency caps, deadlines, retries and the circuit breaker.
+from typing import Any, AsyncIterator, List, Optional
+
+from ai.governor import governor
+from ai.providers import get_provider
+
+provider = get_provider()
+
+
+def is_configured() -> bool:
+    return provider.is_configured()
+
+
+async def generate(model_name: str, contents: Any, generation_config: Optional[dict] = None,
+                   usage: Optional[dict] = None, premium: bool = False) -> str:
+    # Non-blocking generate under the governor; returns the stripped reply text.
+    # Pass a dict as `usage` to get prompt_tokens/output_tokens back; premium callers are admitted first.
+    return await governor.call(
+        model_name,
+        lambda: provider.generate(model_name, contents, generation_config, usage),
+        premium=premium,
+    )
+
+
+async def stream(model_name: str, contents: Any, generation_config: Optional[dict] = None,
+                 usage: Optional[dict] = None, premium: bool = False) -> AsyncIterator[str]:
+    # Yields reply text chunks as they are produced; `usage` is filled once the stream ends
+    async for text in governor.stream(
+        model_name,
+        lambda: provider.stream(model_name, contents, generation_config, usage),
+        premium=premium,
+    ):
+        yield text
+
+
+async def embed(model_name: str, texts: List[str], usage: Optional[dict] = None,
+                premium: bool = False) -> List[List[float]]:
+    # One vector per text (semantic cache); `usage` gets the estimated prompt tokens
+    return await governor.call(
+        model_name,
+        lambda: provider.embed(model_name, texts, usage),
+        premium=premium,
+    )
+
+
+async def upload_file(path, mime_type: Optional[str] = None):
+    return await provider.upload_file(path, mime_type=mime_type)
@@ -0,0 +1,275 @@
+# providers.py
+# LLM backends behind ai/llm.py, chosen with LLM_PROVIDER:
+#
+#   gemini (default)  the Gemini SDK, using GEMINI_API_KEY / GOOGLE_API_KEY
+#   fake              local and deterministic: no network and no quota, for load
+#                     tests and benchmarks of the whole API
+#
+# A provider has is_configured(), generate(), stream(), embed() and upload_file().
+# It fills the optional `usage` dict with prompt_tokens/output_tokens. Admission
+# control, deadlines and retries stay in ai/governor.py, which wraps the
+# provider, so a fake that is slow or failing exercises the real governor.
+#
+# Fake provider settings:
+#   LLM_FAKE_LATENCY            time to first token in ms, as "dist:args":
+#                               fixed:200 | uniform:100,400 | normal:300,80 |
+#                               lognormal:300,0.5 (median ms, sigma)  (default fixed:200)
+#   LLM_FAKE_TOKENS_PER_SECOND  output pace after the first token (default 200; 0 = instant)
+#   LLM_FAKE_REPLY_TOKENS       length of chat replies, capped by max_output_tokens (default 120)
+#   LLM_FAKE_CHUNK_TOKENS       tokens per streamed chunk (default 8)
+#   LLM_FAKE_ERROR_RATE         share of calls that fail with LLM_FAKE_ERROR_CODE (default 0)
+#   LLM_FAKE_ERROR_CODE         status the injected errors carry (default 503, retryable)
+#   LLM_FAKE_SEED               seed for latency and error draws (default 0)
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, List, Optional
+
+from dotenv import load_dotenv
+
+env_path = Path(__file__).resolve().parents[1] / ".env"
+load_dotenv(env_path)
+
+PROVIDER = os.getenv("LLM_PROVIDER", "gemini").strip().lower()
+
+
+# =========================================================
+# Gemini
+# =========================================================
+def _fill_usage(usage: Optional[dict], source):
+    # copies Gemini's token counts into the caller's dict (see ai/limits.py)
+    meta = getattr(source, "usage_metadata", None)
+    if usage is None or meta is None:
+        return
+    usage["prompt_tokens"] = getattr(meta, "prompt_token_count", 0) or 0
+    usage["output_tokens"] = getattr(meta, "candidates_token_count", 0) or 0
+
+
+class GeminiProvider:
+    name = "gemini"
+
+    def __init__(self, api_key: Optional[str] = None):
+        import google.generativeai as genai
+
+        self._genai = genai
+        self.api_key = api_key or os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
+        if self.api_key:
+            genai.configure(api_key=self.api_key)
+
+    def is_configured(self) -> bool:
+        return bool(self.api_key)
+
+    async def generate(self, model_name: str, contents: Any, generation_config: Optional[dict] = None,
+                       usage: Optional[dict] = None) -> str:
+        model = self._genai.GenerativeModel(model_name)
+        result = await model.generate_content_async(contents, generation_config=generation_config)
+        _fill_usage(usage, result)
+        return (getattr(result, "text", "") or "").strip()
+
+    async def stream(self, model_name: str, contents: Any, generation_config: Optional[dict] = None,
+                     usage: Optional[dict] = None) -> AsyncIterator[str]:
+        model = self._genai.GenerativeModel(model_name)
+        response = await model.generate_content_async(contents, generation_config=generation_config, stream=True)
+        async for chunk in response:
+            _fill_usage(usage, chunk)  # counts are cumulative; the last chunk has the totals
+            try:
+                text = chunk.text
+            except ValueError:
+                # chunk without text parts (e.g. only a finish reason)
+                continue
+            if text:
+                yield text
+
+    async def embed(self, model_name: str, texts: List[str], usage: Optional[dict] = None) -> List[List[float]]:
+        # the response carries no token counts, so estimate
+        result = await self._genai.embed_content_async(
+            model=model_name, content=texts, task_type="semantic_similarity"
+        )
+        if usage is not None:
+            usage["prompt_tokens"] = sum(max(1, len(t) // 4) for t in texts)
+            usage["output_tokens"] = 0
+        return result["embedding"]
+
+    async def upload_file(self, path, mime_type: Optional[str] = None):
+        # genai.upload_file has no async variant, so run it on a worker thread
+        return await asyncio.to_thread(self._genai.upload_file, path, mime_type=mime_type)
+
+
+# =========================================================
+# Fake
+# =========================================================
+class FakeUpstreamError(Exception):
+    """Injected failure; `code` is read by the governor like google.api_core's."""
+
+    def __init__(self, code: int):
+        super().__init__(f"Fake LLM error {code}")
+        self.code = code
+
+
+def parse_latency(spec: str):
+    """'fixed:200' | 'uniform:100,400' | 'normal:300,80' | 'lognormal:300,0.5' -> rng -> seconds."""
+    kind, _, args = (spec or "fixed:0").partition(":")
+    try:
+        nums = [float(x) for x in args.split(",") if x.strip()] or [0.0]
+    except ValueError:
+        raise ValueError(f"Invalid LLM_FAKE_LATENCY: {spec!r}")
+    kind = kind.strip().lower()
+    if kind == "fixed":
+        draw = lambda rng: nums[0]
+    elif kind == "uniform" and len(nums) == 2:
+        draw = lambda rng: rng.uniform(nums[0], nums[1])
+    elif kind == "normal" and len(nums) == 2:
+        draw = lambda rng: rng.gauss(nums[0], nums[1])
+    elif kind == "lognormal" and len(nums) == 2:
+        draw = lambda rng: rng.lognormvariate(math.log(max(nums[0], 1e-3)), nums[1])
+    else:
+        raise ValueError(f"Invalid LLM_FAKE_LATENCY: {spec!r}")
+    return lambda rng: max(0.0, draw(rng)) / 1000.0
+
+
+_WORDS = (
+    "concept example step idea rule value function result method answer case pattern "
+    "input output reason model data process change system question practice detail"
+).split()
+
+# Gemini bills an image or file part at roughly this many prompt tokens
+NON_TEXT_PART_TOKENS = 258
+
+
+class FakeProvider:
+    name = "fake"
+
+    def __init__(self):
+        self.latency = parse_latency(os.getenv("LLM_FAKE_LATENCY", "fixed:200"))
+        self.tokens_per_second = float(os.getenv("LLM_FAKE_TOKENS_PER_SECOND", "200"))
+        self.reply_tokens = int(os.getenv("LLM_FAKE_REPLY_TOKENS", "120"))
+        self.chunk_tokens = max(1, int(os.getenv("LLM_FAKE_CHUNK_TOKENS", "8")))
+        self.error_rate = float(os.getenv("LLM_FAKE_ERROR_RATE", "0"))
+        self.error_code = int(os.getenv("LLM_FAKE_ERROR_CODE", "503"))
+        # latency/error draws; replies come from a hash of the prompt instead
+        self.rng = random.Random(int(os.getenv("LLM_FAKE_SEED", "0")))
+
+    def is_configured(self) -> bool:
+        return True
+
+    # ----- content -----
+    @staticmethod
+    def _text(contents) -> str:
+        parts = contents if isinstance(contents, (list, tuple)) else [contents]
+        return "\n".join(p for p in parts if isinstance(p, str))
+
+    @staticmethod
+    def _prompt_tokens(contents) -> int:
+        parts = contents if isinstance(contents, (list, tuple)) else [contents]
+        return sum(max(1, len(p) // 4) if isinstance(p, str) else NON_TEXT_PART_TOKENS for p in parts)
+
+    @staticmethod
+    def _seeded(text: str) -> random.Random:
+        return random.Random(int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big"))
+
+    def _questions(self, rng: random.Random, title: str, difficulty: str, n: int) -> List[dict]:
+        out = []
+        for i in range(1, n + 1):
+            options = [f"{rng.choice(_WORDS).capitalize()} {rng.choice(_WORDS)} {k}" for k in "ABCD"]
+            out.append({
+                "question": f"[{difficulty}] Question {i} about {title}: which {rng.choice(_WORDS)} applies?",
+                "options": options,
+                "answer": options[rng.randrange(4)],
+                "explanation": f"Fake explanation for question {i}.",
+            })
+        return out
+
+    def _reply(self, contents, generation_config: Optional[dict]) -> str:
+        text = self._text(contents)
+        rng = self._seeded(text)
+        title = (re.search(r"^Lesson title: (.*)$", text, re.M) or [None, "the lesson"])[1]
+
+        # quiz prompts (quizzes.build_mcq_prompt / build_packed_mcq_prompt) get canned MCQ JSON
+        sets = re.findall(r'^- "set_(\d+)": (\d+) questions, difficulty (\S+)', text, re.M)
+        if sets:
+            return json.dumps({f"set_{i}": self._questions(rng, title, d, int(n)) for i, n, d in sets})
+        m = re.search(r"^Number of questions: (\d+)", text, re.M)
+        if m and "JSON" in text:
+            difficulty = (re.search(r"^Difficulty: (\S+)", text, re.M) or [None, "easy"])[1]
+            return json.dumps(self._questions(rng, title, difficulty, int(m.group(1))))
+
+        limit = (generation_config or {}).get("max_output_tokens") or self.reply_tokens
+        words = [rng.choice(_WORDS) for _ in range(max(1, min(self.reply_tokens, limit)))]
+        return "Fake reply. " + " ".join(words).capitalize() + "."
+
+    # ----- timing / failures -----
+    async def _first_token(self):
+        await asyncio.sleep(self.latency(self.rng))
+        if self.error_rate and self.rng.random() < self.error_rate:
+            raise FakeUpstreamError(self.error_code)
+
+    def _pace(self, tokens: int) -> float:
+        return tokens / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    # ----- provider API -----
+    async def generate(self, model_name: str, contents: Any, generation_config: Optional[dict] = None,
+                       usage: Optional[dict] = None) -> str:
+        await self._first_token()
+        reply = self._reply(contents, generation_config)
+        output_tokens = max(1, len(reply) // 4)
+        await asyncio.sleep(self._pace(output_tokens))
+        if usage is not None:
+            usage["prompt_tokens"] = self._prompt_tokens(contents)
+            usage["output_tokens"] = output_tokens
+        return reply
+
+    async def stream(self, model_name: str, contents: Any, generation_config: Optional[dict] = None,
+                     usage: Optional[dict] = None) -> AsyncIterator[str]:
+        await self._first_token()
+        reply = self._reply(contents, generation_config)
+        step = self.chunk_tokens * 4  # ~4 characters per token
+        sent = 0
+        for start in range(0, len(reply), step):
+            chunk = reply[start:start + step]
+            if start:
+                await asyncio.sleep(self._pace(self.chunk_tokens))
+            sent += max(1, len(chunk) // 4)
+            if usage is not None:
+                usage["prompt_tokens"] = self._prompt_tokens(contents)
+                usage["output_tokens"] = sent
+            yield chunk
+
+    async def embed(self, model_name: str, texts: List[str], usage: Optional[dict] = None) -> List[List[float]]:
+        from ai.semantic_cache import HashingEmbedder
+
+        await self._first_token()
+        if usage is not None:
+            usage["prompt_tokens"] = sum(max(1, len(t) // 4) for t in texts)
+            usage["output_tokens"] = 0
+        return HashingEmbedder()(texts).tolist()
+
+    async def upload_file(self, path, mime_type: Optional[str] = None):
+        if hasattr(path, "read"):
+            raw = path.read()
+        else:
+            raw = await asyncio.to_thread(Path(path).read_bytes)
+        await asyncio.sleep(self.latency(self.rng))
+        return SimpleNamespace(
+            name="files/fake-" + hashlib.sha256(raw).hexdigest()[:16],
+            mime_type=mime_type,
+            expiration_time=datetime.now(timezone.utc) + timedelta(hours=48),
+        )
+
+
+PROVIDERS = {"gemini": GeminiProvider, "fake": FakeProvider}
+
+
+def get_provider(name: str = PROVIDER):
+    try:
+        cls = PROVIDERS[name]
+    except KeyError:
+        raise RuntimeError(f"Unknown LLM_PROVIDER {name!r}; expected one of: {', '.join(PROVIDERS)}") from None
+    # outside the try: a KeyError raised while constructing is a real error, not an unknown name
+    return cls()
@@ -0,0 +1,270 @@
+# semantic_cache.py
+# Embedding-similarity cache for AI tutor answers, so paraphrased questions
+# ("what's recursion?" / "explain recursion to me") reuse one Gemini reply.
+#
+# Each scope (model + token cap + course/topic) has its own float32 matrix of
+# unit vectors. Lookups are a brute-force cosine (one matrix-vector product);
+# large scopes switch to IVF-style bucketing and only scan the closest buckets.
+# Scopes are kept in an LRU of at most AI_SEMANTIC_MAX_SCOPES, and the Gemini
+# embedder goes through ai/llm.py like every other LLM call (governed, metered).
+import asyncio
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from ai import llm
+
+ENABLED = os.getenv("AI_SEMANTIC_CACHE", "1") == "1"
+THRESHOLD = float(os.getenv("AI_SEMANTIC_THRESHOLD", "0.92"))
+MAX_PER_SCOPE = int(os.getenv("AI_SEMANTIC_MAX_PER_SCOPE", "5000"))
+# least recently used scopes are dropped beyond this many
+MAX_SCOPES = int(os.getenv("AI_SEMANTIC_MAX_SCOPES", "200"))
+# normalized topics are cut to this length in scope keys
+TOPIC_MAX_CHARS = 100
+TTL_SECONDS = int(os.getenv("AI_SEMANTIC_TTL_SECONDS", str(24 * 3600)))
+# gemini | hash; the fake LLM provider (load tests) defaults to the network-free one
+EMBEDDER = os.getenv("AI_SEMANTIC_EMBEDDER", "hash" if os.getenv("LLM_PROVIDER") == "fake" else "gemini")
+EMBED_MODEL = os.getenv("GEMINI_EMBED_MODEL", "models/text-embedding-004")
+
+# IVF kicks in once a scope holds this many vectors
+IVF_MIN_SIZE = int(os.getenv("AI_SEMANTIC_IVF_MIN_SIZE", "2048"))
+IVF_NPROBE = int(os.getenv("AI_SEMANTIC_IVF_NPROBE", "4"))
+
+Embedder = Callable[[List[str]], np.ndarray]
+
+
+# =========================================================
+# Embedders
+# =========================================================
+def _unit_rows(m: np.ndarray) -> np.ndarray:
+    m = np.asarray(m, dtype=np.float32)
+    if m.ndim == 1:
+        m = m.reshape(1, -1)
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return m / norms
+
+
+class HashingEmbedder:
+    """
+    Deterministic, network-free embedder (feature hashing of words + char trigrams).
+    Good enough for tests and local runs; paraphrase recall is lower than a real model.
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def _features(self, text: str):
+        words = re.findall(r"\w+", (text or "").casefold())
+        feats = list(words)
+        padded = " " + " ".join(words) + " "
+        feats += [padded[i : i + 3] for i in range(len(padded) - 2)]
+        return feats
+
+    def __call__(self, texts: List[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for f in self._features(text):
+                h = hashlib.blake2b(f.encode("utf-8"), digest_size=8).digest()
+                idx = int.from_bytes(h[:4], "little") % self.dim
+                sign = 1.0 if h[4] & 1 else -1.0
+                out[row, idx] += sign
+        return _unit_rows(out)
+
+
+class GeminiEmbedder:
+    """Embeds through the LLM gateway (ai/llm.py): governor limits, breaker and
+    retries apply, and `usage` is filled so the caller can meter the tokens."""
+
+    remote = True
+
+    def __init__(self, model: str = EMBED_MODEL):
+        self.model = model
+
+    async def __call__(self, texts: List[str], usage: Optional[dict] = None, premium: bool = False) -> np.ndarray:
+        vectors = await llm.embed(self.model, texts, usage=usage, premium=premium)
+        return _unit_rows(np.array(vectors, dtype=np.float32))
+
+
+# =========================================================
+# Vector index (one per scope)
+# =========================================================
+class VectorIndex:
+    def __init__(self, dim: int, capacity: int = MAX_PER_SCOPE, ivf_min_size: int = IVF_MIN_SIZE, nprobe: int = IVF_NPROBE):
+        self.dim = dim
+        self.capacity = max(1, capacity)
+        self.ivf_min_size = ivf_min_size
+        self.nprobe = max(1, nprobe)
+
+        self._vecs = np.zeros((min(64, self.capacity), dim), dtype=np.float32)
+        self._created = np.zeros(self._vecs.shape[0], dtype=np.float64)
+        self._answers: List[Optional[str]] = [None] * self._vecs.shape[0]
+        self._count = 0      # filled slots
+        self._next = 0       # next slot to write (ring buffer once full)
+
+        self._centroids: Optional[np.ndarray] = None
+        self._bucket_of: Optional[np.ndarray] = None
+        self._built_at = 0
+
+    def __len__(self):
+        return self._count
+
+    def add(self, vec: np.ndarray, answer: str):
+        if self._next >= self._vecs.shape[0] and self._vecs.shape[0] < self.capacity:
+            self._grow()
+
+        slot = self._next
+        self._vecs[slot] = vec
+        self._created[slot] = time.time()
+        self._answers[slot] = answer
+        self._count = max(self._count, slot + 1)
+        self._next = (slot + 1) % self.capacity
+
+        if self._centroids is not None:
+            self._bucket_of[slot] = int(np.argmax(self._centroids @ vec))
+        if self._count >= self.ivf_min_size and self._count >= 2 * max(self._built_at, self.ivf_min_size // 2):
+            self._build_ivf()
+
+    def search(self, vec: np.ndarray, min_created: float = 0.0) -> Tuple[Optional[str], float]:
+        if not self._count:
+            return None, 0.0
+
+        if self._centroids is not None:
+            close = np.argsort(self._centroids @ vec)[-self.nprobe :]
+            rows = np.nonzero(np.isin(self._bucket_of[: self._count], close))[0]
+        else:
+            rows = np.arange(self._count)
+
+        if min_created:
+            rows = rows[self._created[rows] >= min_created]
+        if not rows.size:
+            return None, 0.0
+
+        sims = self._vecs[rows] @ vec
+        best = int(np.argmax(sims))
+        return self._answers[int(rows[best])], float(sims[best])
+
+    def _grow(self):
+        new_size = min(self.capacity, self._vecs.shape[0] * 2)
+        extra = new_size - self._vecs.shape[0]
+        self._vecs = np.vstack([self._vecs, np.zeros((extra, self.dim), dtype=np.float32)])
+        self._created = np.concatenate([self._created, np.zeros(extra, dtype=np.float64)])
+        self._answers.extend([None] * extra)
+        if self._bucket_of is not None:
+            self._bucket_of = np.concatenate([self._bucket_of, np.zeros(extra, dtype=np.int32)])
+
+    def _build_ivf(self, iterations: int = 8):
+        # small spherical k-means over the filled rows
+        data = self._vecs[: self._count]
+        nlist = max(2, int(np.sqrt(self._count)))
+        rng = np.random.default_rng(0)
+        centroids = data[rng.choice(self._count, size=nlist, replace=False)].copy()
+
+        for _ in range(iterations):
+            assign = np.argmax(data @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = data[assign == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            centroids = _unit_rows(centroids)
+
+        self._centroids = centroids
+        self._bucket_of = np.zeros(self._vecs.shape[0], dtype=np.int32)
+        self._bucket_of[: self._count] = np.argmax(data @ centroids.T, axis=1)
+        self._built_at = self._count
+
+
+# =========================================================
+# Cache facade used by gemini_chat.py
+# =========================================================
+class SemanticCache:
+    def __init__(self, embedder: Embedder, threshold: float = THRESHOLD, ttl_seconds: int = TTL_SECONDS,
+                 max_scopes: int = MAX_SCOPES):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_scopes = max(1, max_scopes)
+
+        self._lock = threading.Lock()
+        self._indexes = OrderedDict()  # scope -> VectorIndex, least recently used first
+
+        self.hits = 0
+        self.misses = 0
+        self.scope_evictions = 0
+
+    def set_embedder(self, embedder: Embedder):
+        # swapping embedders changes the vector space, so drop old indexes
+        with self._lock:
+            self.embedder = embedder
+            self._indexes.clear()
+
+    async def embed(self, text: str, usage: Optional[dict] = None, premium: bool = False) -> np.ndarray:
+        """Remote embedders fill `usage` (tokens to meter); local ones run on a worker thread."""
+        if getattr(self.embedder, "remote", False):
+            m = await self.embedder([text], usage=usage, premium=premium)
+        else:
+            m = await asyncio.to_thread(self.embedder, [text])
+        return _unit_rows(m)[0]
+
+    def lookup(self, scope: str, vec: np.ndarray) -> Tuple[Optional[str], float]:
+        with self._lock:
+            index = self._indexes.get(scope)
+            answer, score = (None, 0.0)
+            if index is not None:
+                self._indexes.move_to_end(scope)
+                answer, score = index.search(vec, min_created=time.time() - self.ttl_seconds)
+
+            if answer is not None and score >= self.threshold:
+                self.hits += 1
+                return answer, score
+            self.misses += 1
+            return None, score
+
+    def add(self, scope: str, vec: np.ndarray, answer: str):
+        if not answer:
+            return
+        with self._lock:
+            index = self._indexes.get(scope)
+            if index is None:
+                index = VectorIndex(dim=vec.shape[0])
+                self._indexes[scope] = index
+                while len(self._indexes) > self.max_scopes:
+                    self._indexes.popitem(last=False)
+                    self.scope_evictions += 1
+            self._indexes.move_to_end(scope)
+            index.add(vec, answer)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": ENABLED,
+                "threshold": self.threshold,
+                "scopes": len(self._indexes),
+                "max_scopes": self.max_scopes,
+                "scope_evictions": self.scope_evictions,
+                "vectors": sum(len(i) for i in self._indexes.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def make_scope(model_name: str, max_tokens: int, course_id: Optional[int] = None, topic: Optional[str] = None) -> str:
+    topic_key = re.sub(r"\s+", " ", (topic or "").strip().casefold())[:TOPIC_MAX_CHARS] or "-"
+    return f"{model_name}|{max_tokens}|{course_id if course_id is not None else '-'}|{topic_key}"
+
+
+def _default_embedder() -> Embedder:
+    if EMBEDDER == "hash":
+        return HashingEmbedder()
+    return GeminiEmbedder()
+
+
+semantic_cache = SemanticCache(_default_embedder())
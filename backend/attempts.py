@@ -1,11 +1,14 @@
 from datetime import datetime, timedelta
-import json
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
+import course_progress
+from authz import course_access
 from deps import get_db, require_role
-from models import Quiz, Lesson, Course, Enrollment, QuizAttempt, TopicMastery
+from grading_cache import get_grading_plan
+from models import QuizAttempt, StudentStats, StudentWeekly, TopicMastery
+from student_stats import record_attempt, week_start
 
 router = APIRouter(prefix="/attempts", tags=["attempts"])
 
@@ -22,27 +25,14 @@ def submit_attempt(
     db: Session = Depends(get_db),
     user=Depends(require_role("student"))
 ):
-    quiz = db.query(Quiz).filter(Quiz.id == quiz_id).first()
-    if not quiz:
-        raise HTTPException(status_code=404, detail="Quiz not found")
-
-    lesson = db.query(Lesson).filter(Lesson.id == quiz.lesson_id).first()
-    if not lesson:
-        raise HTTPException(status_code=404, detail="Lesson not found")
-
-    course = db.query(Course).filter(Course.id == lesson.course_id).first()
-    if not course:
-        raise HTTPException(status_code=404, detail="Course not found")
+    # answer key + topic/subject/course in one cached lookup
+    plan = get_grading_plan(db, quiz_id)
 
     # Student must be enrolled
-    enrolled = db.query(Enrollment).filter(
-        Enrollment.course_id == course.id,
-        Enrollment.student_email == user["email"]
-    ).first()
-    if not enrolled:
+    if not course_access(db, user["email"], plan.course_id).enrolled:
         raise HTTPException(status_code=403, detail="You are not enrolled in this course")
 
-    questions = json.loads(quiz.questions_json or "[]")
+    questions = plan.answer_key
 
     if len(data.answers) != len(questions):
         raise HTTPException(status_code=400, detail="Answers count must match questions count")
@@ -50,14 +40,13 @@ def submit_attempt(
     # Grade
     correct = 0
     results = []
-    for i, q in enumerate(questions):
+    for i, (question, correct_ans) in enumerate(questions):
         student_ans = data.answers[i]
-        correct_ans = q.get("answer")
         is_correct = (student_ans == correct_ans)
         if is_correct:
             correct += 1
         results.append({
-            "question": q.get("question"),
+            "question": question,
             "student_answer": student_ans,
             "correct_answer": correct_ans,
             "is_correct": is_correct
@@ -66,17 +55,22 @@ def submit_attempt(
     score_percent = (correct / len(questions)) * 100.0 if questions else 0.0
 
     # Save attempt
+    submitted_at = datetime.utcnow()
     attempt = QuizAttempt(
         quiz_id=quiz_id,
         student_email=user["email"],
         score=score_percent,
-        submitted_at=datetime.utcnow()
+        submitted_at=submitted_at
     )
     db.add(attempt)
 
+    # dashboard rollups, committed together with the attempt
+    record_attempt(db, user["email"], score_percent, submitted_at)
+    course_progress.record_attempt(db, plan.course_id, user["email"], score_percent, submitted_at)
+
     # Update TopicMastery (simple mastery update)
-    subject = course.subject
-    topic = lesson.topic
+    subject = plan.subject
+    topic = plan.topic
 
     mastery = db.query(TopicMastery).filter(
         TopicMastery.student_email == user["email"],
@@ -118,11 +112,10 @@ def my_stats(
     db: Session = Depends(get_db),
     user=Depends(require_role("student"))
 ):
-    rows = db.query(QuizAttempt.score, QuizAttempt.submitted_at).filter(
-        QuizAttempt.student_email == user["email"]
-    ).all()
+    # one rollup row instead of every attempt (see student_stats.py)
+    stats = db.query(StudentStats).filter(StudentStats.student_email == user["email"]).first()
 
-    if not rows:
+    if not stats or not stats.attempt_count:
         return {
             "student_email": user["email"],
             "total_attempts": 0,
@@ -134,39 +127,17 @@ def my_stats(
             "last_attempt_at": None,
         }
 
-    scores = []
-    last_dt = None
-    days = set()
-
-    for score, submitted_at in rows:
-        if score is not None:
-            scores.append(float(score))
-        if submitted_at:
-            days.add(submitted_at.date())
-            if last_dt is None or submitted_at > last_dt:
-                last_dt = submitted_at
-
-    total_attempts = len(rows)
-    avg_score = round(sum(scores) / len(scores), 2) if scores else 0.0
-    highest_score = round(max(scores), 2) if scores else None
-    lowest_score = round(min(scores), 2) if scores else None
-
-    # Consecutive-day streak ending at the most recent attempt date
-    streak = 0
-    if last_dt:
-        cursor = last_dt.date()
-        while cursor in days:
-            streak += 1
-            cursor = cursor - timedelta(days=1)
+    total_attempts = stats.attempt_count
+    last_dt = stats.last_attempt_at
 
     return {
         "student_email": user["email"],
         "total_attempts": total_attempts,
         "quizzes_done": total_attempts,  # alias for old UI
-        "avg_score": avg_score,
-        "highest_score": highest_score,
-        "lowest_score": lowest_score,
-        "streak_days": streak,
+        "avg_score": round(stats.score_sum / total_attempts, 2),
+        "highest_score": round(stats.max_score, 2) if stats.max_score is not None else None,
+        "lowest_score": round(stats.min_score, 2) if stats.min_score is not None else None,
+        "streak_days": stats.streak_days or 0,
         "last_attempt_at": last_dt.isoformat() if last_dt else None,
     }
 
@@ -186,26 +157,15 @@ def my_weekly_progress(
         weeks = 52
 
     end_dt = datetime.utcnow()
-    start_dt = end_dt - timedelta(days=7 * weeks)
+    first_week = week_start(end_dt - timedelta(days=7 * (weeks - 1)))
 
-    attempts = db.query(QuizAttempt.score, QuizAttempt.submitted_at).filter(
-        QuizAttempt.student_email == user["email"],
-        QuizAttempt.submitted_at >= start_dt
+    # at most `weeks` pre-aggregated rows (see student_stats.py)
+    rows = db.query(StudentWeekly.week_start, StudentWeekly.score_sum, StudentWeekly.attempt_count).filter(
+        StudentWeekly.student_email == user["email"],
+        StudentWeekly.week_start >= first_week
     ).all()
 
-    def week_start(d: datetime):
-        monday = d.date() - timedelta(days=d.date().weekday())
-        return monday
-
-    buckets = {}
-    for score, submitted_at in attempts:
-        if not submitted_at:
-            continue
-        ws = week_start(submitted_at)
-        if ws not in buckets:
-            buckets[ws] = {"sum": 0.0, "count": 0}
-        buckets[ws]["sum"] += float(score or 0.0)
-        buckets[ws]["count"] += 1
+    buckets = {ws: {"sum": float(total or 0.0), "count": n or 0} for ws, total, n in rows}
 
     labels = []
     avg_scores = []
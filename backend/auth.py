@@ -1,35 +1,29 @@
-import hashlib
+import asyncio
 import random
 from datetime import datetime, timedelta
-from fastapi import Request
+from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from fastapi import APIRouter, Depends, HTTPException, Request
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
-from database import SessionLocal
+import auth_sessions
+from deps import get_db, get_current_user
+from hashing import hasher
 from models import User
+from security import (
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    bearer_token,
+    create_access_token,
+    decode_token,
+    get_profile,
+    invalidate_user,
+    mark_sessions_revoked,
+    require_profile,
+)
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
-# These should be moved to .env later for security
-SECRET_KEY = "CHANGE_ME_LATER"
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-
-def get_db():
-    # Opens a database session for each request, then closes it safely
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 
 class RegisterReq(BaseModel):
     email: str
@@ -42,6 +36,14 @@ class LoginReq(BaseModel):
     password: str
 
 
+class RefreshReq(BaseModel):
+    refresh_token: str
+
+
+class LogoutReq(BaseModel):
+    refresh_token: Optional[str] = None
+
+
 class ForgotPasswordReq(BaseModel):
     email: str
 
@@ -52,88 +54,132 @@ class ResetPasswordReq(BaseModel):
     new_password: str
 
 
-def _pre_hash(password: str) -> str:
-    # bcrypt has a 72-byte limit; pre-hashing prevents errors for long passwords
-    return hashlib.sha256(password.encode("utf-8")).hexdigest()
-
-
-def hash_password(password: str) -> str:
-    return pwd_context.hash(_pre_hash(password))
-
+# bcrypt runs in the hashing pool (see hashing.py), so these handlers are async.
+# Everything they do with the database (lookups, session writes and the commit)
+# runs on a worker thread, so the event loop never waits on a query or on the
+# SQLite writer lock.
+def _find_user(db: Session, email: str) -> Optional[User]:
+    return db.query(User).filter(User.email == email).first()
 
-def verify_password(password: str, hashed: str) -> bool:
-    return pwd_context.verify(_pre_hash(password), hashed)
 
-
-def create_access_token(email: str, role: str) -> str:
-    # JWT stores email (sub) and role, with expiry
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    payload = {"sub": email, "role": role, "exp": expire}
-    return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
-
-
-def _get_bearer_token(request: Request) -> str:
-    # Reads token from Authorization: Bearer <token>
-    authorization = request.headers.get("Authorization") or request.headers.get("authorization")
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Missing Bearer token")
-    return authorization.split(" ", 1)[1].strip()
+def _commit_with_session(db: Session, email: str):
+    # (session_id, refresh_token); commits the password upgrade along with it
+    sid, refresh_token = auth_sessions.start_session(db, email)
+    db.commit()
+    return sid, refresh_token
 
 
-def _decode_token(token: str) -> dict:
-    # Validates and decodes JWT token
-    try:
-        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+def _commit_with_sign_out(db: Session, email: str):
+    # revokes every session of the user in the same transaction as the new password
+    sids = auth_sessions.revoke_user_sessions(db, email)
+    db.commit()
+    return sids
 
 
 @router.post("/register")
-def register(data: RegisterReq, db: Session = Depends(get_db)):
+async def register(data: RegisterReq, db: Session = Depends(get_db)):
     # Basic role validation
     if data.role not in ["student", "teacher", "admin"]:
         raise HTTPException(status_code=400, detail="Invalid role")
 
     # Prevent duplicate accounts
-    existing = db.query(User).filter(User.email == data.email).first()
+    existing = await asyncio.to_thread(_find_user, db, data.email)
     if existing:
         raise HTTPException(status_code=400, detail="Email already exists")
 
     # New users default to free plan based on model default
     user = User(
         email=data.email,
-        hashed_password=hash_password(data.password),
+        hashed_password=await hasher.hash(data.password),
         role=data.role,
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await asyncio.to_thread(db.commit)
 
     return {"message": "Registered successfully"}
 
 
 @router.post("/login")
-def login(data: LoginReq, db: Session = Depends(get_db)):
+async def login(data: LoginReq, db: Session = Depends(get_db)):
     # Checks user exists and password matches
-    user = db.query(User).filter(User.email == data.email).first()
+    user = await asyncio.to_thread(_find_user, db, data.email)
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
-    if not verify_password(data.password, user.hashed_password):
+    ok, new_hash = await hasher.verify(data.password, user.hashed_password)
+    if not ok:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
-    token = create_access_token(user.email, user.role)
+    if new_hash:
+        # stored with an old BCRYPT_ROUNDS; upgrade while we have the plaintext
+        user.hashed_password = new_hash
+
+    # read before the commit expires the instance
+    email, role, plan, premium_until = user.email, user.role, getattr(user, "plan", "free"), user.premium_until
+
+    sid, refresh_token = await asyncio.to_thread(_commit_with_session, db, email)
+
+    token = create_access_token(email, role, sid=sid)
 
     # Returning plan helps frontend show Freeo rPremium immediately after login
     return {
         "access_token": token,
         "token_type": "bearer",
-        "role": user.role,
-        "plan": getattr(user, "plan", "free"),
-        "premium_until": user.premium_until.isoformat() if getattr(user, "premium_until", None) else None,
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+        "refresh_token": refresh_token,
+        "role": role,
+        "plan": plan,
+        "premium_until": premium_until.isoformat() if premium_until else None,
     }
 
 
+@router.post("/refresh")
+def refresh(data: RefreshReq, db: Session = Depends(get_db)):
+    # New access + refresh token pair; no password check, so no bcrypt
+    sid, email, refresh_token = auth_sessions.rotate(db, data.refresh_token)
+
+    profile = get_profile(db, email)
+    if profile is None:
+        mark_sessions_revoked(auth_sessions.revoke_session(db, sid))
+        db.commit()
+        raise HTTPException(status_code=401, detail="User not found")
+
+    return {
+        "access_token": create_access_token(profile.email, profile.role, sid=sid),
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+        "refresh_token": refresh_token,
+        "role": profile.role,
+        "plan": profile.plan,
+        "premium_until": profile.premium_until.isoformat() if profile.premium_until else None,
+    }
+
+
+@router.post("/logout")
+def logout(request: Request, data: Optional[LogoutReq] = None, db: Session = Depends(get_db)):
+    # Ends the session named by the refresh token and/or the bearer token's sid.
+    # Always succeeds, so a client can sign out with an already-expired token.
+    sids = set()
+    if data and data.refresh_token:
+        sid = auth_sessions.session_for_token(db, data.refresh_token)
+        if sid:
+            sids.add(sid)
+    try:
+        sid = decode_token(bearer_token(request)).get("sid")
+        if sid:
+            sids.add(sid)
+    except HTTPException:
+        pass
+
+    revoked = []
+    for sid in sids:
+        revoked += auth_sessions.revoke_session(db, sid)
+    db.commit()
+    mark_sessions_revoked(revoked)
+
+    return {"message": "Logged out"}
+
+
 @router.post("/forgot-password")
 def forgot_password(data: ForgotPasswordReq, db: Session = Depends(get_db)):
     # Demo OTP flow (later can be replaced with email sending)
@@ -151,8 +197,8 @@ def forgot_password(data: ForgotPasswordReq, db: Session = Depends(get_db)):
 
 
 @router.post("/reset-password")
-def reset_password(data: ResetPasswordReq, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == data.email).first()
+async def reset_password(data: ResetPasswordReq, db: Session = Depends(get_db)):
+    user = await asyncio.to_thread(_find_user, db, data.email)
     if not user:
         raise HTTPException(status_code=404, detail="Email not found")
 
@@ -165,78 +211,59 @@ def reset_password(data: ResetPasswordReq, db: Session = Depends(get_db)):
     if data.otp != user.reset_otp:
         raise HTTPException(status_code=400, detail="Invalid OTP")
 
-    user.hashed_password = hash_password(data.new_password)
+    user.hashed_password = await hasher.hash(data.new_password)
     user.reset_otp = None
     user.reset_otp_expiry = None
-    db.commit()
+    # signed in elsewhere with the old password: sign those devices out
+    sids = await asyncio.to_thread(_commit_with_sign_out, db, user.email)
+    mark_sessions_revoked(sids)
 
     return {"message": "Password reset successful"}
 
 
 @router.get("/me")
-def me(request: Request, db: Session = Depends(get_db)):
-    # Uses token email to load the latest user data from DB (plan can change over time)
-    token = _get_bearer_token(request)
-    payload = _decode_token(token)
-
-    email = payload.get("sub")
-    if not email:
-        raise HTTPException(status_code=401, detail="Invalid token payload")
-
-    user = db.query(User).filter(User.email == email).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+def me(db: Session = Depends(get_db), user=Depends(get_current_user)):
+    # Latest plan/role (plan can change over time), from the profile cache when warm
+    profile = require_profile(db, user["email"])
 
     return {
-        "email": user.email,
-        "role": user.role,
-        "plan": getattr(user, "plan", "free"),
-        "premium_until": user.premium_until.isoformat() if getattr(user, "premium_until", None) else None,
+        "email": profile.email,
+        "role": profile.role,
+        "plan": profile.plan,
+        "premium_until": profile.premium_until.isoformat() if profile.premium_until else None,
     }
 
 
 @router.post("/upgrade")
-def upgrade(request: Request, db: Session = Depends(get_db)):
+def upgrade(db: Session = Depends(get_db), user=Depends(get_current_user)):
     # Demo upgrade endpoint without payment
     # Later this should be triggered only after payment confirmation (Stripe webhook)
-    token = _get_bearer_token(request)
-    payload = _decode_token(token)
-
-    email = payload.get("sub")
-    if not email:
-        raise HTTPException(status_code=401, detail="Invalid token payload")
-
-    user = db.query(User).filter(User.email == email).first()
-    if not user:
+    u = db.query(User).filter(User.email == user["email"]).first()
+    if not u:
         raise HTTPException(status_code=404, detail="User not found")
 
-    user.plan = "premium"
-    user.premium_until = datetime.utcnow() + timedelta(days=30)
+    u.plan = "premium"
+    u.premium_until = datetime.utcnow() + timedelta(days=30)
     db.commit()
+    invalidate_user(u.email)
 
     return {
         "message": "Upgraded to premium",
-        "plan": user.plan,
-        "premium_until": user.premium_until.isoformat() if user.premium_until else None,
+        "plan": u.plan,
+        "premium_until": u.premium_until.isoformat() if u.premium_until else None,
     }
 
 
 @router.post("/downgrade")
-def downgrade(request: Request, db: Session = Depends(get_db)):
+def downgrade(db: Session = Depends(get_db), user=Depends(get_current_user)):
     # Demo downgrade endpoint
-    token = _get_bearer_token(request)
-    payload = _decode_token(token)
-
-    email = payload.get("sub")
-    if not email:
-        raise HTTPException(status_code=401, detail="Invalid token payload")
-
-    user = db.query(User).filter(User.email == email).first()
-    if not user:
+    u = db.query(User).filter(User.email == user["email"]).first()
+    if not u:
         raise HTTPException(status_code=404, detail="User not found")
 
-    user.plan = "free"
-    user.premium_until = None
+    u.plan = "free"
+    u.premium_until = None
     db.commit()
+    invalidate_user(u.email)
 
-    return {"message": "Downgraded to free", "plan": user.plan, "premium_until": None}
+    return {"message": "Downgraded to free", "plan": u.plan, "premium_until": None}
@@ -0,0 +1,190 @@
+# auth_sessions.py
+# Sign-in sessions and rotating refresh tokens.
+#
+# Login (bcrypt, ~250 ms of CPU) starts a session and hands out a short-lived
+# access token plus a refresh token. /auth/refresh trades the refresh token for a
+# new pair with a couple of indexed queries and no password hashing, so clients
+# stay signed in without going back through bcrypt every hour.
+#
+# Each refresh token works once. Presenting an already-rotated token again means
+# it was copied, so the whole session is revoked (a short grace window covers two
+# tabs refreshing at the same moment). Revoked sessions are also refused by
+# security.get_current_user via the access token's "sid" claim.
+#
+#   python auth_sessions.py prune      delete expired tokens and old sessions
+import argparse
+import hashlib
+import os
+import secrets
+import sys
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from models import AuthSession, RefreshToken
+from security import mark_sessions_revoked
+
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "14"))
+# a token rotated this recently may be presented again (racing tabs) without revoking the session
+REFRESH_REUSE_GRACE_SECONDS = int(os.getenv("REFRESH_REUSE_GRACE_SECONDS", "10"))
+# revoked/expired sessions are kept this long for auditing before prune deletes them
+SESSION_RETENTION_DAYS = int(os.getenv("SESSION_RETENTION_DAYS", "30"))
+
+
+def _hash(raw: str) -> str:
+    # refresh tokens are random, so a plain SHA-256 is enough (no bcrypt needed)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _issue(db: Session, session_id: str, now: datetime) -> str:
+    raw = secrets.token_urlsafe(32)
+    db.add(RefreshToken(
+        session_id=session_id,
+        token_hash=_hash(raw),
+        created_at=now,
+        expires_at=now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+    ))
+    return raw
+
+
+def start_session(db: Session, email: str) -> Tuple[str, str]:
+    """(session_id, refresh_token) for a fresh sign-in (caller commits)."""
+    now = datetime.utcnow()
+    sid = secrets.token_urlsafe(16)
+    db.add(AuthSession(
+        id=sid,
+        user_email=email,
+        created_at=now,
+        expires_at=now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+    ))
+    db.flush()
+    return sid, _issue(db, sid, now)
+
+
+def _invalid(detail: str = "Invalid refresh token") -> HTTPException:
+    return HTTPException(status_code=401, detail=detail)
+
+
+def rotate(db: Session, raw: str) -> Tuple[str, str, str]:
+    """Spends a refresh token: (session_id, user_email, new_refresh_token). Commits."""
+    now = datetime.utcnow()
+    row = (
+        db.query(RefreshToken.id, RefreshToken.expires_at, RefreshToken.used_at,
+                 AuthSession.id, AuthSession.user_email, AuthSession.expires_at, AuthSession.revoked_at)
+        .join(AuthSession, AuthSession.id == RefreshToken.session_id)
+        .filter(RefreshToken.token_hash == _hash(raw or ""))
+        .first()
+    )
+    if not row:
+        raise _invalid()
+    token_id, token_expires, used_at, sid, email, session_expires, revoked_at = row
+
+    if revoked_at is not None:
+        raise _invalid("Session ended. Please sign in again.")
+    if session_expires <= now or token_expires <= now:
+        raise _invalid("Session expired. Please sign in again.")
+
+    if used_at is not None:
+        if (now - used_at).total_seconds() <= REFRESH_REUSE_GRACE_SECONDS:
+            raise _invalid("Refresh token already used")
+        revoke_session(db, sid)
+        db.commit()
+        mark_sessions_revoked([sid])
+        raise _invalid("Refresh token reuse detected. Please sign in again.")
+
+    # claim the token; of two concurrent refreshes only one gets rowcount 1
+    claimed = (
+        db.query(RefreshToken)
+        .filter(RefreshToken.id == token_id, RefreshToken.used_at.is_(None))
+        .update({RefreshToken.used_at: now}, synchronize_session=False)
+    )
+    if claimed != 1:
+        db.rollback()
+        raise _invalid("Refresh token already used")
+
+    new_raw = _issue(db, sid, now)
+    db.query(AuthSession).filter(AuthSession.id == sid).update({
+        AuthSession.last_refreshed_at: now,
+        AuthSession.expires_at: now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+    }, synchronize_session=False)
+    db.commit()
+    return sid, email, new_raw
+
+
+def session_for_token(db: Session, raw: str):
+    """Session id a refresh token belongs to, or None."""
+    row = db.query(RefreshToken.session_id).filter(RefreshToken.token_hash == _hash(raw or "")).first()
+    return row[0] if row else None
+
+
+def revoke_session(db: Session, sid: str) -> List[str]:
+    """Caller commits, then calls security.mark_sessions_revoked with the result."""
+    revoked = (
+        db.query(AuthSession)
+        .filter(AuthSession.id == sid, AuthSession.revoked_at.is_(None))
+        .update({AuthSession.revoked_at: datetime.utcnow()}, synchronize_session=False)
+    )
+    return [sid] if revoked else []
+
+
+def revoke_user_sessions(db: Session, email: str) -> List[str]:
+    """Signs the user out everywhere (password reset, account deletion). Caller commits."""
+    sids = [
+        sid for (sid,) in db.query(AuthSession.id)
+        .filter(AuthSession.user_email == email, AuthSession.revoked_at.is_(None))
+        .all()
+    ]
+    if sids:
+        db.query(AuthSession).filter(AuthSession.id.in_(sids)).update(
+            {AuthSession.revoked_at: datetime.utcnow()}, synchronize_session=False
+        )
+    return sids
+
+
+def prune(db: Session) -> Tuple[int, int]:
+    """Deletes expired tokens and sessions that ended over SESSION_RETENTION_DAYS ago. Commits."""
+    now = datetime.utcnow()
+    cutoff = now - timedelta(days=SESSION_RETENTION_DAYS)
+
+    old_sessions = db.query(AuthSession.id).filter(
+        or_(AuthSession.expires_at < cutoff, AuthSession.revoked_at < cutoff)
+    )
+    # used tokens stay until they expire, so a replayed one still revokes its session
+    tokens = (
+        db.query(RefreshToken)
+        .filter(or_(
+            RefreshToken.expires_at < now,
+            RefreshToken.session_id.in_(old_sessions),
+        ))
+        .delete(synchronize_session=False)
+    )
+    sessions = (
+        db.query(AuthSession)
+        .filter(or_(AuthSession.expires_at < cutoff, AuthSession.revoked_at < cutoff))
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return tokens, sessions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Maintain sign-in sessions and refresh tokens.")
+    parser.add_argument("command", choices=["prune"])
+    parser.parse_args(argv)
+
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        tokens, sessions = prune(db)
+    finally:
+        db.close()
+    print("pruned", tokens, "refresh tokens,", sessions, "sessions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,276 @@
+# authz.py
+# Course access checks (owner teacher / enrolled student) shared by the routers.
+#
+# Resolving quiz -> lesson -> course -> enrollment used to take 3-4 queries per
+# request. Here it is one joined query, memoized for the rest of the request on
+# the session (db.info) and for a few seconds per process, keyed by
+# (email, course). Enrollment and course/lesson/quiz deletes invalidate locally;
+# the TTL bounds staleness across workers, which don't share invalidations.
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from fastapi import Depends, HTTPException
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+
+from deps import get_db, get_current_user
+from models import Course, Enrollment, Lesson, Quiz
+
+MAX_ENTRIES = int(os.getenv("AUTHZ_CACHE_MAX_ENTRIES", "4096"))
+TTL_SECONDS = int(os.getenv("AUTHZ_CACHE_TTL_SECONDS", "30"))
+
+
+class Access(NamedTuple):
+    course_id: int
+    teacher_email: str
+    email: str       # whose access this is
+    enrolled: bool   # email is enrolled in the course
+    lesson_id: Optional[int] = None
+    quiz_id: Optional[int] = None
+
+
+class AccessCache:
+    """TTL LRU holding two kinds of entries:
+    ("course", email, course_id) -> (teacher_email, enrolled)
+    ("lesson", lesson_id) -> course_id, ("quiz", quiz_id) -> (lesson_id, course_id)
+    The parent links never change while the rows exist."""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, ttl_seconds: int = TTL_SECONDS):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self._items = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and item[1] > time.time():
+                self._items.move_to_end(key)
+                self.hits += 1
+                return item[0]
+            if item is not None:
+                del self._items[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = (value, time.time() + self.ttl_seconds)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def invalidate_enrollment(self, course_id: int, email: str):
+        with self._lock:
+            if self._items.pop(("course", email, course_id), None) is not None:
+                self.invalidations += 1
+
+    def invalidate_student(self, email: str):
+        self._invalidate_where(lambda key, _v: key[0] == "course" and key[1] == email)
+
+    def invalidate_course(self, course_id: int):
+        def match(key, value):
+            if key[0] == "course":
+                return key[2] == course_id
+            if key[0] == "lesson":
+                return value == course_id
+            return value[1] == course_id
+        self._invalidate_where(match)
+
+    def invalidate_lesson(self, lesson_id: int):
+        self._invalidate_where(
+            lambda key, value: key == ("lesson", lesson_id) or (key[0] == "quiz" and value[0] == lesson_id)
+        )
+
+    def invalidate_quiz(self, quiz_id: int):
+        with self._lock:
+            if self._items.pop(("quiz", quiz_id), None) is not None:
+                self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._items),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def _invalidate_where(self, match):
+        with self._lock:
+            stale = [key for key, (value, _exp) in self._items.items() if match(key, value)]
+            for key in stale:
+                del self._items[key]
+            self.invalidations += len(stale)
+
+
+access_cache = AccessCache()
+
+
+# =========================================================
+# Resolution
+# =========================================================
+def _memo(db: Session) -> dict:
+    # one session per request, so its info dict is a per-request memo
+    return db.info.setdefault("authz", {})
+
+
+def _enrollment_join(email: str):
+    return and_(Enrollment.course_id == Course.id, Enrollment.student_email == email)
+
+
+def course_access(db: Session, email: str, course_id: int) -> Access:
+    memo = _memo(db)
+    key = ("course", email, course_id)
+    if key in memo:
+        return memo[key]
+
+    cached = access_cache.get(key)
+    if cached is None:
+        row = (
+            db.query(Course.teacher_email, Enrollment.id)
+            .select_from(Course)
+            .outerjoin(Enrollment, _enrollment_join(email))
+            .filter(Course.id == course_id)
+            .first()
+        )
+        if not row:
+            raise HTTPException(status_code=404, detail="Course not found")
+        cached = (row[0], row[1] is not None)
+        access_cache.put(key, cached)
+
+    access = Access(course_id=course_id, teacher_email=cached[0], email=email, enrolled=cached[1])
+    memo[key] = access
+    return access
+
+
+def lesson_access(db: Session, email: str, lesson_id: int) -> Access:
+    memo = _memo(db)
+    key = ("lesson", email, lesson_id)
+    if key in memo:
+        return memo[key]
+
+    course_id = access_cache.get(("lesson", lesson_id))
+    if course_id is not None:
+        access = course_access(db, email, course_id)._replace(lesson_id=lesson_id)
+        memo[key] = access
+        return access
+
+    # lesson + course + enrollment in one round trip
+    row = (
+        db.query(Lesson.course_id, Course.id, Course.teacher_email, Enrollment.id)
+        .select_from(Lesson)
+        .outerjoin(Course, Course.id == Lesson.course_id)
+        .outerjoin(Enrollment, _enrollment_join(email))
+        .filter(Lesson.id == lesson_id)
+        .first()
+    )
+    if not row:
+        raise HTTPException(status_code=404, detail="Lesson not found")
+    _lesson_course, course_id, teacher_email, enrollment_id = row
+    if course_id is None:
+        raise HTTPException(status_code=404, detail="Course not found")
+
+    access_cache.put(("lesson", lesson_id), course_id)
+    access_cache.put(("course", email, course_id), (teacher_email, enrollment_id is not None))
+    access = Access(course_id, teacher_email, email, enrollment_id is not None, lesson_id=lesson_id)
+    memo[key] = access
+    memo[("course", email, course_id)] = access._replace(lesson_id=None)
+    return access
+
+
+def quiz_access(db: Session, email: str, quiz_id: int) -> Access:
+    memo = _memo(db)
+    key = ("quiz", email, quiz_id)
+    if key in memo:
+        return memo[key]
+
+    parents = access_cache.get(("quiz", quiz_id))
+    if parents is not None:
+        lesson_id, course_id = parents
+        access = course_access(db, email, course_id)._replace(lesson_id=lesson_id, quiz_id=quiz_id)
+        memo[key] = access
+        return access
+
+    row = (
+        db.query(Quiz.lesson_id, Lesson.id, Course.id, Course.teacher_email, Enrollment.id)
+        .select_from(Quiz)
+        .outerjoin(Lesson, Lesson.id == Quiz.lesson_id)
+        .outerjoin(Course, Course.id == Lesson.course_id)
+        .outerjoin(Enrollment, _enrollment_join(email))
+        .filter(Quiz.id == quiz_id)
+        .first()
+    )
+    if not row:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+    _quiz_lesson, lesson_id, course_id, teacher_email, enrollment_id = row
+    if lesson_id is None:
+        raise HTTPException(status_code=404, detail="Lesson not found")
+    if course_id is None:
+        raise HTTPException(status_code=404, detail="Course not found")
+
+    access_cache.put(("quiz", quiz_id), (lesson_id, course_id))
+    access_cache.put(("lesson", lesson_id), course_id)
+    access_cache.put(("course", email, course_id), (teacher_email, enrollment_id is not None))
+    access = Access(course_id, teacher_email, email, enrollment_id is not None, lesson_id=lesson_id, quiz_id=quiz_id)
+    memo[key] = access
+    memo[("course", email, course_id)] = access._replace(lesson_id=None, quiz_id=None)
+    return access
+
+
+# =========================================================
+# Policies
+# =========================================================
+def require_owner(access: Access, detail: str = "Not your course") -> Access:
+    if access.teacher_email != access.email:
+        raise HTTPException(status_code=403, detail=detail)
+    return access
+
+
+def require_member(access: Access, role: str) -> Access:
+    """Owner teacher or enrolled student."""
+    if role == "teacher":
+        return require_owner(access)
+    if role == "student":
+        if not access.enrolled:
+            raise HTTPException(status_code=403, detail="You are not enrolled in this course")
+        return access
+    raise HTTPException(status_code=403, detail="Forbidden")
+
+
+# =========================================================
+# Route dependencies (ids come from the path or query string)
+# =========================================================
+def course_member(course_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)) -> Access:
+    return require_member(course_access(db, user["email"], course_id), user["role"])
+
+
+def course_owner(course_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)) -> Access:
+    return require_owner(course_access(db, user["email"], course_id))
+
+
+def lesson_member(lesson_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)) -> Access:
+    return require_member(lesson_access(db, user["email"], lesson_id), user["role"])
+
+
+def lesson_owner(lesson_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)) -> Access:
+    return require_owner(lesson_access(db, user["email"], lesson_id))
+
+
+def quiz_member(quiz_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)) -> Access:
+    return require_member(quiz_access(db, user["email"], quiz_id), user["role"])
+
+
+def quiz_owner(quiz_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)) -> Access:
+    return require_owner(quiz_access(db, user["email"], quiz_id))
@@ -10,6 +10,7 @@ from sqlalchemy.orm import Session
 
 from deps import get_db, get_current_user
 from models import User
+from security import invalidate_user, is_premium, require_profile
 
 env_path = Path(__file__).resolve().parent / ".env"
 load_dotenv(env_path)
@@ -28,27 +29,14 @@ class CheckoutReq(BaseModel):
     interval: str = "month"
 
 
-def _is_premium(u: User) -> bool:
-    if not u:
-        return False
-    if getattr(u, "plan", "free") != "premium":
-        return False
-    until = getattr(u, "premium_until", None)
-    if until is None:
-        return True
-    return until > datetime.utcnow()
-
-
 @router.get("/status")
 def billing_status(db: Session = Depends(get_db), user=Depends(get_current_user)):
-    u = db.query(User).filter(User.email == user["email"]).first()
-    if not u:
-        raise HTTPException(status_code=404, detail="User not found")
+    u = require_profile(db, user["email"])
 
     return {
-        "plan": getattr(u, "plan", "free"),
-        "premium_until": u.premium_until.isoformat() if getattr(u, "premium_until", None) else None,
-        "is_premium": _is_premium(u),
+        "plan": u.plan,
+        "premium_until": u.premium_until.isoformat() if u.premium_until else None,
+        "is_premium": is_premium(u),
     }
 
 
@@ -69,9 +57,7 @@ def create_checkout_session(
     if not price_id:
         raise HTTPException(status_code=500, detail="Stripe price id not set in backend/.env")
 
-    u = db.query(User).filter(User.email == user["email"]).first()
-    if not u:
-        raise HTTPException(status_code=404, detail="User not found")
+    u = require_profile(db, user["email"])
 
     success_url = f"{FRONTEND_URL}/student?checkout=success"
     cancel_url = f"{FRONTEND_URL}/student?checkout=cancel"
@@ -123,6 +109,7 @@ async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
                 else:
                     u.premium_until = datetime.utcnow() + timedelta(days=30)
                 db.commit()
+                invalidate_user(u.email)
 
     return {"status": "ok"}
 
@@ -136,6 +123,7 @@ def dev_upgrade(db: Session = Depends(get_db), user=Depends(get_current_user)):
     u.plan = "premium"
     u.premium_until = datetime.utcnow() + timedelta(days=30)
     db.commit()
+    invalidate_user(u.email)
 
     return {
         "message": "Dev upgrade applied",
@@ -153,5 +141,6 @@ def dev_downgrade(db: Session = Depends(get_db), user=Depends(get_current_user))
     u.plan = "free"
     u.premium_until = None
     db.commit()
+    invalidate_user(u.email)
 
     return {"message": "Dev downgrade applied", "plan": u.plan, "premium_until": None}
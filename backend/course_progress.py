@@ -0,0 +1,164 @@
+# course_progress.py
+# Per-(course, student) rollup behind /teacher/course/{id}/students-progress.
+# One row per enrolled student: created on enrollment, removed on unenrollment,
+# bumped by submit_attempt, and recomputed when quizzes (and so attempts) are deleted.
+#
+#   python course_progress.py rebuild            recompute every course from quiz_attempts
+#   python course_progress.py rebuild 3 7 ...    recompute only these course ids
+import argparse
+import sys
+from datetime import datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+from database import insert_ignore
+from models import Course, CourseProgress, Enrollment, Lesson, Quiz, QuizAttempt
+
+
+def _new_row(course_id: int, student_email: str) -> dict:
+    return {
+        "course_id": course_id, "student_email": student_email,
+        "attempt_count": 0, "score_sum": 0.0, "avg_score": 0.0,
+    }
+
+
+def record_attempt(db: Session, course_id: int, student_email: str, score: float, submitted_at: datetime):
+    """Folds one attempt into the course rollup (caller commits)."""
+    score = float(score or 0.0)
+    insert_ignore(db, CourseProgress, _new_row(course_id, student_email))
+
+    # SET expressions all see the old values, so avg uses the pre-update sum/count
+    db.query(CourseProgress).filter(
+        CourseProgress.course_id == course_id,
+        CourseProgress.student_email == student_email,
+    ).update({
+        CourseProgress.attempt_count: CourseProgress.attempt_count + 1,
+        CourseProgress.score_sum: CourseProgress.score_sum + score,
+        CourseProgress.avg_score: (CourseProgress.score_sum + score) / (CourseProgress.attempt_count + 1),
+        CourseProgress.last_attempt_at: case(
+            (CourseProgress.last_attempt_at.is_(None) | (CourseProgress.last_attempt_at < submitted_at), submitted_at),
+            else_=CourseProgress.last_attempt_at,
+        ),
+    }, synchronize_session=False)
+
+
+def on_enroll(db: Session, course_id: int, student_email: str):
+    # a re-enrolled student keeps the attempts made before removal
+    rebuild(db, course_id, [student_email])
+
+
+def on_unenroll(db: Session, course_id: int, student_email: str):
+    db.query(CourseProgress).filter(
+        CourseProgress.course_id == course_id,
+        CourseProgress.student_email == student_email,
+    ).delete(synchronize_session=False)
+
+
+def forget_courses(db: Session, course_ids: Iterable[int]):
+    course_ids = list(course_ids)
+    if course_ids:
+        db.query(CourseProgress).filter(CourseProgress.course_id.in_(course_ids)).delete(synchronize_session=False)
+
+
+def forget_student(db: Session, student_email: str):
+    db.query(CourseProgress).filter(CourseProgress.student_email == student_email).delete(synchronize_session=False)
+
+
+def affected_by_quizzes(db: Session, quiz_ids: list) -> dict:
+    """{course_id: {student_email, ...}} for attempts on the given quizzes."""
+    rows = (
+        db.query(Lesson.course_id, QuizAttempt.student_email)
+        .join(Quiz, QuizAttempt.quiz_id == Quiz.id)
+        .join(Lesson, Quiz.lesson_id == Lesson.id)
+        .filter(QuizAttempt.quiz_id.in_(quiz_ids))
+        .distinct()
+        .all()
+    )
+    out = {}
+    for course_id, email in rows:
+        out.setdefault(course_id, set()).add(email)
+    return out
+
+
+def rebuild(db: Session, course_id: int, emails: Optional[Iterable[str]] = None):
+    """Recomputes rows for enrolled students of a course (all, or only `emails`) from quiz_attempts."""
+    emails = list(emails) if emails is not None else None
+
+    q = db.query(CourseProgress).filter(CourseProgress.course_id == course_id)
+    if emails is not None:
+        q = q.filter(CourseProgress.student_email.in_(emails))
+    q.delete(synchronize_session=False)
+
+    enrolled = db.query(Enrollment.student_email).filter(Enrollment.course_id == course_id)
+    if emails is not None:
+        enrolled = enrolled.filter(Enrollment.student_email.in_(emails))
+    enrolled = [e for (e,) in enrolled.all()]
+    if not enrolled:
+        return
+
+    agg = (
+        db.query(
+            QuizAttempt.student_email,
+            func.count(QuizAttempt.id),
+            func.coalesce(func.sum(QuizAttempt.score), 0.0),
+            func.max(QuizAttempt.submitted_at),
+        )
+        .join(Quiz, QuizAttempt.quiz_id == Quiz.id)
+        .join(Lesson, Quiz.lesson_id == Lesson.id)
+        .filter(Lesson.course_id == course_id)
+        .filter(QuizAttempt.student_email.in_(enrolled))
+        .group_by(QuizAttempt.student_email)
+        .all()
+    )
+    totals = {email: (n, float(s), last) for email, n, s, last in agg}
+
+    rows = []
+    for email in enrolled:
+        n, s, last = totals.get(email, (0, 0.0, None))
+        rows.append(CourseProgress(
+            course_id=course_id,
+            student_email=email,
+            attempt_count=n,
+            score_sum=s,
+            avg_score=(s / n) if n else 0.0,
+            last_attempt_at=last,
+        ))
+    db.add_all(rows)
+
+
+def rebuild_all(session_factory, course_ids: Optional[list] = None) -> int:
+    """Rebuilds course by course, one short transaction each."""
+    db = session_factory()
+    try:
+        if course_ids is None:
+            course_ids = [cid for (cid,) in db.query(Course.id).order_by(Course.id)]
+    finally:
+        db.close()
+
+    for i, course_id in enumerate(course_ids, start=1):
+        db = session_factory()
+        try:
+            rebuild(db, course_id)
+            db.commit()
+        finally:
+            db.close()
+        print("rebuilt", i, "/", len(course_ids), "courses")
+    return len(course_ids)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Maintain the teacher dashboard course progress rollup.")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("course_ids", nargs="*", type=int, help="only these courses (default: all)")
+    args = parser.parse_args(argv)
+
+    from database import SessionLocal
+
+    rebuild_all(SessionLocal, course_ids=args.course_ids or None)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
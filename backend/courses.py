@@ -1,10 +1,18 @@
 # courses.py
+from typing import List, Optional
+
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
+import course_progress
+from authz import Access, access_cache, course_access, course_owner, require_owner
 from deps import get_db, require_role, get_current_user
+from grading_cache import grading_cache
 from models import Course, Enrollment, Lesson
+from pagination import PageParams, apply_filters, apply_search, keyset_page, page_params, project, select_fields
+from question_bank import delete_lesson_quizzes
 
 router = APIRouter(prefix="/courses", tags=["courses"])
 
@@ -18,7 +26,22 @@ class EnrollStudentReq(BaseModel):
     student_email: str
 
 
-@router.post("")
+# Response models: every field optional so ?fields= projections validate;
+# routes use response_model_exclude_unset so unrequested fields stay out.
+class CourseOut(BaseModel):
+    id: Optional[int] = None
+    title: Optional[str] = None
+    subject: Optional[str] = None
+    teacher_email: Optional[str] = None
+
+
+class CourseListOut(BaseModel):
+    role: str
+    courses: List[CourseOut]
+    next_cursor: Optional[str] = None
+
+
+@router.post("", response_model=CourseOut)
 def create_course(
     data: CourseCreateReq,
     db: Session = Depends(get_db),
@@ -31,8 +54,7 @@ def create_course(
     )
     db.add(c)
     db.commit()
-    db.refresh(c)
-    return c
+    return {"id": c.id, "title": data.title, "subject": data.subject, "teacher_email": user["email"]}
 
 
 # OPTION A: students cannot self-enroll
@@ -54,15 +76,9 @@ def teacher_enroll_student(
     course_id: int,
     data: EnrollStudentReq,
     db: Session = Depends(get_db),
-    user=Depends(require_role("teacher"))
+    user=Depends(require_role("teacher")),
+    access: Access = Depends(course_owner),
 ):
-    course = db.query(Course).filter(Course.id == course_id).first()
-    if not course:
-        raise HTTPException(status_code=404, detail="Course not found")
-
-    if course.teacher_email != user["email"]:
-        raise HTTPException(status_code=403, detail="Not your course")
-
     student_email = data.student_email.strip().lower()
     if not student_email:
         raise HTTPException(status_code=400, detail="student_email is required")
@@ -76,29 +92,42 @@ def teacher_enroll_student(
 
     e = Enrollment(course_id=course_id, student_email=student_email)
     db.add(e)
-    db.commit()
+    try:
+        db.flush()
+        course_progress.on_enroll(db, course_id, student_email)
+        db.commit()
+    except IntegrityError:
+        # enrolled concurrently (unique course_id + student_email)
+        db.rollback()
+        access_cache.invalidate_enrollment(course_id, student_email)
+        return {"message": "Student already enrolled", "student_email": student_email}
+    access_cache.invalidate_enrollment(course_id, student_email)
     return {"message": "Student enrolled", "student_email": student_email}
 
 
 #  Teacher lists students in the course
+STUDENT_FIELDS = {"student_email": Enrollment.student_email, "enrolled_at": Enrollment.enrolled_at}
+COURSE_FIELDS = {"id": Course.id, "title": Course.title, "subject": Course.subject, "teacher_email": Course.teacher_email}
+
+
 @router.get("/{course_id}/students")
 def list_course_students(
     course_id: int,
+    q: Optional[str] = None,
+    page: PageParams = Depends(page_params(default_limit=100)),
     db: Session = Depends(get_db),
-    user=Depends(require_role("teacher"))
+    user=Depends(require_role("teacher")),
+    access: Access = Depends(course_owner),
 ):
-    course = db.query(Course).filter(Course.id == course_id).first()
-    if not course:
-        raise HTTPException(status_code=404, detail="Course not found")
-
-    if course.teacher_email != user["email"]:
-        raise HTTPException(status_code=403, detail="Not your course")
-
-    enrollments = db.query(Enrollment).filter(Enrollment.course_id == course_id).all()
+    names = select_fields(page.fields, STUDENT_FIELDS, default=["student_email"])
+    query = db.query(*[STUDENT_FIELDS[n].label(n) for n in names]).filter(Enrollment.course_id == course_id)
+    query = apply_search(query, [Enrollment.student_email], q)
+    rows, next_cursor = keyset_page(query, [(Enrollment.id, "asc")], page)
 
     return {
         "course_id": course_id,
-        "students": [{"student_email": e.student_email} for e in enrollments]
+        "students": [project(r, names) for r in rows],
+        "next_cursor": next_cursor,
     }
 
 
@@ -108,15 +137,9 @@ def remove_student_from_course(
     course_id: int,
     student_email: str,
     db: Session = Depends(get_db),
-    user=Depends(require_role("teacher"))
+    user=Depends(require_role("teacher")),
+    access: Access = Depends(course_owner),
 ):
-    course = db.query(Course).filter(Course.id == course_id).first()
-    if not course:
-        raise HTTPException(status_code=404, detail="Course not found")
-
-    if course.teacher_email != user["email"]:
-        raise HTTPException(status_code=403, detail="Not your course")
-
     student_email = student_email.strip().lower()
 
     en = db.query(Enrollment).filter(
@@ -127,23 +150,32 @@ def remove_student_from_course(
         raise HTTPException(status_code=404, detail="Student not enrolled")
 
     db.delete(en)
+    course_progress.on_unenroll(db, course_id, student_email)
     db.commit()
+    access_cache.invalidate_enrollment(course_id, student_email)
     return {"message": "Student removed", "student_email": student_email}
 
 
-@router.get("/my")
-def my_courses(db: Session = Depends(get_db), user=Depends(get_current_user)):
-    if user["role"] == "teacher":
-        courses = db.query(Course).filter(Course.teacher_email == user["email"]).all()
-        return {"role": "teacher", "courses": courses}
+@router.get("/my", response_model=CourseListOut, response_model_exclude_unset=True)
+def my_courses(
+    subject: Optional[str] = None,
+    page: PageParams = Depends(page_params(default_limit=100)),
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    if user["role"] not in ("teacher", "student"):
+        return {"role": user["role"], "courses": [], "next_cursor": None}
 
-    if user["role"] == "student":
-        enrollments = db.query(Enrollment).filter(Enrollment.student_email == user["email"]).all()
-        course_ids = [e.course_id for e in enrollments]
-        courses = db.query(Course).filter(Course.id.in_(course_ids)).all() if course_ids else []
-        return {"role": "student", "courses": courses}
+    names = select_fields(page.fields, COURSE_FIELDS)
+    query = db.query(*[COURSE_FIELDS[n].label(n) for n in names])
+    if user["role"] == "teacher":
+        query = query.filter(Course.teacher_email == user["email"])
+    else:
+        query = query.join(Enrollment, Enrollment.course_id == Course.id).filter(Enrollment.student_email == user["email"])
+    query = apply_filters(query, {Course.subject: subject})
+    rows, next_cursor = keyset_page(query, [(Course.id, "asc")], page)
 
-    return {"role": user["role"], "courses": []}
+    return {"role": user["role"], "courses": [project(r, names) for r in rows], "next_cursor": next_cursor}
 
 
 @router.delete("/{course_id}")
@@ -152,19 +184,19 @@ def delete_course(
     db: Session = Depends(get_db),
     user=Depends(require_role("teacher"))
 ):
-    course = db.query(Course).filter(Course.id == course_id).first()
-    if not course:
-        raise HTTPException(status_code=404, detail="Course not found")
-
-    if course.teacher_email != user["email"]:
-        raise HTTPException(status_code=403, detail="You are not the owner of this course")
+    require_owner(course_access(db, user["email"], course_id), "You are not the owner of this course")
 
     # remove enrollments first
     db.query(Enrollment).filter(Enrollment.course_id == course_id).delete()
 
-    # remove lessons
+    # remove lessons (and their quizzes first)
+    lesson_ids = [lid for (lid,) in db.query(Lesson.id).filter(Lesson.course_id == course_id).all()]
+    delete_lesson_quizzes(db, lesson_ids)
     db.query(Lesson).filter(Lesson.course_id == course_id).delete()
+    course_progress.forget_courses(db, [course_id])
 
-    db.delete(course)
+    db.query(Course).filter(Course.id == course_id).delete(synchronize_session=False)
     db.commit()
+    grading_cache.invalidate_course(course_id)
+    access_cache.invalidate_course(course_id)
     return {"message": "Course deleted", "course_id": course_id}
@@ -0,0 +1,211 @@
+# extraction.py
+# Text extraction for lesson attachments and chat files.
+# Lesson attachments are extracted once per file (keyed by SHA-256 of the bytes)
+# at upload time; the normalized text, page/paragraph offsets and a token estimate
+# go in the attachment_texts table, so quiz generation can send compact text
+# instead of the whole binary. Chat uploads are one-off, so their text is only
+# kept in a small in-memory LRU and never stored.
+#
+#   CHAT_TEXT_CACHE_MAX   chat extractions kept in memory per worker (default 64)
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from typing import BinaryIO, List, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ai.files import path_hashes, sha256_bytes
+from models import AttachmentText
+
+# Optional libs
+try:
+    from pypdf import PdfReader
+except Exception:
+    PdfReader = None
+
+try:
+    from docx import Document
+except Exception:
+    Document = None
+
+# below this many characters the extracted text is not a usable substitute
+# for the original file (e.g. a scanned PDF) and callers should send the file
+MIN_USEFUL_CHARS = 200
+
+DOCX_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+CHAT_TEXT_CACHE_MAX = int(os.getenv("CHAT_TEXT_CACHE_MAX", "64"))
+
+
+def sha256_path(path: str) -> str:
+    return path_hashes.digest(path)
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English prose
+    return (len(text) + 3) // 4
+
+
+def detect_kind(filename: str, content_type: Optional[str]) -> Optional[str]:
+    filename = (filename or "").lower()
+    content_type = (content_type or "").lower()
+
+    if content_type == "application/pdf" or filename.endswith(".pdf"):
+        return "pdf"
+    if content_type == DOCX_TYPE or filename.endswith(".docx"):
+        return "docx"
+    if content_type.startswith("image/") or filename.endswith((".png", ".jpg", ".jpeg")):
+        return "image"
+    if content_type.startswith("text/") or filename.endswith((".txt", ".md")):
+        return "text"
+    return None
+
+
+def _normalize(block: str) -> str:
+    block = (block or "").replace("\x00", "")
+    lines = [re.sub(r"[ \t\f\v]+", " ", ln).strip() for ln in block.splitlines()]
+    return "\n".join(ln for ln in lines if ln)
+
+
+def _split_blocks(kind: str, f: BinaryIO) -> List[str]:
+    if kind == "pdf":
+        if PdfReader is None:
+            return []
+        reader = PdfReader(f)
+        return [page.extract_text() or "" for page in reader.pages]
+
+    if kind == "docx":
+        if Document is None:
+            return []
+        doc = Document(f)
+        return [p.text for p in doc.paragraphs]
+
+    if kind == "text":
+        return re.split(r"\n\s*\n", f.read().decode("utf-8", errors="ignore"))
+
+    # images: no OCR here, Gemini still gets the file itself
+    return []
+
+
+def extract(kind: str, raw: bytes) -> Tuple[str, list]:
+    """Returns (normalized text, offsets) for the given file kind."""
+    return _extract(kind, BytesIO(raw))
+
+
+def _extract(kind: str, f: BinaryIO) -> Tuple[str, list]:
+    unit = "page" if kind == "pdf" else "paragraph"
+    parts = []
+    offsets = []
+    pos = 0
+
+    try:
+        blocks = _split_blocks(kind, f)
+    except Exception:
+        # corrupt/encrypted file: no text, callers fall back to sending the file
+        blocks = []
+
+    for n, block in enumerate(blocks, start=1):
+        block = _normalize(block)
+        if not block:
+            continue
+        if parts:
+            pos += 2  # "\n\n" separator
+        offsets.append({"kind": unit, "n": n, "start": pos, "end": pos + len(block)})
+        parts.append(block)
+        pos += len(block)
+
+    return "\n\n".join(parts), offsets
+
+
+def get_or_extract(db: Session, raw: bytes, kind: str, content_type: Optional[str] = None, digest: Optional[str] = None) -> AttachmentText:
+    digest = digest or sha256_bytes(raw)
+    return _get_or_store(db, digest, content_type, lambda: extract(kind, raw))
+
+
+def get_or_extract_path(db: Session, path: str, kind: str, content_type: Optional[str] = None, digest: Optional[str] = None) -> AttachmentText:
+    """Like get_or_extract for a file already on disk; it is only read if its hash is new."""
+    digest = digest or sha256_path(path)
+
+    def run():
+        with open(path, "rb") as f:
+            return _extract(kind, f)
+
+    return _get_or_store(db, digest, content_type, run)
+
+
+def _get_or_store(db: Session, digest: str, content_type: Optional[str], run) -> AttachmentText:
+    row = db.query(AttachmentText).filter(AttachmentText.file_hash == digest).first()
+    if row:
+        return row
+
+    text, offsets = run()
+    row = AttachmentText(
+        file_hash=digest,
+        content_type=content_type,
+        text=text,
+        offsets_json=json.dumps(offsets),
+        token_estimate=estimate_tokens(text),
+    )
+    db.add(row)
+    try:
+        db.commit()
+    except IntegrityError:
+        # same bytes extracted concurrently by another request
+        db.rollback()
+        row = db.query(AttachmentText).filter(AttachmentText.file_hash == digest).first()
+    return row
+
+
+def lookup_for_path(db: Session, path: str) -> Optional[AttachmentText]:
+    if not os.path.exists(path):
+        return None
+    return db.query(AttachmentText).filter(AttachmentText.file_hash == sha256_path(path)).first()
+
+
+def is_useful(row: Optional[AttachmentText]) -> bool:
+    return bool(row) and is_useful_text(row.text)
+
+
+def is_useful_text(text: Optional[str]) -> bool:
+    return len(text or "") >= MIN_USEFUL_CHARS
+
+
+class ChatTextCache:
+    """Extracted text of chat uploads, by file hash (LRU, in memory only), so a
+    student asking several questions about one file extracts it once."""
+
+    def __init__(self, max_entries: int = CHAT_TEXT_CACHE_MAX):
+        self.max_entries = max(1, max_entries)
+        self._texts = OrderedDict()  # sha256 -> text
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def text(self, raw: bytes, kind: str) -> str:
+        digest = sha256_bytes(raw)
+        with self._lock:
+            text = self._texts.get(digest)
+            if text is not None:
+                self._texts.move_to_end(digest)
+                self.hits += 1
+                return text
+            self.misses += 1
+
+        text, _offsets = extract(kind, raw)
+        with self._lock:
+            self._texts[digest] = text
+            self._texts.move_to_end(digest)
+            while len(self._texts) > self.max_entries:
+                self._texts.popitem(last=False)
+        return text
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._texts), "hits": self.hits, "misses": self.misses}
+
+
+chat_texts = ChatTextCache()
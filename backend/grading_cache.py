@@ -0,0 +1,127 @@
+# grading_cache.py
+# In-process LRU of immutable "grading plans" for the submit_attempt hot path.
+# Quizzes never change after creation, so a plan (answer key + lesson topic +
+# course subject/id) can be reused until the quiz, its lesson or its course is
+# deleted. The TTL bounds staleness across workers, which don't share invalidations.
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from models import Course, Lesson, Quiz
+from question_bank import load_answer_key
+
+MAX_ENTRIES = int(os.getenv("GRADING_CACHE_MAX_ENTRIES", "1024"))
+TTL_SECONDS = int(os.getenv("GRADING_CACHE_TTL_SECONDS", "300"))
+
+
+class GradingPlan(NamedTuple):
+    quiz_id: int
+    lesson_id: int
+    course_id: int
+    subject: str
+    topic: str
+    answer_key: Tuple[Tuple[str, str], ...]  # ((question, answer), ...) in quiz order
+
+
+class GradingPlanCache:
+    def __init__(self, max_entries: int = MAX_ENTRIES, ttl_seconds: int = TTL_SECONDS):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self._plans = OrderedDict()  # quiz_id -> (plan, expires_at)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, quiz_id: int) -> Optional[GradingPlan]:
+        with self._lock:
+            item = self._plans.get(quiz_id)
+            if item is not None and item[1] > time.time():
+                self._plans.move_to_end(quiz_id)
+                self.hits += 1
+                return item[0]
+            if item is not None:
+                del self._plans[quiz_id]
+            self.misses += 1
+            return None
+
+    def put(self, plan: GradingPlan):
+        with self._lock:
+            self._plans[plan.quiz_id] = (plan, time.time() + self.ttl_seconds)
+            self._plans.move_to_end(plan.quiz_id)
+            while len(self._plans) > self.max_entries:
+                self._plans.popitem(last=False)
+
+    def invalidate_quiz(self, quiz_id: int):
+        with self._lock:
+            if self._plans.pop(quiz_id, None) is not None:
+                self.invalidations += 1
+
+    def invalidate_lesson(self, lesson_id: int):
+        self._invalidate_where(lambda p: p.lesson_id == lesson_id)
+
+    def invalidate_course(self, course_id: int):
+        self._invalidate_where(lambda p: p.course_id == course_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._plans),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def _invalidate_where(self, match):
+        with self._lock:
+            stale = [qid for qid, (plan, _exp) in self._plans.items() if match(plan)]
+            for qid in stale:
+                del self._plans[qid]
+            self.invalidations += len(stale)
+
+
+grading_cache = GradingPlanCache()
+
+
+def get_grading_plan(db: Session, quiz_id: int) -> GradingPlan:
+    plan = grading_cache.get(quiz_id)
+    if plan is not None:
+        return plan
+
+    # one joined lookup instead of Quiz -> Lesson -> Course round trips
+    row = (
+        db.query(Quiz.id, Lesson.id, Lesson.topic, Course.id, Course.subject)
+        .select_from(Quiz)
+        .outerjoin(Lesson, Lesson.id == Quiz.lesson_id)
+        .outerjoin(Course, Course.id == Lesson.course_id)
+        .filter(Quiz.id == quiz_id)
+        .first()
+    )
+    if not row:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+
+    _qid, lesson_id, topic, course_id, subject = row
+    if lesson_id is None:
+        raise HTTPException(status_code=404, detail="Lesson not found")
+    if course_id is None:
+        raise HTTPException(status_code=404, detail="Course not found")
+
+    plan = GradingPlan(
+        quiz_id=quiz_id,
+        lesson_id=lesson_id,
+        course_id=course_id,
+        subject=subject,
+        topic=topic,
+        answer_key=tuple((q, a) for q, a in load_answer_key(db, quiz_id)),
+    )
+    grading_cache.put(plan)
+    return plan
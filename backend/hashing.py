@@ -0,0 +1,172 @@
+# hashing.py
+# Password hashing service: bcrypt runs in a small process pool, off the
+# request threads and the event loop.
+#
+# A bcrypt hash/verify is ~250 ms of CPU at cost 12. Done inline, a login storm
+# (everyone signing in right before an exam) ties up the whole threadpool and
+# starves unrelated endpoints. Here at most HASH_WORKERS run at once, at most
+# HASH_QUEUE_MAX more wait, and anything beyond that is refused immediately with
+# 429 + Retry-After instead of queueing without bound.
+#
+#   HASH_WORKERS          worker processes (default: CPU count; 0 = a thread, for dev/tests)
+#   HASH_QUEUE_MAX        requests allowed to wait for a worker (default: 8 per worker)
+#   HASH_TIMEOUT_SECONDS  give up waiting and answer 503 (default 10)
+#   BCRYPT_ROUNDS         cost factor; existing hashes are upgraded on the next login
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(os.cpu_count() or 2)))
+HASH_QUEUE_MAX = int(os.getenv("HASH_QUEUE_MAX", str(8 * max(1, HASH_WORKERS))))
+HASH_TIMEOUT_SECONDS = float(os.getenv("HASH_TIMEOUT_SECONDS", "10"))
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+RETRY_AFTER_SECONDS = 1
+LATENCY_SAMPLES = 512
+
+# hashes with a different cost are "deprecated" and get rehashed on login
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+
+# =========================================================
+# Worker side (runs in the pool processes; keep it importable without the app)
+# =========================================================
+def _pre_hash(password: str) -> str:
+    # bcrypt has a 72-byte limit; pre-hashing prevents errors for long passwords
+    return hashlib.sha256(password.encode("utf-8")).hexdigest()
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(_pre_hash(password))
+
+
+def _verify(password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    # (ok, new_hash) - new_hash is set when ok and the stored hash uses an old cost
+    return pwd_context.verify_and_update(_pre_hash(password), hashed)
+
+
+# =========================================================
+# App side
+# =========================================================
+class HashingService:
+    def __init__(self, workers: int = HASH_WORKERS, queue_max: int = HASH_QUEUE_MAX,
+                 timeout_seconds: float = HASH_TIMEOUT_SECONDS):
+        self.workers = max(0, workers)
+        self.capacity = max(1, self.workers) + max(0, queue_max)
+        self.timeout_seconds = timeout_seconds
+
+        self._pool = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.rehashed = 0
+        self._latency_ms = deque(maxlen=LATENCY_SAMPLES)
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                if self.workers:
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                else:
+                    self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="hashing")
+            return self._pool
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _release(self, _fut=None):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _unavailable(self):
+        self.shutdown()  # the next call starts a fresh pool
+        return HTTPException(status_code=503, detail="Password service unavailable. Please retry.")
+
+    async def _run(self, fn, *args):
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=429,
+                    detail="Too many sign-ins in progress. Please retry in a moment.",
+                    headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+                )
+            self._in_flight += 1
+
+        started = time.perf_counter()
+        try:
+            cfut = self._get_pool().submit(fn, *args)
+        except (BrokenProcessPool, RuntimeError):
+            self._release()
+            raise self._unavailable()
+        # the slot is held until the worker is actually done, even if we stop waiting
+        cfut.add_done_callback(self._release)
+
+        try:
+            # on timeout a still-queued job is cancelled; a running one finishes on its own
+            result = await asyncio.wait_for(asyncio.wrap_future(cfut), timeout=self.timeout_seconds)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Password service is busy. Please retry.",
+                headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+            )
+        except BrokenProcessPool:
+            raise self._unavailable()
+
+        self.completed += 1
+        self._latency_ms.append((time.perf_counter() - started) * 1000.0)
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password)
+
+    async def verify(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """(ok, new_hash). new_hash is a re-hash at the current BCRYPT_ROUNDS when the stored one differs."""
+        ok, new_hash = await self._run(_verify, password, hashed)
+        if new_hash:
+            self.rehashed += 1
+        return ok, new_hash
+
+    def stats(self) -> dict:
+        with self._lock:
+            in_flight = self._in_flight
+        samples = sorted(self._latency_ms)
+
+        def pct(p: float) -> float:
+            if not samples:
+                return 0.0
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))], 1)
+
+        return {
+            "workers": self.workers,
+            "capacity": self.capacity,
+            "in_flight": in_flight,
+            "queue_depth": max(0, in_flight - max(1, self.workers)),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "rehashed": self.rehashed,
+            "bcrypt_rounds": BCRYPT_ROUNDS,
+            "latency_ms_p50": pct(0.50),
+            "latency_ms_p95": pct(0.95),
+        }
+
+
+hasher = HashingService()
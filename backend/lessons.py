@@ -1,19 +1,34 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
 from pydantic import BaseModel
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
-from deps import get_db, require_role, get_current_user
-from models import Course, Enrollment, Lesson
-
-from typing import Optional
+from authz import Access, access_cache, course_access, course_member, lesson_access, lesson_member, require_owner
+from deps import get_db, require_role
+from grading_cache import grading_cache
+from models import Lesson
+from pagination import PageParams, apply_filters, apply_search, keyset_page, page_params, project, select_fields
+from question_bank import delete_lesson_quizzes
+import extraction
+from ai.files import PathHashes, path_hashes
+
+from datetime import datetime
+from typing import List, Optional
+import hashlib
 import os
 import uuid
-import shutil
 
 router = APIRouter(prefix="/lessons", tags=["lessons"])
 
 UPLOAD_DIR = "uploads"
 
+# lesson attachments are streamed to disk in chunks and refused past this size
+LESSON_UPLOAD_MAX_MB = int(os.getenv("LESSON_UPLOAD_MAX_MB", "25"))
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+# ?view=summary returns this much of content_text instead of the whole body
+PREVIEW_CHARS = 160
+
 
 class LessonCreateReq(BaseModel):
     course_id: int
@@ -25,18 +40,56 @@ class LessonCreateReq(BaseModel):
     attachment_type: Optional[str] = None
 
 
-@router.post("")
+# Response models: every field optional so ?fields= / ?view=summary projections
+# validate; routes use response_model_exclude_unset so unrequested fields stay out.
+class LessonOut(BaseModel):
+    id: Optional[int] = None
+    course_id: Optional[int] = None
+    title: Optional[str] = None
+    topic: Optional[str] = None
+    content_text: Optional[str] = None
+    content_preview: Optional[str] = None
+    attachment_url: Optional[str] = None
+    attachment_name: Optional[str] = None
+    attachment_type: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+
+class LessonListOut(BaseModel):
+    course_id: int
+    lessons: List[LessonOut]
+    next_cursor: Optional[str] = None
+
+
+LESSON_FIELDS = {
+    "id": Lesson.id,
+    "course_id": Lesson.course_id,
+    "title": Lesson.title,
+    "topic": Lesson.topic,
+    "content_text": Lesson.content_text,
+    "content_preview": func.substr(Lesson.content_text, 1, PREVIEW_CHARS),
+    "attachment_url": Lesson.attachment_url,
+    "attachment_name": Lesson.attachment_name,
+    "attachment_type": Lesson.attachment_type,
+    "created_at": Lesson.created_at,
+}
+LESSON_VIEWS = {
+    "full": [n for n in LESSON_FIELDS if n != "content_preview"],
+    "summary": [n for n in LESSON_FIELDS if n != "content_text"],
+}
+
+
+def _lesson_out(lesson: Lesson) -> dict:
+    return {n: getattr(lesson, n) for n in LESSON_VIEWS["full"]}
+
+
+@router.post("", response_model=LessonOut, response_model_exclude_unset=True)
 def create_lesson(
     data: LessonCreateReq,
     db: Session = Depends(get_db),
     user=Depends(require_role("teacher"))
 ):
-    course = db.query(Course).filter(Course.id == data.course_id).first()
-    if not course:
-        raise HTTPException(status_code=404, detail="Course not found")
-
-    if course.teacher_email != user["email"]:
-        raise HTTPException(status_code=403, detail="You are not the owner of this course")
+    require_owner(course_access(db, user["email"], data.course_id), "You are not the owner of this course")
 
     # require at least text or attachment
     has_text = bool((data.content_text or "").strip())
@@ -56,7 +109,7 @@ def create_lesson(
     db.add(lesson)
     db.commit()
     db.refresh(lesson)
-    return lesson
+    return _lesson_out(lesson)
 
 
 @router.post("/upload")
@@ -66,12 +119,7 @@ def upload_lesson_file(
     db: Session = Depends(get_db),
     user=Depends(require_role("teacher"))
 ):
-    course = db.query(Course).filter(Course.id == course_id).first()
-    if not course:
-        raise HTTPException(status_code=404, detail="Course not found")
-
-    if course.teacher_email != user["email"]:
-        raise HTTPException(status_code=403, detail="You are not the owner of this course")
+    require_owner(course_access(db, user["email"], course_id), "You are not the owner of this course")
 
     os.makedirs(UPLOAD_DIR, exist_ok=True)
 
@@ -83,41 +131,80 @@ def upload_lesson_file(
     safe_name = f"{uuid.uuid4().hex}{ext}"
     path = os.path.join(UPLOAD_DIR, safe_name)
 
-    with open(path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    digest = _save_upload(file, path)
+    # quiz generation looks the text up by this hash without re-reading the file
+    path_hashes.put(PathHashes.stamp(path), digest)
+
+    # Extract text once at upload time (quiz generation reuses it by file hash)
+    token_estimate = 0
+    kind = extraction.detect_kind(file.filename, file.content_type)
+    if kind:
+        try:
+            row = extraction.get_or_extract_path(db, path, kind, content_type=file.content_type, digest=digest)
+            token_estimate = row.token_estimate
+        except Exception:
+            db.rollback()
 
     return {
         "file_url": f"/uploads/{safe_name}",
         "original_name": file.filename,
         "content_type": file.content_type,
+        "text_token_estimate": token_estimate,
     }
 
 
-@router.get("/course/{course_id}")
+def _save_upload(file: UploadFile, path: str) -> str:
+    """Copies the upload to path chunk by chunk, hashing as it goes; returns the SHA-256."""
+    limit = LESSON_UPLOAD_MAX_MB * 1024 * 1024
+    h = hashlib.sha256()
+    size = 0
+    try:
+        with open(path, "wb") as out:
+            while chunk := file.file.read(UPLOAD_CHUNK_BYTES):
+                size += len(chunk)
+                if size > limit:
+                    raise HTTPException(status_code=413, detail=f"File too large. Max {LESSON_UPLOAD_MAX_MB}MB.")
+                h.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return h.hexdigest()
+
+
+@router.get("/course/{course_id}", response_model=LessonListOut, response_model_exclude_unset=True)
 def list_lessons_for_course(
     course_id: int,
+    topic: Optional[str] = None,
+    q: Optional[str] = None,
+    view: str = "full",
+    page: PageParams = Depends(page_params(default_limit=100)),
+    db: Session = Depends(get_db),
+    access: Access = Depends(course_member),
+):
+    if view not in LESSON_VIEWS:
+        raise HTTPException(status_code=400, detail=f"view must be one of: {', '.join(LESSON_VIEWS)}")
+
+    # only the selected columns are loaded; summary skips the lesson bodies
+    names = select_fields(page.fields, LESSON_FIELDS, default=LESSON_VIEWS[view])
+    query = db.query(*[LESSON_FIELDS[n].label(n) for n in names]).filter(Lesson.course_id == course_id)
+    query = apply_filters(query, {Lesson.topic: topic})
+    query = apply_search(query, [Lesson.title, Lesson.topic], q)
+    # ids follow creation order; created_at is nullable, so it is no keyset key
+    rows, next_cursor = keyset_page(query, [(Lesson.id, "asc")], page)
+
+    return {"course_id": course_id, "lessons": [project(r, names) for r in rows], "next_cursor": next_cursor}
+
+
+@router.get("/{lesson_id}", response_model=LessonOut, response_model_exclude_unset=True)
+def get_lesson(
+    lesson_id: int,
     db: Session = Depends(get_db),
-    user=Depends(get_current_user)
+    access: Access = Depends(lesson_member),
 ):
-    course = db.query(Course).filter(Course.id == course_id).first()
-    if not course:
-        raise HTTPException(status_code=404, detail="Course not found")
-
-    if user["role"] == "teacher":
-        if course.teacher_email != user["email"]:
-            raise HTTPException(status_code=403, detail="Not your course")
-    elif user["role"] == "student":
-        enrolled = db.query(Enrollment).filter(
-            Enrollment.course_id == course_id,
-            Enrollment.student_email == user["email"]
-        ).first()
-        if not enrolled:
-            raise HTTPException(status_code=403, detail="You are not enrolled in this course")
-    else:
-        raise HTTPException(status_code=403, detail="Forbidden")
-
-    lessons = db.query(Lesson).filter(Lesson.course_id == course_id).all()
-    return {"course_id": course_id, "lessons": lessons}
+    # full body for one lesson, e.g. after listing with ?view=summary
+    return _lesson_out(db.query(Lesson).filter(Lesson.id == lesson_id).one())
 
 
 @router.delete("/{lesson_id}")
@@ -126,17 +213,12 @@ def delete_lesson(
     db: Session = Depends(get_db),
     user=Depends(require_role("teacher"))
 ):
-    lesson = db.query(Lesson).filter(Lesson.id == lesson_id).first()
-    if not lesson:
-        raise HTTPException(status_code=404, detail="Lesson not found")
-
-    course = db.query(Course).filter(Course.id == lesson.course_id).first()
-    if not course:
-        raise HTTPException(status_code=404, detail="Course not found")
-
-    if course.teacher_email != user["email"]:
-        raise HTTPException(status_code=403, detail="You are not the owner of this course")
+    require_owner(lesson_access(db, user["email"], lesson_id), "You are not the owner of this course")
 
-    db.delete(lesson)
+    # quizzes/attempts reference the lesson; remove them first
+    delete_lesson_quizzes(db, [lesson_id])
+    db.query(Lesson).filter(Lesson.id == lesson_id).delete(synchronize_session=False)
     db.commit()
+    grading_cache.invalidate_lesson(lesson_id)
+    access_cache.invalidate_lesson(lesson_id)
     return {"message": "Lesson deleted", "lesson_id": lesson_id}
@@ -1,22 +1,63 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import os
 
-from database import Base, engine
+import migrate
 from auth import router as auth_router
 from courses import router as courses_router
 from lessons import router as lessons_router
 from quizzes import router as quizzes_router
+from quiz_jobs import job_queue, router as quiz_jobs_router
+from hashing import hasher
+from ai.limits import usage_meter
 from attempts import router as attempts_router
 from ai.gemini_chat import router as gemini_router
 from admin import router as admin_router
 from billing import router as billing_router
 from teacher_progress import router as teacher_progress_router
 
-app = FastAPI()
 
-Base.metadata.create_all(bind=engine)
+# schema changes are applied by `python migrate.py` before the app starts; with
+# MIGRATE_ON_STARTUP=1 (single-instance / dev setups) the app applies them itself.
+# Otherwise a database with pending migrations stops the app from starting, since
+# the code would query tables and columns that don't exist yet.
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "0") == "1"
+
+
+async def ensure_schema():
+    behind = await asyncio.to_thread(migrate.pending)
+    if not behind:
+        return
+    names = ", ".join(f"{m.version:04d}_{m.name}" for m in behind)
+    if not MIGRATE_ON_STARTUP:
+        raise RuntimeError(
+            f"Database has pending migrations: {names}. "
+            "Run `python migrate.py` (or set MIGRATE_ON_STARTUP=1) and start again."
+        )
+    print("Applying pending migrations:", names)
+    # upgrade() takes an advisory lock on PostgreSQL, so workers starting together apply them once
+    await asyncio.to_thread(migrate.upgrade)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await ensure_schema()
+
+    # background workers for queued AI quiz generation
+    await job_queue.start()
+    # periodic flush of AI token usage to ai_usage
+    await usage_meter.start()
+    yield
+    await job_queue.stop()
+    await usage_meter.stop()
+    hasher.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -32,6 +73,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # cursor for list endpoints whose body is a bare list (e.g. /admin/users);
+    # Retry-After on 429/503 from overloaded services
+    expose_headers=["X-Next-Cursor", "Retry-After"],
 )
 
 os.makedirs("uploads", exist_ok=True)
@@ -47,6 +91,7 @@ app.include_router(auth_router)
 app.include_router(gemini_router)
 app.include_router(courses_router)
 app.include_router(lessons_router)
+app.include_router(quiz_jobs_router)
 app.include_router(quizzes_router)
 app.include_router(attempts_router)
 app.include_router(admin_router)
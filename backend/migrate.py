@@ -0,0 +1,213 @@
+# migrate.py
+# Versioned schema migrations.
+#
+#   python migrate.py               apply all pending migrations
+#   python migrate.py --to 3        apply pending migrations up to version 3
+#   python migrate.py status        list applied / pending migrations
+#
+# Migrations live in migrations/mNNNN_<name>.py and define `upgrade(ctx)`.
+# Applied versions are recorded in the schema_migrations table. A migration may
+# be interrupted half-way (e.g. during a long backfill), so every step must be
+# safe to run again; the MigrationContext helpers below are.
+#
+# Steps run in short transactions of their own, never one transaction per
+# migration: index builds and backfills on a large live database must not block
+# the app's writers for minutes. On PostgreSQL indexes are built CONCURRENTLY.
+import argparse
+import importlib
+import pkgutil
+import re
+import sys
+import time
+from datetime import datetime
+from typing import Callable, List, Optional
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateIndex
+
+import migrations
+from database import Base, engine as default_engine
+
+BATCH_SIZE = 500
+# pause between backfill batches so app writers can get the lock in between
+BATCH_PAUSE_SECONDS = 0.05
+
+# arbitrary key for pg_advisory_lock: one migrator at a time
+PG_LOCK_KEY = 74_211_001
+
+_NAME = re.compile(r"^m(\d{4})_(\w+)$")
+
+
+class Migration:
+    def __init__(self, version: int, name: str, module):
+        self.version = version
+        self.name = name
+        self.module = module
+
+    @property
+    def description(self) -> str:
+        return (self.module.__doc__ or "").strip().splitlines()[0] if self.module.__doc__ else self.name
+
+
+class MigrationContext:
+    """What a migration's upgrade(ctx) gets to work with."""
+
+    def __init__(self, engine: Engine, batch_size: int = BATCH_SIZE):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.dialect = engine.dialect.name
+
+    def log(self, *parts):
+        print("   ", *parts)
+
+    def execute(self, sql: str, params: Optional[dict] = None):
+        with self.engine.begin() as conn:
+            return conn.execute(text(sql), params or {})
+
+    def has_table(self, table: str) -> bool:
+        return inspect(self.engine).has_table(table)
+
+    def has_column(self, table: str, column: str) -> bool:
+        return column in {c["name"] for c in inspect(self.engine).get_columns(table)}
+
+    def has_index(self, table: str, index: str) -> bool:
+        return index in {i["name"] for i in inspect(self.engine).get_indexes(table)}
+
+    def create_tables(self, *tables):
+        """Creates the given Table objects (or all model tables) if missing."""
+        Base.metadata.create_all(self.engine, tables=list(tables) or None, checkfirst=True)
+
+    def add_column(self, table: str, column: str, ddl: str):
+        """ddl is the column definition, e.g. "VARCHAR NOT NULL DEFAULT 'free'"."""
+        if self.has_column(table, column):
+            self.log("skip column", f"{table}.{column}", "(exists)")
+            return
+        self.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+        self.log("added column", f"{table}.{column}")
+
+    def create_index(self, index):
+        """Builds a model Index without locking the table against writes where the backend allows it."""
+        if self.has_index(index.table.name, index.name):
+            self.log("skip index", index.name, "(exists)")
+            return
+
+        ddl = str(CreateIndex(index).compile(dialect=self.engine.dialect))
+        if self.dialect == "postgresql":
+            # CONCURRENTLY can't run inside a transaction block
+            ddl = re.sub(r"^CREATE (UNIQUE )?INDEX", lambda m: m.group(0) + " CONCURRENTLY", ddl)
+            with self.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                conn.execute(text(ddl))
+        else:
+            # SQLite has no online build; the CREATE holds the write lock only
+            # for the build itself, not for the rest of the migration
+            self.execute(ddl)
+        self.log("created index", index.name)
+
+    def backfill(self, select_sql: str, apply: Callable[[Connection, list], None], params: Optional[dict] = None) -> int:
+        """Runs select_sql (which must exclude rows already done and accept :limit)
+        repeatedly and hands each batch to apply(conn, rows) in its own transaction."""
+        total = 0
+        while True:
+            with self.engine.begin() as conn:
+                rows = conn.execute(text(select_sql), {**(params or {}), "limit": self.batch_size}).fetchall()
+                if not rows:
+                    break
+                apply(conn, rows)
+            total += len(rows)
+            self.log("backfilled", total, "rows")
+            if len(rows) < self.batch_size:
+                break
+            time.sleep(BATCH_PAUSE_SECONDS)
+        return total
+
+
+def discover() -> List[Migration]:
+    found = []
+    for info in pkgutil.iter_modules(migrations.__path__):
+        m = _NAME.match(info.name)
+        if not m:
+            continue
+        module = importlib.import_module(f"migrations.{info.name}")
+        found.append(Migration(int(m.group(1)), m.group(2), module))
+
+    found.sort(key=lambda mig: mig.version)
+    versions = [mig.version for mig in found]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"Duplicate migration versions: {versions}")
+    return found
+
+
+def _ensure_version_table(engine: Engine):
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version INTEGER NOT NULL PRIMARY KEY, "
+            "name VARCHAR NOT NULL, "
+            "applied_at TIMESTAMP NOT NULL)"
+        ))
+
+
+def applied_versions(engine: Engine) -> set:
+    if not inspect(engine).has_table("schema_migrations"):
+        return set()
+    with engine.connect() as conn:
+        return {v for (v,) in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def pending(engine: Engine = default_engine) -> List[Migration]:
+    done = applied_versions(engine)
+    return [mig for mig in discover() if mig.version not in done]
+
+
+def upgrade(engine: Engine = default_engine, target: Optional[int] = None, batch_size: int = BATCH_SIZE) -> int:
+    _ensure_version_table(engine)
+    ctx = MigrationContext(engine, batch_size=batch_size)
+
+    lock_conn = None
+    if engine.dialect.name == "postgresql":
+        lock_conn = engine.connect()
+        lock_conn.execute(text("SELECT pg_advisory_lock(:k)"), {"k": PG_LOCK_KEY})
+
+    try:
+        todo = [mig for mig in pending(engine) if target is None or mig.version <= target]
+        for mig in todo:
+            print(f"==> {mig.version:04d} {mig.name}: {mig.description}")
+            started = time.time()
+            mig.module.upgrade(ctx)
+            with engine.begin() as conn:
+                conn.execute(
+                    text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)"),
+                    {"v": mig.version, "n": mig.name, "t": datetime.utcnow()},
+                )
+            print(f"    done in {time.time() - started:.1f}s")
+        return len(todo)
+    finally:
+        if lock_conn is not None:
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": PG_LOCK_KEY})
+            lock_conn.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Apply EduMate schema migrations.")
+    parser.add_argument("command", nargs="?", default="upgrade", choices=["upgrade", "status"])
+    parser.add_argument("--to", type=int, default=None, help="stop after this version")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="rows per backfill transaction")
+    args = parser.parse_args(argv)
+
+    print("DB used:", default_engine.url.render_as_string(hide_password=True))
+
+    if args.command == "status":
+        done = applied_versions(default_engine)
+        for mig in discover():
+            state = "applied" if mig.version in done else "pending"
+            print(f"{mig.version:04d} {state:8s} {mig.name}: {mig.description}")
+        return 0
+
+    n = upgrade(default_engine, target=args.to, batch_size=args.batch_size)
+    print("Applied migrations:", n)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,11 @@
+"""Create any missing tables from the models.
+
+Replaces the Base.metadata.create_all call that main.py used to make on every
+start. On a fresh database this creates the whole current schema, which makes
+the later migrations no-ops; on an existing one it only adds missing tables.
+"""
+import models  # noqa: F401  (registers every table on Base.metadata)
+
+
+def upgrade(ctx):
+    ctx.create_tables()
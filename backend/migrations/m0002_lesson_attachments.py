@@ -0,0 +1,7 @@
+"""Add attachment columns to lessons (was migrate_lessons.py)."""
+
+
+def upgrade(ctx):
+    ctx.add_column("lessons", "attachment_url", "VARCHAR")
+    ctx.add_column("lessons", "attachment_name", "VARCHAR")
+    ctx.add_column("lessons", "attachment_type", "VARCHAR")
@@ -0,0 +1,8 @@
+"""Add plan and premium_until to users (was add_premium_columns.py)."""
+
+
+def upgrade(ctx):
+    ctx.add_column("users", "plan", "VARCHAR NOT NULL DEFAULT 'free'")
+    ctx.add_column("users", "premium_until", "TIMESTAMP")
+    ctx.add_column("users", "reset_otp", "VARCHAR")
+    ctx.add_column("users", "reset_otp_expiry", "TIMESTAMP")
@@ -0,0 +1,52 @@
+"""Move quiz questions into quiz_questions rows (was migrate_quiz_questions.py)."""
+import json
+
+from sqlalchemy import text
+
+from models import QuizQuestion
+
+
+def _copy_questions(conn, rows):
+    for quiz_id, questions_json in rows:
+        try:
+            questions = json.loads(questions_json or "[]")
+        except Exception:
+            questions = []
+
+        if questions:
+            conn.execute(
+                text(
+                    "INSERT INTO quiz_questions (quiz_id, ordinal, question, options_json, answer, explanation) "
+                    "VALUES (:quiz_id, :ordinal, :question, :options_json, :answer, :explanation)"
+                ),
+                [
+                    {
+                        "quiz_id": quiz_id,
+                        "ordinal": i,
+                        "question": q.get("question", ""),
+                        "options_json": json.dumps(q.get("options", [])),
+                        "answer": q.get("answer", ""),
+                        "explanation": q.get("explanation"),
+                    }
+                    for i, q in enumerate(questions)
+                ],
+            )
+        # -1 marks unparseable/empty blobs as done so the batch loop moves on
+        conn.execute(
+            text("UPDATE quizzes SET question_count = :n WHERE id = :id"),
+            {"n": len(questions) or -1, "id": quiz_id},
+        )
+
+
+def upgrade(ctx):
+    ctx.add_column("quizzes", "question_count", "INTEGER NOT NULL DEFAULT 0")
+    ctx.create_tables(QuizQuestion.__table__)
+
+    ctx.backfill(
+        "SELECT id, questions_json FROM quizzes "
+        "WHERE question_count = 0 "
+        "AND NOT EXISTS (SELECT 1 FROM quiz_questions qq WHERE qq.quiz_id = quizzes.id) "
+        "ORDER BY id LIMIT :limit",
+        _copy_questions,
+    )
+    ctx.execute("UPDATE quizzes SET question_count = 0 WHERE question_count = -1")
@@ -0,0 +1,18 @@
+"""Composite indexes for the hot filters and unique enrollments (was migrate_indexes.py)."""
+from models import Course, Enrollment, Lesson, Quiz, QuizAttempt, QuizJob, TopicMastery, User
+
+
+def upgrade(ctx):
+    # the unique enrollment index fails on duplicates; keep the oldest row of each pair
+    removed = ctx.execute(
+        "DELETE FROM enrollments WHERE id NOT IN ("
+        "SELECT MIN(id) FROM enrollments GROUP BY course_id, student_email)"
+    ).rowcount
+    ctx.log("removed duplicate enrollments:", removed)
+
+    for model in (User, Course, Enrollment, Lesson, Quiz, QuizAttempt, QuizJob, TopicMastery):
+        for index in model.__table__.indexes:
+            ctx.create_index(index)
+
+    # refresh planner statistics so the new indexes get picked up
+    ctx.execute("ANALYZE")
@@ -0,0 +1,14 @@
+"""Create student_stats / student_weekly and fill them from quiz_attempts."""
+from sqlalchemy.orm import sessionmaker
+
+import student_stats
+from models import StudentStats, StudentWeekly
+
+
+def upgrade(ctx):
+    ctx.create_tables(StudentStats.__table__, StudentWeekly.__table__)
+
+    # one short transaction per batch of students
+    session_factory = sessionmaker(bind=ctx.engine, autoflush=False)
+    n = student_stats.rebuild_all(session_factory, batch_size=student_stats.REBUILD_BATCH_STUDENTS)
+    ctx.log("rolled up", n, "students")
@@ -0,0 +1,14 @@
+"""Create course_progress and fill it from enrollments and quiz_attempts."""
+from sqlalchemy.orm import sessionmaker
+
+import course_progress
+from models import CourseProgress
+
+
+def upgrade(ctx):
+    ctx.create_tables(CourseProgress.__table__)
+
+    # one short transaction per course
+    session_factory = sessionmaker(bind=ctx.engine, autoflush=False)
+    n = course_progress.rebuild_all(session_factory)
+    ctx.log("rolled up", n, "courses")
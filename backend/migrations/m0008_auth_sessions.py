@@ -0,0 +1,6 @@
+"""Create auth_sessions and refresh_tokens for the refresh-token flow."""
+from models import AuthSession, RefreshToken
+
+
+def upgrade(ctx):
+    ctx.create_tables(AuthSession.__table__, RefreshToken.__table__)
@@ -0,0 +1,6 @@
+"""Create ai_usage for per-user daily AI token budgets."""
+from models import AIUsage
+
+
+def upgrade(ctx):
+    ctx.create_tables(AIUsage.__table__)
@@ -0,0 +1,6 @@
+"""Add claimed_by and heartbeat_at to quiz_jobs for conditional job claims."""
+
+
+def upgrade(ctx):
+    ctx.add_column("quiz_jobs", "claimed_by", "VARCHAR")
+    ctx.add_column("quiz_jobs", "heartbeat_at", "TIMESTAMP")
@@ -1,10 +1,13 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Float
+from sqlalchemy import Column, Integer, String, Date, DateTime, ForeignKey, Text, Float, Index
 from database import Base
 from datetime import datetime
 
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        Index("ix_users_role", "role"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String, unique=True, index=True, nullable=False)
@@ -20,6 +23,9 @@ class User(Base):
 
 class Course(Base):
     __tablename__ = "courses"
+    __table_args__ = (
+        Index("ix_courses_teacher_email", "teacher_email"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)
@@ -29,6 +35,11 @@ class Course(Base):
 
 class Enrollment(Base):
     __tablename__ = "enrollments"
+    __table_args__ = (
+        # one enrollment per student per course; also serves the (course, student) lookups
+        Index("uq_enrollments_course_student", "course_id", "student_email", unique=True),
+        Index("ix_enrollments_student_email", "student_email"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     course_id = Column(Integer, ForeignKey("courses.id"), nullable=False)
@@ -38,6 +49,9 @@ class Enrollment(Base):
 
 class Lesson(Base):
     __tablename__ = "lessons"
+    __table_args__ = (
+        Index("ix_lessons_course_created", "course_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     course_id = Column(Integer, ForeignKey("courses.id"), nullable=False)
@@ -56,16 +70,43 @@ class Lesson(Base):
 
 class Quiz(Base):
     __tablename__ = "quizzes"
+    __table_args__ = (
+        Index("ix_quizzes_lesson_created", "lesson_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     lesson_id = Column(Integer, ForeignKey("lessons.id"), nullable=False)
     difficulty = Column(String, default="easy")
+    # legacy blob, still written for older readers; reads use quiz_questions
     questions_json = Column(Text, nullable=False)
+    question_count = Column(Integer, nullable=False, default=0)
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
+class QuizQuestion(Base):
+    __tablename__ = "quiz_questions"
+    __table_args__ = (
+        Index("ix_quiz_questions_quiz_ordinal", "quiz_id", "ordinal", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    quiz_id = Column(Integer, ForeignKey("quizzes.id"), nullable=False)
+    ordinal = Column(Integer, nullable=False)  # 0-based position in the quiz
+
+    question = Column(Text, nullable=False)
+    options_json = Column(Text, nullable=False)  # exactly 4 options
+    answer = Column(Text, nullable=False)
+    explanation = Column(Text, nullable=True)
+
+
 class QuizAttempt(Base):
     __tablename__ = "quiz_attempts"
+    __table_args__ = (
+        # student dashboards filter by student and time window
+        Index("ix_quiz_attempts_student_submitted", "student_email", "submitted_at"),
+        # teacher dashboards join attempts -> quizzes for a set of students
+        Index("ix_quiz_attempts_quiz_student", "quiz_id", "student_email"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     quiz_id = Column(Integer, ForeignKey("quizzes.id"), nullable=False)
@@ -76,6 +117,9 @@ class QuizAttempt(Base):
 
 class TopicMastery(Base):
     __tablename__ = "topic_mastery"
+    __table_args__ = (
+        Index("ix_topic_mastery_student_subject_topic", "student_email", "subject", "topic"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     student_email = Column(String, index=True, nullable=False)
@@ -83,3 +127,134 @@ class TopicMastery(Base):
     topic = Column(String, index=True, nullable=False)
     mastery_score = Column(Float, default=0.0)
     updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class StudentStats(Base):
+    # Running per-student totals, maintained by submit_attempt (see student_stats.py)
+    __tablename__ = "student_stats"
+
+    id = Column(Integer, primary_key=True, index=True)
+    student_email = Column(String, unique=True, index=True, nullable=False)
+
+    attempt_count = Column(Integer, nullable=False, default=0)
+    score_sum = Column(Float, nullable=False, default=0.0)
+    min_score = Column(Float, nullable=True)
+    max_score = Column(Float, nullable=True)
+
+    last_attempt_at = Column(DateTime, nullable=True)
+    streak_days = Column(Integer, nullable=False, default=0)  # consecutive days ending at last_attempt_at
+
+
+class StudentWeekly(Base):
+    # Per-student, per-week (Monday start, UTC) attempt totals for the progress chart
+    __tablename__ = "student_weekly"
+    __table_args__ = (
+        Index("uq_student_weekly_student_week", "student_email", "week_start", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    student_email = Column(String, nullable=False)
+    week_start = Column(Date, nullable=False)
+
+    attempt_count = Column(Integer, nullable=False, default=0)
+    score_sum = Column(Float, nullable=False, default=0.0)
+
+
+class CourseProgress(Base):
+    # Per-(course, enrolled student) attempt totals for the teacher dashboard (see course_progress.py)
+    __tablename__ = "course_progress"
+    __table_args__ = (
+        Index("uq_course_progress_course_student", "course_id", "student_email", unique=True),
+        Index("ix_course_progress_course_avg", "course_id", "avg_score"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    course_id = Column(Integer, ForeignKey("courses.id"), nullable=False)
+    student_email = Column(String, nullable=False)
+
+    attempt_count = Column(Integer, nullable=False, default=0)
+    score_sum = Column(Float, nullable=False, default=0.0)
+    avg_score = Column(Float, nullable=False, default=0.0)  # stored so the dashboard can sort on an index
+    last_attempt_at = Column(DateTime, nullable=True)
+
+
+class AttachmentText(Base):
+    # Text extracted once per attachment, keyed by SHA-256 of the file bytes
+    __tablename__ = "attachment_texts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    file_hash = Column(String, unique=True, index=True, nullable=False)
+    content_type = Column(String, nullable=True)
+
+    text = Column(Text, nullable=False, default="")
+    # [{"kind": "page"|"paragraph", "n": 1, "start": 0, "end": 120}, ...] offsets into text
+    offsets_json = Column(Text, nullable=False, default="[]")
+    token_estimate = Column(Integer, nullable=False, default=0)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class QuizJob(Base):
+    # Background AI quiz generation (see quiz_jobs.py)
+    __tablename__ = "quiz_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    lesson_id = Column(Integer, ForeignKey("lessons.id"), index=True, nullable=False)
+    teacher_email = Column(String, index=True, nullable=False)
+    difficulty = Column(String, default="easy")
+    num_questions = Column(Integer, nullable=False, default=5)
+
+    status = Column(String, index=True, nullable=False, default="queued")  # queued/running/done/failed
+    attempts = Column(Integer, nullable=False, default=0)
+    # worker running the job and its last sign of life; a running job whose
+    # heartbeat went stale is re-queued (its worker died)
+    claimed_by = Column(String, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    error = Column(Text, nullable=True)
+    quiz_id = Column(Integer, ForeignKey("quizzes.id"), index=True, nullable=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class AuthSession(Base):
+    # One signed-in device; access tokens carry its id as the "sid" claim (see auth_sessions.py)
+    __tablename__ = "auth_sessions"
+
+    id = Column(String, primary_key=True)  # random, url-safe
+    user_email = Column(String, nullable=False, index=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_refreshed_at = Column(DateTime, nullable=True)
+    expires_at = Column(DateTime, nullable=False)  # slides forward on every refresh
+    revoked_at = Column(DateTime, nullable=True)
+
+
+class RefreshToken(Base):
+    # Rotating refresh tokens; only the SHA-256 of the token is stored
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(String, ForeignKey("auth_sessions.id"), nullable=False, index=True)
+    token_hash = Column(String, unique=True, index=True, nullable=False)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)
+    used_at = Column(DateTime, nullable=True)  # set when rotated; presenting it again revokes the session
+
+
+class AIUsage(Base):
+    # Per-user, per-UTC-day AI tutor usage; flushed from memory by ai/limits.py
+    __tablename__ = "ai_usage"
+    __table_args__ = (
+        Index("uq_ai_usage_user_day", "user_email", "day", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_email = Column(String, nullable=False)
+    day = Column(Date, nullable=False)
+
+    requests = Column(Integer, nullable=False, default=0)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    output_tokens = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
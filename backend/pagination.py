@@ -0,0 +1,174 @@
+# pagination.py
+# Shared paging for list endpoints: keyset cursors, limit caps, field projection
+# and simple equality/search filters.
+#
+# Keyset ("seek") paging orders by a few columns ending in a unique one (usually
+# id) and continues *after* the last row seen, so page N costs the same as page 1
+# and rows inserted meanwhile don't shift pages. The cursor is an opaque,
+# URL-safe token the client passes back as ?cursor=...
+#
+# Paging is opt-in: a request with neither ?limit= nor ?cursor= gets the whole
+# list, as before these endpoints were paged (the dashboards rely on that).
+import base64
+import json
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Query
+from sqlalchemy import and_, or_
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+class PageParams:
+    def __init__(self, limit: Optional[int], cursor: Optional[dict], fields: Optional[str]):
+        # limit None = unpaged (no ?limit= and no ?cursor=)
+        self.limit = limit
+        self.cursor = cursor
+        self.fields = fields
+
+
+def page_params(default_limit: int = DEFAULT_LIMIT, max_limit: int = MAX_LIMIT):
+    """FastAPI dependency factory: ?limit=&cursor=&fields=. A cursor without a limit
+    continues with default_limit per page."""
+    def _dep(
+        limit: Optional[int] = Query(None, ge=1, description=f"page size (max {max_limit})"),
+        cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+        fields: Optional[str] = Query(None, description="comma-separated fields to return"),
+    ) -> PageParams:
+        if limit is None and cursor is None:
+            return PageParams(None, None, fields)
+        return PageParams(min(limit or default_limit, max_limit), decode_cursor(cursor), fields)
+    return _dep
+
+
+# =========================================================
+# Cursor encoding
+# =========================================================
+def _to_json(v):
+    if isinstance(v, (datetime, date)):
+        return {"$dt": v.isoformat()}
+    return v
+
+
+def _from_json(v):
+    if isinstance(v, dict) and "$dt" in v:
+        return datetime.fromisoformat(v["$dt"])
+    return v
+
+
+def encode_cursor(payload: dict) -> str:
+    raw = json.dumps(payload, default=_to_json, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[dict]:
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw, object_hook=_from_json)
+        if not isinstance(payload, dict):
+            raise ValueError
+        return payload
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+# =========================================================
+# Projection + filters
+# =========================================================
+def select_fields(fields: Optional[str], allowed: Dict[str, object], default: Optional[Sequence[str]] = None) -> List[str]:
+    """Validates ?fields= against the allowed names; returns the names to load, in allowed order."""
+    if not fields:
+        return list(default or allowed)
+    wanted = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = wanted - set(allowed)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown field(s): {', '.join(sorted(unknown))}. Allowed: {', '.join(allowed)}",
+        )
+    return [name for name in allowed if name in wanted]
+
+
+def apply_filters(query, filters: Dict[object, object]):
+    """Equality filters; None values are skipped."""
+    for column, value in filters.items():
+        if value is not None:
+            query = query.filter(column == value)
+    return query
+
+
+def apply_search(query, columns: Iterable, q: Optional[str]):
+    """Case-insensitive substring match on any of the columns."""
+    q = (q or "").strip()
+    if not q:
+        return query
+    pattern = "%" + q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    return query.filter(or_(*[c.ilike(pattern, escape="\\") for c in columns]))
+
+
+# =========================================================
+# Paging
+# =========================================================
+def _after(order: Sequence[Tuple[object, str]], values: list):
+    # (a, b, id) > (va, vb, vid) spelled out so each column can have its own direction
+    clauses = []
+    for i, (col, direction) in enumerate(order):
+        step = col > values[i] if direction == "asc" else col < values[i]
+        clauses.append(and_(*[order[j][0] == values[j] for j in range(i)], step))
+    return or_(*clauses)
+
+
+def keyset_page(query, order: Sequence[Tuple[object, str]], params: PageParams):
+    """Returns (rows, next_cursor). `order` is [(column, "asc"|"desc"), ...] of
+    non-null columns (a NULL never compares greater, so its rows would be skipped)
+    ending in a unique one. The order columns are added to the selection as
+    _k0, _k1, ... so the cursor can be built whatever else the query projects."""
+    keys = [col.label(f"_k{i}") for i, (col, _d) in enumerate(order)]
+    query = query.add_columns(*keys)
+
+    cursor = params.cursor
+    if cursor is not None:
+        values = cursor.get("k")
+        if not isinstance(values, list) or len(values) != len(order):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.filter(_after(order, values))
+
+    query = query.order_by(*[col.asc() if d == "asc" else col.desc() for col, d in order])
+    if params.limit is None:
+        return query.all(), None
+    rows = query.limit(params.limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > params.limit:
+        rows = rows[:params.limit]
+        last = rows[-1]
+        next_cursor = encode_cursor({"k": [getattr(last, f"_k{i}") for i in range(len(order))]})
+    return rows, next_cursor
+
+
+def offset_page(query, params: PageParams, start: int = 0):
+    """Fallback for orders that can't be keyset-paged (e.g. nullable sort columns)."""
+    offset = start
+    if params.cursor is not None:
+        offset = params.cursor.get("o")
+        if not isinstance(offset, int) or offset < 0:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if params.limit is None:
+        return query.offset(offset).all(), None
+    rows = query.offset(offset).limit(params.limit + 1).all()
+    next_cursor = None
+    if len(rows) > params.limit:
+        rows = rows[:params.limit]
+        next_cursor = encode_cursor({"o": offset + params.limit})
+    return rows, next_cursor
+
+
+def project(row, names: Sequence[str]) -> dict:
+    """Row -> dict of the requested field names (as labelled in the query)."""
+    m = row._mapping
+    return {name: m[name] for name in names}
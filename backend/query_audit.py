@@ -0,0 +1,119 @@
+# query_audit.py
+# Finds queries that scan whole tables.
+#
+# 1. Record: start the API with SQL_AUDIT_LOG=queries.jsonl and click through the
+#    app (or replay staging traffic). Every distinct statement the routers issue
+#    is appended once, with the parameters of its first execution.
+# 2. Audit: python query_audit.py queries.jsonl [--ignore users,courses]
+#    runs EXPLAIN (QUERY PLAN on SQLite) for each recorded statement against
+#    DATABASE_URL and flags full table scans. Exits 1 if any are found.
+import argparse
+import json
+import re
+import sys
+import threading
+
+from sqlalchemy import event
+
+_seen = set()
+_lock = threading.Lock()
+
+# SQLite: "SCAN quiz_attempts" (also when walking a whole index); PostgreSQL: "Seq Scan on quiz_attempts"
+_SQLITE_SCAN = re.compile(r"^SCAN (?!CONSTANT ROW)(\w+)")
+_PG_SCAN = re.compile(r"Seq Scan on (\w+)")
+
+
+def record_to(path: str, *engines):
+    """Appends each distinct statement executed on the engines to a JSON-lines file."""
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+        if verb not in ("SELECT", "UPDATE", "DELETE", "WITH"):
+            return
+        with _lock:
+            if statement in _seen:
+                return
+            _seen.add(statement)
+            with open(path, "a", encoding="utf-8") as f:
+                params = parameters[0] if executemany and parameters else parameters
+                f.write(json.dumps({"sql": statement, "params": params}, default=str) + "\n")
+
+    for eng in dict.fromkeys(engines):
+        event.listen(eng, "before_cursor_execute", _before_execute)
+
+
+def _load(path: str) -> list:
+    entries, seen = [], set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            if entry["sql"] not in seen:
+                seen.add(entry["sql"])
+                entries.append(entry)
+    return entries
+
+
+def _params(params):
+    # JSON turned tuples into lists; qmark/format drivers want a sequence
+    if isinstance(params, list):
+        return tuple(params)
+    return params if params is not None else ()
+
+
+def explain(conn, sql: str, params) -> list:
+    if conn.dialect.name == "sqlite":
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql, _params(params)).fetchall()
+        return [r[-1] for r in rows]
+    rows = conn.exec_driver_sql("EXPLAIN " + sql, _params(params)).fetchall()
+    return [r[0] for r in rows]
+
+
+def full_scans(dialect: str, plan: list) -> list:
+    pattern = _SQLITE_SCAN if dialect == "sqlite" else _PG_SCAN
+    tables = []
+    for line in plan:
+        m = pattern.search(line.strip())
+        if m:
+            tables.append(m.group(1))
+    return tables
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Flag full table scans in recorded queries.")
+    parser.add_argument("log", help="JSON-lines file written via SQL_AUDIT_LOG")
+    parser.add_argument("--ignore", default="", help="comma-separated tables where scans are expected")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print every plan, not only flagged ones")
+    args = parser.parse_args(argv)
+
+    from database import engine
+
+    ignore = {t.strip() for t in args.ignore.split(",") if t.strip()}
+    flagged = 0
+    entries = _load(args.log)
+
+    with engine.connect() as conn:
+        for entry in entries:
+            sql = entry["sql"]
+            try:
+                plan = explain(conn, sql, entry.get("params"))
+            except Exception as e:
+                print("ERR:", " ".join(sql.split())[:120], "->", e)
+                conn.rollback()
+                continue
+
+            scans = [t for t in full_scans(conn.dialect.name, plan) if t not in ignore]
+            if scans:
+                flagged += 1
+            if scans or args.verbose:
+                print(("FULL SCAN (" + ", ".join(scans) + ")") if scans else "OK", "::", " ".join(sql.split()))
+                for line in plan:
+                    print("    ", line)
+
+    print(f"{len(entries)} queries audited, {flagged} with full table scans")
+    return 1 if flagged else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+# question_bank.py
+# Read/write helpers for quiz questions stored one row per question
+# (quiz_questions) instead of parsing Quiz.questions_json on every request.
+import json
+from typing import List
+
+from sqlalchemy.orm import Session
+
+from models import Quiz, QuizAttempt, QuizJob, QuizQuestion
+import course_progress
+import student_stats
+
+
+def question_rows(quiz_id: int, questions: list) -> List[QuizQuestion]:
+    return [
+        QuizQuestion(
+            quiz_id=quiz_id,
+            ordinal=i,
+            question=q.get("question", ""),
+            options_json=json.dumps(q.get("options", [])),
+            answer=q.get("answer", ""),
+            explanation=q.get("explanation"),
+        )
+        for i, q in enumerate(questions)
+    ]
+
+
+def add_quiz(db: Session, lesson_id: int, difficulty: str, questions: list) -> Quiz:
+    """Adds the quiz and its question rows to the session (caller commits)."""
+    quiz = Quiz(
+        lesson_id=lesson_id,
+        difficulty=difficulty,
+        questions_json=json.dumps(questions),
+        question_count=len(questions),
+    )
+    db.add(quiz)
+    db.flush()  # assigns quiz.id
+    db.add_all(question_rows(quiz.id, questions))
+    return quiz
+
+
+def load_questions(db: Session, quiz_id: int) -> list:
+    rows = (
+        db.query(QuizQuestion)
+        .filter(QuizQuestion.quiz_id == quiz_id)
+        .order_by(QuizQuestion.ordinal.asc())
+        .all()
+    )
+    return [
+        {
+            "question": r.question,
+            "options": json.loads(r.options_json or "[]"),
+            "answer": r.answer,
+            "explanation": r.explanation or "",
+        }
+        for r in rows
+    ]
+
+
+def load_answer_key(db: Session, quiz_id: int) -> list:
+    """[(question, answer), ...] in quiz order -- all grading needs."""
+    return (
+        db.query(QuizQuestion.question, QuizQuestion.answer)
+        .filter(QuizQuestion.quiz_id == quiz_id)
+        .order_by(QuizQuestion.ordinal.asc())
+        .all()
+    )
+
+
+def delete_questions(db: Session, quiz_ids: list):
+    if quiz_ids:
+        db.query(QuizQuestion).filter(QuizQuestion.quiz_id.in_(quiz_ids)).delete(synchronize_session=False)
+
+
+def delete_quizzes(db: Session, quiz_ids: list):
+    """Deletes quizzes and the rows that reference them, children first (caller commits)."""
+    if not quiz_ids:
+        return
+    students = [e for (e,) in db.query(QuizAttempt.student_email).filter(QuizAttempt.quiz_id.in_(quiz_ids)).distinct()]
+    by_course = course_progress.affected_by_quizzes(db, quiz_ids)
+    db.query(QuizAttempt).filter(QuizAttempt.quiz_id.in_(quiz_ids)).delete(synchronize_session=False)
+    # their dashboard rollups included the removed attempts
+    student_stats.rebuild(db, students)
+    for course_id, emails in by_course.items():
+        course_progress.rebuild(db, course_id, emails)
+    db.query(QuizJob).filter(QuizJob.quiz_id.in_(quiz_ids)).update({QuizJob.quiz_id: None}, synchronize_session=False)
+    delete_questions(db, quiz_ids)
+    db.query(Quiz).filter(Quiz.id.in_(quiz_ids)).delete(synchronize_session=False)
+
+
+def delete_lesson_quizzes(db: Session, lesson_ids: list):
+    """Clears everything hanging off the given lessons so they can be deleted."""
+    if not lesson_ids:
+        return
+    quiz_ids = [qid for (qid,) in db.query(Quiz.id).filter(Quiz.lesson_id.in_(lesson_ids)).all()]
+    delete_quizzes(db, quiz_ids)
+    db.query(QuizJob).filter(QuizJob.lesson_id.in_(lesson_ids)).delete(synchronize_session=False)
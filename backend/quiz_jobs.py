@@ -0,0 +1,383 @@
+# quiz_jobs.py
+# Background job mode for AI quiz generation.
+# POST /quizzes/jobs enqueues a generation and returns a job id immediately;
+# a bounded pool of worker tasks runs the Gemini call, retries transient errors
+# and writes the Quiz row. Jobs live in the quiz_jobs table, so queued or
+# interrupted jobs are picked up again after a restart.
+#
+# Several app processes may share the table. A worker claims a job with a
+# conditional UPDATE (queued -> running), so each job runs once, and keeps a
+# heartbeat on it while it works. Running jobs whose heartbeat went stale (the
+# worker died) are re-queued; live ones are left alone. Queued jobs nobody picked
+# up within the same window are handed to a live process too. Database work runs
+# on worker threads with short sessions; none is held open while Gemini answers.
+#
+#   QUIZ_JOB_WORKERS              worker tasks per process (default 4)
+#   QUIZ_JOB_MAX_ATTEMPTS         tries per job on transient errors (default 3)
+#   QUIZ_JOB_RETRY_BASE_SECONDS   first retry delay, doubled per attempt (default 2)
+#   QUIZ_JOB_HEARTBEAT_SECONDS    how often a running job is touched (default 15)
+#   QUIZ_JOB_STALE_SECONDS        heartbeat age after which a job is re-queued (default 90)
+import asyncio
+import os
+import random
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel, Field
+from sqlalchemy import or_
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from ai.governor import is_retryable
+from authz import lesson_access, require_owner
+from database import SessionLocal
+from deps import get_db, require_role
+from models import Course, Lesson, QuizJob
+from question_bank import add_quiz, load_questions
+from quizzes import check_question_limit, gemini_generate_mcq
+
+router = APIRouter(prefix="/quizzes/jobs", tags=["quizzes"])
+
+WORKERS = int(os.getenv("QUIZ_JOB_WORKERS", "4"))
+MAX_ATTEMPTS = int(os.getenv("QUIZ_JOB_MAX_ATTEMPTS", "3"))
+RETRY_BASE_SECONDS = float(os.getenv("QUIZ_JOB_RETRY_BASE_SECONDS", "2"))
+HEARTBEAT_SECONDS = float(os.getenv("QUIZ_JOB_HEARTBEAT_SECONDS", "15"))
+STALE_SECONDS = float(os.getenv("QUIZ_JOB_STALE_SECONDS", "90"))
+
+
+class QuizJobReq(BaseModel):
+    lesson_id: int
+    num_questions: int = Field(5, ge=1, le=20)
+    difficulty: str = "easy"
+
+
+def _is_transient(e: Exception) -> bool:
+    # worth another try: the governor's 502/503/504 (upstream errors, breaker,
+    # timeouts), raw timeouts/connection drops and database connection errors.
+    # 4xx (bad lesson, plan limit, ...), a 500 wrapping a bug or an unusable
+    # answer, KeyError/TypeError and the like would only fail again.
+    if isinstance(e, HTTPException):
+        return e.status_code in (502, 503, 504)
+    return is_retryable(e) or isinstance(e, OperationalError)
+
+
+class QuizJobQueue:
+    def __init__(self, workers: int = WORKERS, max_attempts: int = MAX_ATTEMPTS,
+                 heartbeat_seconds: float = HEARTBEAT_SECONDS, stale_seconds: float = STALE_SECONDS,
+                 session_factory=SessionLocal):
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.heartbeat_seconds = heartbeat_seconds
+        self.stale_seconds = max(stale_seconds, 2 * heartbeat_seconds)
+        self.session_factory = session_factory
+        # unique per process and start, recorded in quiz_jobs.claimed_by
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._reaper()))
+
+        # resume jobs left behind by a previous process (still-running ones
+        # belong to live workers and are skipped)
+        for job_id in await asyncio.to_thread(self.recover, True):
+            self._queue.put_nowait(job_id)
+
+    async def stop(self):
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def enqueue(self, job_id: int):
+        if self._queue is None:
+            # worker pool not started (e.g. scripts); job stays queued in the DB
+            return
+        self._queue.put_nowait(job_id)
+
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    # =========================================================
+    # Database steps (worker threads, one short session each)
+    # =========================================================
+    def recover(self, include_queued: bool = False) -> list:
+        """Re-queues running jobs with a stale heartbeat. Returns their ids plus
+        those of queued jobs nobody has touched for stale_seconds (their process
+        died before a worker claimed them, or while a retry was pending), or of
+        every queued job when include_queued (startup)."""
+        stale_before = datetime.utcnow() - timedelta(seconds=self.stale_seconds)
+        db = self.session_factory()
+        try:
+            stale = [
+                job_id for (job_id,) in db.query(QuizJob.id)
+                .filter(QuizJob.status == "running")
+                .filter(or_(QuizJob.heartbeat_at.is_(None), QuizJob.heartbeat_at < stale_before))
+                .all()
+            ]
+            requeued = []
+            for job_id in stale:
+                # conditional, so a heartbeat that lands meanwhile keeps the job
+                n = (
+                    db.query(QuizJob)
+                    .filter(QuizJob.id == job_id, QuizJob.status == "running")
+                    .filter(or_(QuizJob.heartbeat_at.is_(None), QuizJob.heartbeat_at < stale_before))
+                    .update({QuizJob.status: "queued", QuizJob.claimed_by: None,
+                             QuizJob.updated_at: datetime.utcnow()}, synchronize_session=False)
+                )
+                if n:
+                    requeued.append(job_id)
+            db.commit()
+
+            if include_queued:
+                return [
+                    job_id for (job_id,) in db.query(QuizJob.id)
+                    .filter(QuizJob.status == "queued")
+                    .order_by(QuizJob.id.asc())
+                    .all()
+                ]
+
+            waiting = [
+                job_id for (job_id,) in db.query(QuizJob.id)
+                .filter(QuizJob.status == "queued")
+                .filter(or_(QuizJob.updated_at.is_(None), QuizJob.updated_at < stale_before))
+                .order_by(QuizJob.id.asc())
+                .all()
+            ]
+            for job_id in waiting:
+                # touched so one process picks it up per stale period, not every reaper
+                n = (
+                    db.query(QuizJob)
+                    .filter(QuizJob.id == job_id, QuizJob.status == "queued")
+                    .filter(or_(QuizJob.updated_at.is_(None), QuizJob.updated_at < stale_before))
+                    .update({QuizJob.updated_at: datetime.utcnow()}, synchronize_session=False)
+                )
+                if n:
+                    requeued.append(job_id)
+            db.commit()
+            return requeued
+        finally:
+            db.close()
+
+    def claim(self, job_id: int) -> Optional[dict]:
+        """queued -> running for this worker, or None if the job is not queued
+        (done, failed, or claimed by another worker first)."""
+        now = datetime.utcnow()
+        db = self.session_factory()
+        try:
+            claimed = (
+                db.query(QuizJob)
+                .filter(QuizJob.id == job_id, QuizJob.status == "queued")
+                .update({
+                    QuizJob.status: "running",
+                    QuizJob.claimed_by: self.worker_id,
+                    QuizJob.heartbeat_at: now,
+                    QuizJob.attempts: QuizJob.attempts + 1,
+                    QuizJob.updated_at: now,
+                }, synchronize_session=False)
+            )
+            if claimed != 1:
+                db.rollback()
+                return None
+            db.commit()
+            job = db.query(QuizJob).filter(QuizJob.id == job_id).one()
+            return {
+                "id": job.id,
+                "lesson_id": job.lesson_id,
+                "teacher_email": job.teacher_email,
+                "difficulty": job.difficulty,
+                "num_questions": job.num_questions,
+                "attempts": job.attempts,
+            }
+        finally:
+            db.close()
+
+    def _load(self, job: dict):
+        # lesson, course and plan check; the loaded objects outlive the session
+        db = self.session_factory()
+        try:
+            lesson = db.query(Lesson).filter(Lesson.id == job["lesson_id"]).first()
+            if not lesson:
+                raise HTTPException(status_code=404, detail="Lesson not found")
+            course = db.query(Course).filter(Course.id == lesson.course_id).first()
+            if not course:
+                raise HTTPException(status_code=404, detail="Course not found")
+            num_questions, teacher = check_question_limit(db, job["teacher_email"], job["num_questions"])
+            return lesson, course, num_questions, teacher
+        finally:
+            db.close()
+
+    def _mine(self, db: Session, job_id: int):
+        return db.query(QuizJob).filter(
+            QuizJob.id == job_id, QuizJob.status == "running", QuizJob.claimed_by == self.worker_id
+        )
+
+    def _heartbeat_once(self, job_id: int) -> bool:
+        db = self.session_factory()
+        try:
+            n = self._mine(db, job_id).update({QuizJob.heartbeat_at: datetime.utcnow()}, synchronize_session=False)
+            db.commit()
+            return n == 1
+        finally:
+            db.close()
+
+    def _finish(self, job: dict, questions: list) -> Optional[int]:
+        """Saves the quiz and marks the job done in one transaction; None (and
+        nothing saved) if the job is no longer this worker's."""
+        db = self.session_factory()
+        try:
+            quiz = add_quiz(db, job["lesson_id"], job["difficulty"], questions)
+            n = self._mine(db, job["id"]).update({
+                QuizJob.status: "done",
+                QuizJob.quiz_id: quiz.id,
+                QuizJob.error: None,
+                QuizJob.updated_at: datetime.utcnow(),
+            }, synchronize_session=False)
+            if n != 1:
+                db.rollback()
+                return None
+            db.commit()
+            return quiz.id
+        finally:
+            db.close()
+
+    def _fail(self, job: dict, e: Exception) -> bool:
+        """Records the error; True if the job went back to the queue for a retry."""
+        detail = e.detail if isinstance(e, HTTPException) else str(e)
+        retry = _is_transient(e) and job["attempts"] < self.max_attempts
+        db = self.session_factory()
+        try:
+            n = self._mine(db, job["id"]).update({
+                QuizJob.status: "queued" if retry else "failed",
+                QuizJob.claimed_by: None,
+                QuizJob.error: str(detail),
+                QuizJob.updated_at: datetime.utcnow(),
+            }, synchronize_session=False)
+            db.commit()
+            return retry and n == 1
+        finally:
+            db.close()
+
+    # =========================================================
+    # Workers
+    # =========================================================
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception:
+                # never let one bad job kill the worker
+                pass
+            finally:
+                self._queue.task_done()
+
+    async def _reaper(self):
+        # picks up jobs whose worker died after this process started
+        while True:
+            await asyncio.sleep(self.stale_seconds / 2)
+            try:
+                for job_id in await asyncio.to_thread(self.recover):
+                    self.enqueue(job_id)
+            except Exception:
+                pass
+
+    async def _heartbeat(self, job_id: int):
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            try:
+                if not await asyncio.to_thread(self._heartbeat_once, job_id):
+                    return
+            except Exception:
+                # a missed beat is fine; the job only goes stale after several
+                pass
+
+    async def _run(self, job_id: int):
+        job = await asyncio.to_thread(self.claim, job_id)
+        if job is None:
+            return
+
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            lesson, course, num_questions, teacher = await asyncio.to_thread(self._load, job)
+            questions = await gemini_generate_mcq(
+                teacher=teacher,
+                lesson=lesson,
+                course=course,
+                difficulty=job["difficulty"],
+                num_questions=num_questions,
+            )
+            await asyncio.to_thread(self._finish, job, questions)
+        except Exception as e:
+            if await asyncio.to_thread(self._fail, job, e):
+                delay = RETRY_BASE_SECONDS * (2 ** (job["attempts"] - 1)) * (0.5 + random.random())
+                asyncio.get_running_loop().call_later(delay, self.enqueue, job_id)
+        finally:
+            heartbeat.cancel()
+
+
+job_queue = QuizJobQueue()
+
+
+@router.post("", status_code=202)
+def create_quiz_job(
+    data: QuizJobReq,
+    db: Session = Depends(get_db),
+    user=Depends(require_role("teacher"))
+):
+    # Teacher must own the course
+    require_owner(lesson_access(db, user["email"], data.lesson_id))
+
+    # fail fast on plan limits instead of inside the worker
+    num_questions, _teacher = check_question_limit(db, user["email"], data.num_questions)
+
+    job = QuizJob(
+        lesson_id=data.lesson_id,
+        teacher_email=user["email"],
+        difficulty=data.difficulty,
+        num_questions=num_questions,
+        status="queued",
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+
+    job_queue.enqueue(job.id)
+    return {"job_id": job.id, "status": job.status}
+
+
+@router.get("/{job_id}")
+def get_quiz_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    user=Depends(require_role("teacher"))
+):
+    job = db.query(QuizJob).filter(QuizJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    if user["role"] != "admin" and job.teacher_email != user["email"]:
+        raise HTTPException(status_code=403, detail="Not your job")
+
+    out = {
+        "job_id": job.id,
+        "lesson_id": job.lesson_id,
+        "difficulty": job.difficulty,
+        "num_questions": job.num_questions,
+        "status": job.status,
+        "attempts": job.attempts,
+        "error": job.error,
+        "quiz_id": job.quiz_id,
+        "created_at": str(job.created_at),
+        "updated_at": str(job.updated_at),
+    }
+
+    if job.status == "done" and job.quiz_id:
+        out["questions"] = load_questions(db, job.quiz_id)
+
+    return out
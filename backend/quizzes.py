@@ -1,55 +1,53 @@
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
-from sqlalchemy import text as sql_text
+import asyncio
 import json
+import mimetypes
 import os
 import re
 from pathlib import Path
 from typing import List, Optional
-from datetime import datetime
 
 from dotenv import load_dotenv
-import google.generativeai as genai
 
-from deps import get_db, require_role, get_current_user
-from models import Course, Lesson, Quiz, Enrollment, User
+from ai import llm
+from ai.files import file_registry
+from authz import Access, access_cache, lesson_member, lesson_owner, quiz_member, quiz_owner
+from database import ReadSessionLocal
+from deps import get_db, require_role
+import extraction
+from grading_cache import grading_cache
+from question_bank import add_quiz, delete_quizzes, load_questions
+from models import Course, Lesson, Quiz
+from pagination import PageParams, apply_filters, keyset_page, page_params, project, select_fields
+from security import UserProfile, get_profile, is_premium
 
 router = APIRouter(prefix="/quizzes", tags=["quizzes"])
 
 # =========================================================
-# Gemini setup 
+# Gemini setup (client + API key live in ai/llm.py)
 # =========================================================
 env_path = Path(__file__).resolve().parent / ".env"
 load_dotenv(env_path, override=True)
 
-API_KEY = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
-if API_KEY:
-    genai.configure(api_key=API_KEY)
-
 FREE_MODEL = os.getenv("GEMINI_FREE_MODEL", "gemini-2.0-flash")
 PREMIUM_MODEL = os.getenv("GEMINI_PREMIUM_MODEL", "gemini-3-flash-preview")
 
 UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
 
+# batch generation: max items per request, concurrent Gemini calls per request,
+# and how many questions may share one packed prompt (fits the 4096-token output)
+BATCH_MAX_ITEMS = int(os.getenv("QUIZ_BATCH_MAX_ITEMS", "100"))
+BATCH_CONCURRENCY = int(os.getenv("QUIZ_BATCH_CONCURRENCY", "4"))
+PACK_MAX_QUESTIONS = int(os.getenv("QUIZ_PACK_MAX_QUESTIONS", "20"))
 
-def is_premium_user(user: Optional[User]) -> bool:
-    """Keep same logic style as gemini_chat.py: premium if plan == premium and premium_until not expired."""
-    if not user:
-        return False
-    if getattr(user, "plan", "free") != "premium":
-        return False
-    premium_until = getattr(user, "premium_until", None)
-    if premium_until is None:
-        return True
-    try:
-        return premium_until > datetime.utcnow()
-    except Exception:
-        return False
+# cap on extracted attachment text sent as lesson context (~25k tokens)
+MAX_EXTRACTED_CHARS = 100_000
 
 
-def pick_model(user: Optional[User]) -> str:
-    return PREMIUM_MODEL if is_premium_user(user) else FREE_MODEL
+def pick_model(user: Optional[UserProfile]) -> str:
+    return PREMIUM_MODEL if is_premium(user) else FREE_MODEL
 
 
 def extract_json_array(text: str):
@@ -84,6 +82,32 @@ def extract_json_array(text: str):
     raise ValueError("Could not parse JSON array from AI response")
 
 
+def extract_json_object(text: str):
+    """
+    Same idea as extract_json_array, for packed batch responses ({"set_1": [...], ...}).
+    """
+    if not text:
+        raise ValueError("Empty AI response")
+
+    t = re.sub(r"```(?:json)?", "", text.strip(), flags=re.IGNORECASE).replace("```", "").strip()
+
+    try:
+        obj = json.loads(t)
+        if isinstance(obj, dict):
+            return obj
+    except Exception:
+        pass
+
+    l = t.find("{")
+    r = t.rfind("}")
+    if l != -1 and r != -1 and r > l:
+        obj = json.loads(t[l : r + 1])
+        if isinstance(obj, dict):
+            return obj
+
+    raise ValueError("Could not parse JSON object from AI response")
+
+
 def normalize_questions(raw_list, limit: int):
     """
     Enforce format:
@@ -140,10 +164,13 @@ def normalize_questions(raw_list, limit: int):
     return cleaned
 
 
-def get_lesson_context_for_gemini(lesson: Lesson):
+async def get_lesson_context_for_gemini(lesson: Lesson):
     """
     Prefer lesson.content_text.
-    If empty but attachment exists (PDF/JPG/PNG), load from uploads/ and pass to Gemini too.
+    If empty but attachment exists, use the text extracted at upload time (extraction.py).
+    Only when that is missing or too thin (scans, images) load the file from uploads/
+    and pass it to Gemini. The Gemini upload is reused across calls (see ai/files.py),
+    so generating several quizzes from the same attachment uploads it only once.
     """
     text_part = (lesson.content_text or "").strip()
     gemini_file = None
@@ -152,54 +179,50 @@ def get_lesson_context_for_gemini(lesson: Lesson):
         url = (lesson.attachment_url or "").strip()
         filename = url.split("/")[-1] if "/" in url else url
         local_path = os.path.join(UPLOAD_DIR, filename)
-        if os.path.exists(local_path) and API_KEY:
+
+        extracted_text = await asyncio.to_thread(_extracted_text_for, local_path)
+        if extracted_text:
+            return extracted_text[:MAX_EXTRACTED_CHARS], None
+
+        if os.path.exists(local_path) and llm.is_configured():
+            mime_type = lesson.attachment_type or mimetypes.guess_type(local_path)[0] or "application/pdf"
             try:
-                gemini_file = genai.upload_file(local_path)
+                gemini_file = await file_registry.get_or_upload_path(local_path, mime_type)
             except Exception:
                 gemini_file = None
 
     return text_part, gemini_file
 
 
-def gemini_generate_mcq(
-    db: Session,
-    teacher_email: str,
-    lesson: Lesson,
-    course: Course,
-    difficulty: str,
-    num_questions: int,
-):
-    if not API_KEY:
-        raise HTTPException(status_code=500, detail="GEMINI_API_KEY not set in backend/.env")
+def _extracted_text_for(local_path: str) -> Optional[str]:
+    # own session: runs on a worker thread, possibly several at once (batch generation)
+    db = ReadSessionLocal()
+    try:
+        row = extraction.lookup_for_path(db, local_path)
+        return row.text if extraction.is_useful(row) else None
+    finally:
+        db.close()
+
 
-    # limits
+def check_question_limit(db: Session, teacher_email: str, num_questions: int):
+    """Clamp num_questions to 1..20 and enforce the free-plan cap of 10. Returns (num_questions, teacher)."""
     num_questions = max(1, min(20, int(num_questions or 5)))
 
-    teacher = db.query(User).filter(User.email == teacher_email).first()
-    premium = is_premium_user(teacher)
+    teacher = get_profile(db, teacher_email)
+    premium = is_premium(teacher)
     if not premium and num_questions > 10:
         raise HTTPException(status_code=403, detail="Free plan can generate up to 10 questions. Premium up to 20.")
+    return num_questions, teacher
 
-    lesson_text, gemini_file = get_lesson_context_for_gemini(lesson)
 
-    if not lesson_text and not gemini_file:
-        raise HTTPException(
-            status_code=400,
-            detail="This lesson has no text content and no readable attachment. Add lesson text or upload a PDF/image.",
-        )
-
-    model_name = pick_model(teacher)
-    model = genai.GenerativeModel(model_name)
-
-    prompt = f"""
-You are an expert teacher. Generate a high-quality MCQ quiz strictly from the lesson content.
+def save_quiz(db: Session, lesson_id: int, difficulty: str, questions: list) -> Quiz:
+    quiz = add_quiz(db, lesson_id, difficulty, questions)
+    db.commit()
+    db.refresh(quiz)
+    return quiz
 
-Course title: {course.title}
-Lesson title: {lesson.title}
-Lesson topic: {lesson.topic}
-Difficulty: {difficulty}
-Number of questions: {num_questions}
 
+MCQ_RULES = """
 Rules:
 - Create ONLY multiple-choice questions (MCQ).
 - Each question MUST have exactly 4 options.
@@ -208,7 +231,21 @@ Rules:
 - Mix question styles: concept, application, scenario-based, reasoning, common misconceptions.
 - Keep questions clearly based on the lesson content.
 - Do NOT repeat the same question wording.
+"""
+
+MCQ_GENERATION_CONFIG = {"temperature": 0.7, "top_p": 0.9, "max_output_tokens": 4096}
+
 
+def build_mcq_prompt(course: Course, lesson: Lesson, difficulty: str, num_questions: int) -> str:
+    return f"""
+You are an expert teacher. Generate a high-quality MCQ quiz strictly from the lesson content.
+
+Course title: {course.title}
+Lesson title: {lesson.title}
+Lesson topic: {lesson.topic}
+Difficulty: {difficulty}
+Number of questions: {num_questions}
+{MCQ_RULES}
 Return ONLY valid JSON (no markdown, no commentary), as an array like:
 [
   {{
@@ -220,20 +257,77 @@ Return ONLY valid JSON (no markdown, no commentary), as an array like:
 ]
 """
 
-    try:
-        if gemini_file:
-            resp = model.generate_content(
-                [prompt, gemini_file],
-                generation_config={"temperature": 0.7, "top_p": 0.9, "max_output_tokens": 4096},
-            )
-        else:
-            # include lesson text directly
-            resp = model.generate_content(
-                prompt + "\n\nLESSON TEXT:\n" + lesson_text,
-                generation_config={"temperature": 0.7, "top_p": 0.9, "max_output_tokens": 4096},
-            )
 
-        raw_text = (getattr(resp, "text", "") or "").strip()
+def build_packed_mcq_prompt(course: Course, lesson: Lesson, specs) -> str:
+    """specs: [(difficulty, num_questions), ...] -> one prompt asking for set_1..set_N."""
+    sets = "\n".join(
+        f'- "set_{i}": {n} questions, difficulty {d}' for i, (d, n) in enumerate(specs, start=1)
+    )
+    return f"""
+You are an expert teacher. Generate several independent high-quality MCQ quizzes strictly from the lesson content.
+
+Course title: {course.title}
+Lesson title: {lesson.title}
+Lesson topic: {lesson.topic}
+
+Quizzes to generate:
+{sets}
+{MCQ_RULES}- Questions must not repeat across quizzes.
+
+Return ONLY valid JSON (no markdown, no commentary), as an object with one array per quiz, like:
+{{
+  "set_1": [
+    {{
+      "question": "...",
+      "options": ["A", "B", "C", "D"],
+      "answer": "B",
+      "explanation": "..."
+    }}
+  ]
+}}
+"""
+
+
+def _with_context(prompt: str, lesson_text: str, gemini_file):
+    if gemini_file:
+        return [prompt, gemini_file]
+    # include lesson text directly
+    return prompt + "\n\nLESSON TEXT:\n" + lesson_text
+
+
+def _require_context(lesson_text: str, gemini_file):
+    if not lesson_text and not gemini_file:
+        raise HTTPException(
+            status_code=400,
+            detail="This lesson has no text content and no readable attachment. Add lesson text or upload a PDF/image.",
+        )
+
+
+async def gemini_generate_mcq(
+    teacher: Optional[UserProfile],
+    lesson: Lesson,
+    course: Course,
+    difficulty: str,
+    num_questions: int,
+):
+    """num_questions and teacher come from check_question_limit. Takes no session,
+    so callers need not hold one open while Gemini answers."""
+    if not llm.is_configured():
+        raise HTTPException(status_code=500, detail="GEMINI_API_KEY not set in backend/.env")
+
+    lesson_text, gemini_file = await get_lesson_context_for_gemini(lesson)
+    _require_context(lesson_text, gemini_file)
+
+    model_name = pick_model(teacher)
+    prompt = build_mcq_prompt(course, lesson, difficulty, num_questions)
+
+    try:
+        raw_text = await llm.generate(
+            model_name,
+            _with_context(prompt, lesson_text, gemini_file),
+            generation_config=MCQ_GENERATION_CONFIG,
+            premium=is_premium(teacher),
+        )
         raw_list = extract_json_array(raw_text)
         return normalize_questions(raw_list, limit=num_questions)
 
@@ -243,6 +337,54 @@ Return ONLY valid JSON (no markdown, no commentary), as an array like:
         raise HTTPException(status_code=500, detail=f"Gemini quiz generation failed: {str(e)}")
 
 
+async def gemini_generate_mcq_packed(model_name: str, lesson: Lesson, course: Course, context, specs,
+                                     premium: bool = False):
+    """
+    Generate several quiz sets for one lesson. Sets whose combined size fits one
+    response are packed into a single prompt (lesson context sent once); if the
+    packed answer can't be parsed, each set is generated on its own.
+    Returns one entry per spec, in order: a question list, or the HTTPException
+    that set failed with.
+    """
+    lesson_text, gemini_file = context
+
+    if len(specs) > 1:
+        try:
+            raw_text = await llm.generate(
+                model_name,
+                _with_context(build_packed_mcq_prompt(course, lesson, specs), lesson_text, gemini_file),
+                generation_config=MCQ_GENERATION_CONFIG,
+                premium=premium,
+            )
+            obj = extract_json_object(raw_text)
+            return [
+                normalize_questions(obj.get(f"set_{i}") or [], limit=n)
+                for i, (_d, n) in enumerate(specs, start=1)
+            ]
+        except HTTPException as e:
+            # Gemini unavailable (governor gave up): retrying set by set would only add load
+            if e.status_code in (502, 503, 504):
+                return [e] * len(specs)
+        except Exception:
+            pass
+
+    out = []
+    for difficulty, n in specs:
+        try:
+            raw_text = await llm.generate(
+                model_name,
+                _with_context(build_mcq_prompt(course, lesson, difficulty, n), lesson_text, gemini_file),
+                generation_config=MCQ_GENERATION_CONFIG,
+                premium=premium,
+            )
+            out.append(normalize_questions(extract_json_array(raw_text), limit=n))
+        except HTTPException as e:
+            out.append(e)
+        except Exception as e:
+            out.append(HTTPException(status_code=500, detail=f"Gemini quiz generation failed: {str(e)}"))
+    return out
+
+
 # =========================================================
 # Request models
 # =========================================================
@@ -251,6 +393,16 @@ class QuizGenerateReq(BaseModel):
     difficulty: str = "easy"  # easy/medium/hard
 
 
+class BatchQuizItem(BaseModel):
+    lesson_id: int
+    difficulty: str = "easy"
+    num_questions: int = Field(5, ge=1, le=20)
+
+
+class BatchQuizGenerateReq(BaseModel):
+    items: List[BatchQuizItem] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS)
+
+
 class ManualQuestion(BaseModel):
     question: str
     options: List[str]
@@ -266,42 +418,37 @@ class ManualQuizCreateReq(BaseModel):
 # =========================================================
 # AI Generate Quiz (Gemini)
 # =========================================================
+# The generate handlers are async (they await Gemini); their queries and commits
+# run with asyncio.to_thread so the event loop never blocks on the database.
+def _lesson_with_course(db: Session, lesson_id: int):
+    return (
+        db.query(Lesson, Course)
+        .join(Course, Course.id == Lesson.course_id)
+        .filter(Lesson.id == lesson_id)
+        .one()
+    )
+
+
 @router.post("/generate/{lesson_id}")
-def generate_quiz_from_lesson(
+async def generate_quiz_from_lesson(
     lesson_id: int,
     data: QuizGenerateReq,
     db: Session = Depends(get_db),
-    user=Depends(require_role("teacher"))
+    user=Depends(require_role("teacher")),
+    access: Access = Depends(lesson_owner),
 ):
-    lesson = db.query(Lesson).filter(Lesson.id == lesson_id).first()
-    if not lesson:
-        raise HTTPException(status_code=404, detail="Lesson not found")
+    lesson, course = await asyncio.to_thread(_lesson_with_course, db, lesson_id)
+    num_questions, teacher = await asyncio.to_thread(check_question_limit, db, user["email"], data.num_questions)
 
-    course = db.query(Course).filter(Course.id == lesson.course_id).first()
-    if not course:
-        raise HTTPException(status_code=404, detail="Course not found")
-
-    # Teacher must own the course
-    if course.teacher_email != user["email"]:
-        raise HTTPException(status_code=403, detail="Not your course")
-
-    questions = gemini_generate_mcq(
-        db=db,
-        teacher_email=user["email"],
+    questions = await gemini_generate_mcq(
+        teacher=teacher,
         lesson=lesson,
         course=course,
         difficulty=data.difficulty,
-        num_questions=data.num_questions,
+        num_questions=num_questions,
     )
 
-    quiz = Quiz(
-        lesson_id=lesson_id,
-        difficulty=data.difficulty,
-        questions_json=json.dumps(questions)
-    )
-    db.add(quiz)
-    db.commit()
-    db.refresh(quiz)
+    quiz = await asyncio.to_thread(save_quiz, db, lesson_id, data.difficulty, questions)
 
     return {
         "quiz_id": quiz.id,
@@ -311,6 +458,139 @@ def generate_quiz_from_lesson(
     }
 
 
+# =========================================================
+# Batch AI Generate (many lessons / difficulties in one call)
+# =========================================================
+def _pack(entries, max_questions: int):
+    """Group [(index, difficulty, n), ...] into chunks whose total n <= max_questions."""
+    chunks, current, total = [], [], 0
+    for entry in entries:
+        n = entry[2]
+        if current and total + n > max_questions:
+            chunks.append(current)
+            current, total = [], 0
+        current.append(entry)
+        total += n
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _batch_lessons(db: Session, lesson_ids, teacher_email: str):
+    rows = (
+        db.query(Lesson, Course)
+        .join(Course, Course.id == Lesson.course_id)
+        .filter(Lesson.id.in_(lesson_ids))
+        .all()
+    )
+    return {lesson.id: (lesson, course) for lesson, course in rows}, get_profile(db, teacher_email)
+
+
+def _save_batch(db: Session, items, generated: dict) -> dict:
+    # one transaction for all generated quizzes; returns plain results, since
+    # the committed Quiz objects would reload lazily on the event loop
+    quizzes = {i: add_quiz(db, items[i].lesson_id, items[i].difficulty, generated[i]) for i in sorted(generated)}
+    saved = {
+        i: {
+            "index": i,
+            "lesson_id": quiz.lesson_id,
+            "difficulty": quiz.difficulty,
+            "quiz_id": quiz.id,
+            "question_count": len(generated[i]),
+        }
+        for i, quiz in quizzes.items()
+    }
+    db.commit()
+    return saved
+
+
+@router.post("/generate-batch")
+async def generate_quiz_batch(
+    data: BatchQuizGenerateReq,
+    db: Session = Depends(get_db),
+    user=Depends(require_role("teacher"))
+):
+    if not llm.is_configured():
+        raise HTTPException(status_code=500, detail="GEMINI_API_KEY not set in backend/.env")
+
+    items = data.items
+    results = [None] * len(items)
+
+    def fail(i: int, status_code: int, detail: str):
+        results[i] = {
+            "index": i,
+            "lesson_id": items[i].lesson_id,
+            "difficulty": items[i].difficulty,
+            "error": {"status_code": status_code, "detail": detail},
+        }
+
+    lesson_ids = {it.lesson_id for it in items}
+    by_lesson, teacher = await asyncio.to_thread(_batch_lessons, db, lesson_ids, user["email"])
+    premium = is_premium(teacher)
+    model_name = pick_model(teacher)
+
+    # validate every item, then group the valid ones by lesson
+    groups = {}
+    for i, it in enumerate(items):
+        pair = by_lesson.get(it.lesson_id)
+        if not pair:
+            fail(i, 404, "Lesson not found")
+            continue
+        if pair[1].teacher_email != user["email"]:
+            fail(i, 403, "Not your course")
+            continue
+        if not premium and it.num_questions > 10:
+            fail(i, 403, "Free plan can generate up to 10 questions. Premium up to 20.")
+            continue
+        groups.setdefault(it.lesson_id, []).append((i, it.difficulty, it.num_questions))
+
+    sem = asyncio.Semaphore(max(1, BATCH_CONCURRENCY))
+    contexts = {}  # lesson_id -> shared task, so each lesson's context is loaded once
+
+    def context_for(lesson: Lesson):
+        if lesson.id not in contexts:
+            contexts[lesson.id] = asyncio.ensure_future(get_lesson_context_for_gemini(lesson))
+        return contexts[lesson.id]
+
+    generated = {}  # item index -> questions
+
+    async def run_chunk(lesson: Lesson, course: Course, chunk):
+        async with sem:
+            context = await context_for(lesson)
+            try:
+                _require_context(*context)
+            except HTTPException as e:
+                for i, _d, _n in chunk:
+                    fail(i, e.status_code, e.detail)
+                return
+
+            specs = [(d, n) for _i, d, n in chunk]
+            outcomes = await gemini_generate_mcq_packed(model_name, lesson, course, context, specs, premium=premium)
+
+        for (i, _d, _n), outcome in zip(chunk, outcomes):
+            if isinstance(outcome, HTTPException):
+                fail(i, outcome.status_code, outcome.detail)
+            else:
+                generated[i] = outcome
+
+    tasks = []
+    for lesson_id, entries in groups.items():
+        lesson, course = by_lesson[lesson_id]
+        for chunk in _pack(entries, PACK_MAX_QUESTIONS):
+            tasks.append(run_chunk(lesson, course, chunk))
+    await asyncio.gather(*tasks)
+
+    saved = await asyncio.to_thread(_save_batch, db, items, generated)
+    for i, result in saved.items():
+        results[i] = result
+
+    return {
+        "results": results,
+        "succeeded": len(saved),
+        "failed": len(items) - len(saved),
+    }
+
+
 # =========================================================
 # Manual Create Quiz 
 # =========================================================
@@ -319,20 +599,9 @@ def create_manual_quiz(
     lesson_id: int,
     data: ManualQuizCreateReq,
     db: Session = Depends(get_db),
-    user=Depends(require_role("teacher"))
+    user=Depends(require_role("teacher")),
+    access: Access = Depends(lesson_owner),
 ):
-    lesson = db.query(Lesson).filter(Lesson.id == lesson_id).first()
-    if not lesson:
-        raise HTTPException(status_code=404, detail="Lesson not found")
-
-    course = db.query(Course).filter(Course.id == lesson.course_id).first()
-    if not course:
-        raise HTTPException(status_code=404, detail="Course not found")
-
-    # Teacher must own the course
-    if course.teacher_email != user["email"]:
-        raise HTTPException(status_code=403, detail="Not your course")
-
     if not data.questions or len(data.questions) == 0:
         raise HTTPException(status_code=400, detail="Add at least 1 question.")
 
@@ -359,14 +628,7 @@ def create_manual_quiz(
             }
         )
 
-    quiz = Quiz(
-        lesson_id=lesson_id,
-        difficulty=data.difficulty,
-        questions_json=json.dumps(cleaned)
-    )
-    db.add(quiz)
-    db.commit()
-    db.refresh(quiz)
+    quiz = save_quiz(db, lesson_id, data.difficulty, cleaned)
 
     return {
         "quiz_id": quiz.id,
@@ -379,92 +641,55 @@ def create_manual_quiz(
 # =========================================================
 # List quizzes for a lesson
 # =========================================================
+QUIZ_FIELDS = {
+    "quiz_id": Quiz.id,
+    "difficulty": Quiz.difficulty,
+    "created_at": Quiz.created_at,
+    "question_count": Quiz.question_count,
+}
+
+
 @router.get("/lesson/{lesson_id}")
 def list_quizzes_for_lesson(
     lesson_id: int,
+    difficulty: Optional[str] = None,
+    page: PageParams = Depends(page_params(default_limit=100)),
     db: Session = Depends(get_db),
-    user=Depends(get_current_user)
+    # owner teacher OR enrolled student
+    access: Access = Depends(lesson_member),
 ):
-    lesson = db.query(Lesson).filter(Lesson.id == lesson_id).first()
-    if not lesson:
-        raise HTTPException(status_code=404, detail="Lesson not found")
-
-    course = db.query(Course).filter(Course.id == lesson.course_id).first()
-    if not course:
-        raise HTTPException(status_code=404, detail="Course not found")
-
-    # Access: owner teacher OR enrolled student
-    if user["role"] == "teacher":
-        if course.teacher_email != user["email"]:
-            raise HTTPException(status_code=403, detail="Not your course")
-    elif user["role"] == "student":
-        enrolled = db.query(Enrollment).filter(
-            Enrollment.course_id == course.id,
-            Enrollment.student_email == user["email"]
-        ).first()
-        if not enrolled:
-            raise HTTPException(status_code=403, detail="You are not enrolled in this course")
-    else:
-        raise HTTPException(status_code=403, detail="Forbidden")
-
-    quizzes = db.query(Quiz).filter(Quiz.lesson_id == lesson_id).all()
+    names = select_fields(page.fields, QUIZ_FIELDS)
+    query = db.query(*[QUIZ_FIELDS[n].label(n) for n in names]).filter(Quiz.lesson_id == lesson_id)
+    query = apply_filters(query, {Quiz.difficulty: difficulty})
+    # ids follow creation order; created_at is nullable, so it is no keyset key
+    rows, next_cursor = keyset_page(query, [(Quiz.id, "asc")], page)
 
     out = []
-    for q in quizzes:
-        try:
-            count = len(json.loads(q.questions_json or "[]"))
-        except Exception:
-            count = 0
-        out.append(
-            {
-                "quiz_id": q.id,
-                "difficulty": q.difficulty,
-                "created_at": str(q.created_at),
-                "question_count": count,
-            }
-        )
+    for r in rows:
+        item = project(r, names)
+        if "created_at" in item:
+            item["created_at"] = str(item["created_at"])
+        if "question_count" in item:
+            item["question_count"] = item["question_count"] or 0
+        out.append(item)
 
-    return {"lesson_id": lesson_id, "quizzes": out}
+    return {"lesson_id": lesson_id, "quizzes": out, "next_cursor": next_cursor}
 
 
 @router.get("/{quiz_id}")
 def get_quiz(
     quiz_id: int,
     db: Session = Depends(get_db),
-    user=Depends(get_current_user)
+    # owner teacher OR enrolled student
+    access: Access = Depends(quiz_member),
 ):
-    quiz = db.query(Quiz).filter(Quiz.id == quiz_id).first()
-    if not quiz:
-        raise HTTPException(status_code=404, detail="Quiz not found")
-
-    lesson = db.query(Lesson).filter(Lesson.id == quiz.lesson_id).first()
-    if not lesson:
-        raise HTTPException(status_code=404, detail="Lesson not found")
-
-    course = db.query(Course).filter(Course.id == lesson.course_id).first()
-    if not course:
-        raise HTTPException(status_code=404, detail="Course not found")
-
-    # Access:
-    # - owner teacher OR enrolled student
-    if user["role"] == "teacher":
-        if course.teacher_email != user["email"]:
-            raise HTTPException(status_code=403, detail="Not your course")
-    elif user["role"] == "student":
-        enrolled = db.query(Enrollment).filter(
-            Enrollment.course_id == course.id,
-            Enrollment.student_email == user["email"]
-        ).first()
-        if not enrolled:
-            raise HTTPException(status_code=403, detail="You are not enrolled in this course")
-    else:
-        raise HTTPException(status_code=403, detail="Forbidden")
+    difficulty = db.query(Quiz.difficulty).filter(Quiz.id == quiz_id).scalar()
 
     return {
-        "quiz_id": quiz.id,
-        "lesson_id": quiz.lesson_id,
-        "difficulty": quiz.difficulty,
-        "questions": json.loads(quiz.questions_json)
+        "quiz_id": quiz_id,
+        "lesson_id": access.lesson_id,
+        "difficulty": difficulty,
+        "questions": load_questions(db, quiz_id)
     }
 
 
@@ -475,26 +700,12 @@ def get_quiz(
 def delete_quiz(
     quiz_id: int,
     db: Session = Depends(get_db),
-    user=Depends(require_role("teacher"))
+    user=Depends(require_role("teacher")),
+    access: Access = Depends(quiz_owner),
 ):
-    quiz = db.query(Quiz).filter(Quiz.id == quiz_id).first()
-    if not quiz:
-        raise HTTPException(status_code=404, detail="Quiz not found")
-
-    lesson = db.query(Lesson).filter(Lesson.id == quiz.lesson_id).first()
-    if not lesson:
-        raise HTTPException(status_code=404, detail="Lesson not found")
-
-    course = db.query(Course).filter(Course.id == lesson.course_id).first()
-    if not course:
-        raise HTTPException(status_code=404, detail="Course not found")
-
-    if course.teacher_email != user["email"]:
-        raise HTTPException(status_code=403, detail="Not your course")
-
-    # remove attempts first to avoid FK issues
-    db.execute(sql_text("DELETE FROM quiz_attempts WHERE quiz_id = :qid"), {"qid": quiz_id})
-
-    db.delete(quiz)
+    # removes attempts and question rows first to avoid FK issues
+    delete_quizzes(db, [quiz_id])
     db.commit()
+    grading_cache.invalidate_quiz(quiz_id)
+    access_cache.invalidate_quiz(quiz_id)
     return {"message": "Quiz deleted", "quiz_id": quiz_id}
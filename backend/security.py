@@ -0,0 +1,223 @@
+# security.py
+# Access tokens and the caller's user profile, shared by every router.
+#
+# Verifying an HS256 JWT on every request and then loading the User row just to
+# read the plan adds up on the chat hot path. Verified tokens are kept in an LRU
+# until their own `exp`; profiles (role/plan/premium_until) in a short-TTL LRU
+# that upgrade/downgrade, the Stripe webhook and admin changes invalidate. The
+# TTL bounds staleness across workers, which don't share invalidations.
+# Access tokens issued at login carry a "sid" (see auth_sessions.py); a signed-out
+# or revoked session is refused even while its access token is unexpired.
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, Request
+from jose import JWTError, jwt
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import AuthSession, User
+
+load_dotenv(Path(__file__).resolve().parent / ".env")
+
+SECRET_KEY = os.getenv("SECRET_KEY", "CHANGE_ME_LATER")
+ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
+
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+SESSION_CACHE_MAX_ENTRIES = int(os.getenv("SESSION_CACHE_MAX_ENTRIES", "10000"))
+# how long another worker's sign-out can go unnoticed here
+SESSION_CHECK_TTL_SECONDS = int(os.getenv("SESSION_CHECK_TTL_SECONDS", "30"))
+
+
+class ExpiringLRU:
+    """Thread-safe LRU whose entries each carry their own expiry (epoch seconds)."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max(1, max_entries)
+        self._items = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and item[1] > time.time():
+                self._items.move_to_end(key)
+                self.hits += 1
+                return item[0]
+            if item is not None:
+                del self._items[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value, expires_at: float):
+        with self._lock:
+            self._items[key] = (value, expires_at)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            if self._items.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._items),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+token_cache = ExpiringLRU(TOKEN_CACHE_MAX_ENTRIES)
+user_cache = ExpiringLRU(USER_CACHE_MAX_ENTRIES)
+session_cache = ExpiringLRU(SESSION_CACHE_MAX_ENTRIES)  # sid -> "active" | "revoked"
+
+
+# =========================================================
+# Tokens
+# =========================================================
+def create_access_token(email: str, role: str, sid: Optional[str] = None) -> str:
+    # JWT stores email (sub), role and the session id, with expiry
+    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    payload = {"sub": email, "role": role, "exp": expire}
+    if sid:
+        payload["sid"] = sid
+    return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def bearer_token(request: Request) -> str:
+    # Reads token from Authorization: Bearer <token>
+    auth_header = request.headers.get("Authorization") or request.headers.get("authorization")
+    if not auth_header or not auth_header.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Missing Bearer token")
+    return auth_header.split(" ", 1)[1].strip()
+
+
+def decode_token(token: str) -> dict:
+    """Verified claims; a cached token is trusted until its exp, never after."""
+    claims = token_cache.get(token)
+    if claims is not None:
+        return claims
+
+    try:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    exp = claims.get("exp")
+    if isinstance(exp, (int, float)):
+        token_cache.put(token, claims, float(exp))
+    return claims
+
+
+def get_current_user(request: Request) -> dict:
+    claims = decode_token(bearer_token(request))
+
+    email = claims.get("sub")
+    role = claims.get("role")
+    if not email or not role:
+        raise HTTPException(status_code=401, detail="Invalid token payload")
+
+    sid = claims.get("sid")
+    if sid and session_revoked(sid):
+        raise HTTPException(status_code=401, detail="Session ended. Please sign in again.")
+
+    return {"email": email, "role": role, "sid": sid}
+
+
+# =========================================================
+# Session revocation
+# =========================================================
+def session_revoked(sid: str) -> bool:
+    state = session_cache.get(sid)
+    if state is None:
+        # primary, not the replica: a session created a moment ago must be found
+        db = SessionLocal()
+        try:
+            revoked_at = db.query(AuthSession.revoked_at).filter(AuthSession.id == sid).first()
+        finally:
+            db.close()
+        # a pruned (unknown) session counts as revoked
+        state = "revoked" if revoked_at is None or revoked_at[0] is not None else "active"
+        session_cache.put(sid, state, time.time() + SESSION_CHECK_TTL_SECONDS)
+    return state == "revoked"
+
+
+def mark_sessions_revoked(sids):
+    """Call after committing a revocation so this worker refuses the sessions immediately."""
+    # remembered for as long as any access token of theirs can still be valid
+    expires_at = time.time() + ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    for sid in sids:
+        session_cache.put(sid, "revoked", expires_at)
+
+
+# =========================================================
+# User profiles
+# =========================================================
+class UserProfile(NamedTuple):
+    id: int
+    email: str
+    role: str
+    plan: str
+    premium_until: Optional[datetime]
+
+
+def is_premium(user) -> bool:
+    """Premium if plan == premium and premium_until (UTC) hasn't passed. Works on User or UserProfile."""
+    if not user:
+        return False
+    if getattr(user, "plan", "free") != "premium":
+        return False
+    premium_until = getattr(user, "premium_until", None)
+    if premium_until is None:
+        return True
+    return premium_until > datetime.utcnow()
+
+
+def get_profile(db: Session, email: str) -> Optional[UserProfile]:
+    profile = user_cache.get(email)
+    if profile is not None:
+        return profile
+
+    row = (
+        db.query(User.id, User.email, User.role, User.plan, User.premium_until)
+        .filter(User.email == email)
+        .first()
+    )
+    if not row:
+        return None
+
+    profile = UserProfile(row.id, row.email, row.role, row.plan or "free", row.premium_until)
+    user_cache.put(email, profile, time.time() + USER_CACHE_TTL_SECONDS)
+    return profile
+
+
+def require_profile(db: Session, email: str) -> UserProfile:
+    profile = get_profile(db, email)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return profile
+
+
+def invalidate_user(email: str):
+    """Call after committing a change to the user's role, plan or premium_until (or deleting them)."""
+    user_cache.invalidate(email)
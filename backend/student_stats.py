@@ -0,0 +1,186 @@
+# student_stats.py
+# Rollups behind the student dashboard (student_stats + student_weekly).
+# submit_attempt folds each new attempt in with record_attempt(), so the
+# dashboard reads one row (stats) or one row per week (chart) instead of every
+# attempt the student ever made.
+#
+#   python student_stats.py rebuild              recompute all students from quiz_attempts
+#   python student_stats.py rebuild a@x.com ...  recompute only these students
+import argparse
+import sys
+from datetime import date, datetime, timedelta
+from typing import Iterable, Optional
+
+from sqlalchemy import case
+from sqlalchemy.orm import Session
+
+from database import insert_ignore
+from models import QuizAttempt, StudentStats, StudentWeekly
+
+REBUILD_BATCH_STUDENTS = 200
+
+
+def week_start(d: datetime) -> date:
+    return d.date() - timedelta(days=d.date().weekday())
+
+
+def record_attempt(db: Session, student_email: str, score: float, submitted_at: datetime):
+    """Folds one attempt into the rollups (caller commits, same transaction as the attempt)."""
+    score = float(score or 0.0)
+
+    # counters as atomic UPDATEs so concurrent submissions can't lose increments
+    insert_ignore(db, StudentStats, {
+        "student_email": student_email, "attempt_count": 0, "score_sum": 0.0, "streak_days": 0,
+    })
+    db.query(StudentStats).filter(StudentStats.student_email == student_email).update({
+        StudentStats.attempt_count: StudentStats.attempt_count + 1,
+        StudentStats.score_sum: StudentStats.score_sum + score,
+        StudentStats.min_score: case(
+            (StudentStats.min_score.is_(None) | (StudentStats.min_score > score), score),
+            else_=StudentStats.min_score,
+        ),
+        StudentStats.max_score: case(
+            (StudentStats.max_score.is_(None) | (StudentStats.max_score < score), score),
+            else_=StudentStats.max_score,
+        ),
+    }, synchronize_session=False)
+
+    # the row is now write-locked by this transaction, so the streak read is stable
+    last_dt, streak = (
+        db.query(StudentStats.last_attempt_at, StudentStats.streak_days)
+        .filter(StudentStats.student_email == student_email)
+        .one()
+    )
+    if last_dt is None:
+        last_dt, streak = submitted_at, 1
+    elif submitted_at >= last_dt:
+        gap = (submitted_at.date() - last_dt.date()).days
+        if gap == 1:
+            streak = (streak or 0) + 1
+        elif gap > 1:
+            streak = 1
+        last_dt = submitted_at
+    # an older timestamp (clock skew) doesn't move the streak
+
+    db.query(StudentStats).filter(StudentStats.student_email == student_email).update({
+        StudentStats.last_attempt_at: last_dt,
+        StudentStats.streak_days: streak,
+    }, synchronize_session=False)
+
+    ws = week_start(submitted_at)
+    insert_ignore(db, StudentWeekly, {
+        "student_email": student_email, "week_start": ws, "attempt_count": 0, "score_sum": 0.0,
+    })
+    db.query(StudentWeekly).filter(
+        StudentWeekly.student_email == student_email,
+        StudentWeekly.week_start == ws,
+    ).update({
+        StudentWeekly.attempt_count: StudentWeekly.attempt_count + 1,
+        StudentWeekly.score_sum: StudentWeekly.score_sum + score,
+    }, synchronize_session=False)
+
+
+def forget_students(db: Session, emails: Iterable[str]):
+    emails = list(emails)
+    if not emails:
+        return
+    db.query(StudentStats).filter(StudentStats.student_email.in_(emails)).delete(synchronize_session=False)
+    db.query(StudentWeekly).filter(StudentWeekly.student_email.in_(emails)).delete(synchronize_session=False)
+
+
+def rebuild(db: Session, emails: Iterable[str]):
+    """Recomputes the rollups of the given students from quiz_attempts (caller commits)."""
+    emails = list(dict.fromkeys(emails))
+    forget_students(db, emails)
+
+    for email in emails:
+        rows = (
+            db.query(QuizAttempt.score, QuizAttempt.submitted_at)
+            .filter(QuizAttempt.student_email == email)
+            .order_by(QuizAttempt.submitted_at.asc())
+            .yield_per(1000)
+        )
+
+        count, total = 0, 0.0
+        lo: Optional[float] = None
+        hi: Optional[float] = None
+        last_dt: Optional[datetime] = None
+        streak = 0
+        weeks = {}
+
+        for score, submitted_at in rows:
+            score = float(score or 0.0)
+            count += 1
+            total += score
+            lo = score if lo is None else min(lo, score)
+            hi = score if hi is None else max(hi, score)
+            if not submitted_at:
+                continue
+
+            if last_dt is None:
+                streak = 1
+            else:
+                gap = (submitted_at.date() - last_dt.date()).days
+                if gap == 1:
+                    streak += 1
+                elif gap > 1:
+                    streak = 1
+            last_dt = submitted_at
+
+            w = weeks.setdefault(week_start(submitted_at), [0, 0.0])
+            w[0] += 1
+            w[1] += score
+
+        if not count:
+            continue
+
+        db.add(StudentStats(
+            student_email=email,
+            attempt_count=count,
+            score_sum=total,
+            min_score=lo,
+            max_score=hi,
+            last_attempt_at=last_dt,
+            streak_days=streak,
+        ))
+        db.add_all([
+            StudentWeekly(student_email=email, week_start=ws, attempt_count=n, score_sum=s)
+            for ws, (n, s) in weeks.items()
+        ])
+
+
+def rebuild_all(session_factory, batch_size: int = REBUILD_BATCH_STUDENTS, emails: Optional[list] = None) -> int:
+    """Rebuilds students in batches, one short transaction per batch."""
+    db = session_factory()
+    try:
+        if emails is None:
+            emails = [e for (e,) in db.query(QuizAttempt.student_email).distinct().order_by(QuizAttempt.student_email)]
+    finally:
+        db.close()
+
+    for i in range(0, len(emails), batch_size):
+        db = session_factory()
+        try:
+            rebuild(db, emails[i:i + batch_size])
+            db.commit()
+        finally:
+            db.close()
+        print("rebuilt", min(i + batch_size, len(emails)), "/", len(emails), "students")
+    return len(emails)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Maintain student dashboard rollups.")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("emails", nargs="*", help="only these students (default: everyone with attempts)")
+    parser.add_argument("--batch-size", type=int, default=REBUILD_BATCH_STUDENTS)
+    args = parser.parse_args(argv)
+
+    from database import SessionLocal
+
+    rebuild_all(SessionLocal, batch_size=args.batch_size, emails=args.emails or None)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
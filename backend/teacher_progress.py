@@ -1,9 +1,12 @@
 from datetime import datetime, timedelta
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
+from authz import course_access, require_owner
 from deps import get_db, get_current_user
-from models import Course, Enrollment, Lesson, Quiz, QuizAttempt, TopicMastery
+from pagination import PageParams, keyset_page, offset_page, page_params, project, select_fields
+from models import CourseProgress, Lesson, Quiz, QuizAttempt, TopicMastery
 
 router = APIRouter(prefix="/teacher", tags=["teacher-progress"])
 
@@ -14,64 +17,78 @@ def _require_teacher(user):
 
 
 def _require_course_owner(db: Session, course_id: int, teacher_email: str):
-    course = db.query(Course).filter(Course.id == course_id).first()
-    if not course:
-        raise HTTPException(status_code=404, detail="Course not found")
-    if course.teacher_email != teacher_email:
-        raise HTTPException(status_code=403, detail="Not your course")
-    return course
+    return require_owner(course_access(db, teacher_email, course_id))
 
 
-@router.get("/course/{course_id}/students-progress")
-def students_progress(course_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    _require_teacher(user)
-    _require_course_owner(db, course_id, user["email"])
+def _require_enrolled(db: Session, course_id: int, student_email: str):
+    if not course_access(db, student_email, course_id).enrolled:
+        raise HTTPException(status_code=404, detail="Student not enrolled in this course")
 
-    enrolls = db.query(Enrollment).filter(Enrollment.course_id == course_id).all()
-    student_emails = [e.student_email for e in enrolls]
 
-    if not student_emails:
-        return {"students": []}
+PROGRESS_SORTS = {
+    "avg_score": CourseProgress.avg_score,
+    "quizzes_done": CourseProgress.attempt_count,
+    "last_attempt_at": CourseProgress.last_attempt_at,
+    "student_email": CourseProgress.student_email,
+}
+PROGRESS_FIELDS = {
+    "student_email": CourseProgress.student_email,
+    "quizzes_done": CourseProgress.attempt_count,
+    "avg_score": CourseProgress.avg_score,
+    "last_attempt_at": CourseProgress.last_attempt_at,
+}
+PROGRESS_MAX_LIMIT = 500
 
-    attempts = (
-        db.query(QuizAttempt.student_email, QuizAttempt.score, QuizAttempt.submitted_at)
-        .join(Quiz, QuizAttempt.quiz_id == Quiz.id)
-        .join(Lesson, Quiz.lesson_id == Lesson.id)
-        .filter(Lesson.course_id == course_id)
-        .filter(QuizAttempt.student_email.in_(student_emails))
-        .all()
-    )
 
-    agg = {}
-    for email in student_emails:
-        agg[email] = {
-            "student_email": email,
-            "quizzes_done": 0,
-            "avg_score": 0.0,
-            "last_attempt_at": None,
-        }
+@router.get("/course/{course_id}/students-progress")
+def students_progress(
+    course_id: int,
+    sort: str = "avg_score",
+    order: str = "desc",
+    offset: int = 0,
+    page: PageParams = Depends(page_params(default_limit=100, max_limit=PROGRESS_MAX_LIMIT)),
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    _require_teacher(user)
+    _require_course_owner(db, course_id, user["email"])
 
-    sums = {email: 0.0 for email in student_emails}
+    if sort not in PROGRESS_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(PROGRESS_SORTS)}")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be asc or desc")
 
-    for email, score, submitted_at in attempts:
-        row = agg[email]
-        row["quizzes_done"] += 1
-        sums[email] += float(score or 0.0)
+    # pre-aggregated per-student rows (see course_progress.py)
+    names = select_fields(page.fields, PROGRESS_FIELDS)
+    query = (
+        db.query(*[PROGRESS_FIELDS[n].label(n) for n in names])
+        .filter(CourseProgress.course_id == course_id)
+    )
 
-        if submitted_at:
-            if row["last_attempt_at"] is None or submitted_at > row["last_attempt_at"]:
-                row["last_attempt_at"] = submitted_at
+    col = PROGRESS_SORTS[sort]
+    if sort == "last_attempt_at" or offset:
+        # nullable sort key (or legacy ?offset=): page by position
+        primary = col.desc().nulls_last() if order == "desc" else col.asc().nulls_last()
+        query = query.order_by(primary, CourseProgress.student_email.asc())
+        rows, next_cursor = offset_page(query, page, start=max(0, offset))
+    else:
+        keys = [(col, order)]
+        if sort != "student_email":
+            keys.append((CourseProgress.student_email, "asc"))
+        rows, next_cursor = keyset_page(query, keys, page)
 
-    for email in student_emails:
-        n = agg[email]["quizzes_done"]
-        agg[email]["avg_score"] = round((sums[email] / n), 2) if n else 0.0
-        if agg[email]["last_attempt_at"]:
-            agg[email]["last_attempt_at"] = agg[email]["last_attempt_at"].isoformat()
+    total = db.query(func.count(CourseProgress.id)).filter(CourseProgress.course_id == course_id).scalar()
 
-    students = list(agg.values())
-    students.sort(key=lambda x: (-x["avg_score"], x["student_email"]))
+    students = []
+    for r in rows:
+        item = project(r, names)
+        if "avg_score" in item:
+            item["avg_score"] = round(item["avg_score"] or 0.0, 2)
+        if item.get("last_attempt_at"):
+            item["last_attempt_at"] = item["last_attempt_at"].isoformat()
+        students.append(item)
 
-    return {"students": students}
+    return {"students": students, "total": total, "limit": page.limit, "offset": offset, "next_cursor": next_cursor}
 
 
 @router.get("/course/{course_id}/student/{student_email}/weekly-progress")
@@ -84,14 +101,7 @@ def weekly_progress(
 ):
     _require_teacher(user)
     _require_course_owner(db, course_id, user["email"])
-
-    enrolled = (
-        db.query(Enrollment)
-        .filter(Enrollment.course_id == course_id, Enrollment.student_email == student_email)
-        .first()
-    )
-    if not enrolled:
-        raise HTTPException(status_code=404, detail="Student not enrolled in this course")
+    _require_enrolled(db, course_id, student_email)
 
     end_dt = datetime.utcnow()
     start_dt = end_dt - timedelta(days=7 * weeks)
@@ -149,14 +159,7 @@ def weekly_progress(
 def weak_topics(course_id: int, student_email: str, db: Session = Depends(get_db), user=Depends(get_current_user)):
     _require_teacher(user)
     _require_course_owner(db, course_id, user["email"])
-
-    enrolled = (
-        db.query(Enrollment)
-        .filter(Enrollment.course_id == course_id, Enrollment.student_email == student_email)
-        .first()
-    )
-    if not enrolled:
-        raise HTTPException(status_code=404, detail="Student not enrolled in this course")
+    _require_enrolled(db, course_id, student_email)
 
     rows = (
         db.query(TopicMastery)
@@ -0,0 +1,101 @@
+# conftest.py
+# Runs the backend against a throwaway SQLite file and the fake LLM provider.
+#
+#   cd backend && python -m pytest
+#
+# EDUMATE_TEST_DATABASE_URL points the run at another (empty) database instead,
+# e.g. postgresql+psycopg2://localhost/edumate_test; test_backends.py does this
+# against a throwaway PostgreSQL cluster when one can be started.
+#
+# The app modules read their settings at import time, so the environment is set
+# up here, before any test module imports them.
+import contextlib
+import io
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+BACKEND = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND))
+
+TMP = tempfile.mkdtemp(prefix="edumate-tests-")
+os.environ["DATABASE_URL"] = os.getenv("EDUMATE_TEST_DATABASE_URL") or f"sqlite:///{TMP}/app.db"
+os.environ["LLM_PROVIDER"] = "fake"
+os.environ["LLM_FAKE_LATENCY"] = "fixed:0"
+os.environ["LLM_FAKE_TOKENS_PER_SECOND"] = "0"
+os.environ["AI_SEMANTIC_EMBEDDER"] = "hash"
+os.environ.pop("AI_CACHE_DB", None)
+
+
+@pytest.fixture(scope="session")
+def app_db():
+    """The app's own database (SessionLocal), migrated once per run."""
+    import migrate
+    from database import SessionLocal
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        migrate.upgrade()
+    return SessionLocal
+
+
+@pytest.fixture
+def db(app_db):
+    session = app_db()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture(scope="session")
+def client(app_db):
+    from fastapi.testclient import TestClient
+
+    import main
+
+    return TestClient(main.app)
+
+
+@pytest.fixture(scope="session")
+def sign_in(client):
+    """sign_in(email, role) -> the /auth/login response body, registering the user first."""
+    def _sign_in(email: str, role: str = "student", password: str = "pw12345") -> dict:
+        client.post("/auth/register", json={"email": email, "password": password, "role": role})
+        r = client.post("/auth/login", json={"email": email, "password": password})
+        assert r.status_code == 200, r.text
+        return r.json()
+
+    return _sign_in
+
+
+def bearer(body: dict) -> dict:
+    return {"Authorization": "Bearer " + body["access_token"]}
+
+
+@pytest.fixture
+def sql_on_loop(app_db):
+    """Statements executed on a thread that is running an event loop (i.e. blocking it)."""
+    import asyncio
+
+    from sqlalchemy import event
+
+    import database
+
+    seen = []
+
+    def before_execute(conn, cursor, statement, *args):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        seen.append(statement)
+
+    engines = {database.engine, database.read_engine}
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", before_execute)
+    yield seen
+    for engine in engines:
+        event.remove(engine, "before_cursor_execute", before_execute)
@@ -0,0 +1,52 @@
+# The AI handlers are async; every query and commit they make must run on a
+# worker thread, never on the event loop.
+import pytest
+
+from conftest import bearer
+
+
+@pytest.fixture(scope="module")
+def lesson(client, sign_in):
+    teacher = bearer(sign_in("teacher@async.test", "teacher"))
+    course = client.post("/courses", json={"title": "Async", "subject": "CS"}, headers=teacher).json()
+    lesson = client.post(
+        "/lessons",
+        json={"course_id": course["id"], "title": "Loops", "topic": "loops", "content_text": "for and while loops"},
+        headers=teacher,
+    ).json()
+    return {"teacher": teacher, "course_id": course["id"], "lesson_id": lesson["id"]}
+
+
+def test_chat_keeps_db_off_the_loop(client, sign_in, sql_on_loop):
+    student = bearer(sign_in("chat@async.test"))
+    r = client.post("/ai/chat", json={"message": "what is a loop", "no_cache": True}, headers=student)
+    assert r.status_code == 200, r.text
+    r = client.post("/ai/chat/stream", json={"message": "what is a loop"}, headers=student)
+    assert r.status_code == 200 and "event: done" in r.text
+    assert sql_on_loop == []
+
+
+def test_chat_file_keeps_db_off_the_loop(client, sign_in, sql_on_loop):
+    student = bearer(sign_in("file@async.test"))
+    r = client.post(
+        "/ai/chat-file",
+        data={"message": "summarize"},
+        files={"file": ("notes.txt", b"loops repeat work", "text/plain")},
+        headers=student,
+    )
+    assert r.status_code == 200, r.text
+    assert sql_on_loop == []
+
+
+def test_quiz_generation_keeps_db_off_the_loop(client, lesson, sql_on_loop):
+    r = client.post(f"/quizzes/generate/{lesson['lesson_id']}", json={"num_questions": 3}, headers=lesson["teacher"])
+    assert r.status_code == 200, r.text
+    assert len(r.json()["questions"]) == 3
+
+    items = [{"lesson_id": lesson["lesson_id"], "difficulty": d, "num_questions": 2} for d in ("easy", "hard")]
+    r = client.post("/quizzes/generate-batch", json={"items": items}, headers=lesson["teacher"])
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert body["succeeded"] == 2
+    assert all(res["quiz_id"] for res in body["results"])
+    assert sql_on_loop == []
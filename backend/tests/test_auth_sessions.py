@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+import auth_sessions
+from conftest import bearer
+
+
+def test_refresh_rotates_and_old_token_cannot_be_reused(client, sign_in):
+    body = sign_in("rotate@auth.test")
+    first = body["refresh_token"]
+
+    r = client.post("/auth/refresh", json={"refresh_token": first})
+    assert r.status_code == 200
+    second = r.json()["refresh_token"]
+    assert second != first
+    assert client.get("/auth/me", headers=bearer(r.json())).status_code == 200
+
+    # replay inside the grace window: refused, session kept
+    r = client.post("/auth/refresh", json={"refresh_token": first})
+    assert r.status_code == 401
+    assert client.post("/auth/refresh", json={"refresh_token": second}).status_code == 200
+
+
+def test_replayed_token_revokes_session(client, sign_in, monkeypatch):
+    monkeypatch.setattr(auth_sessions, "REFRESH_REUSE_GRACE_SECONDS", -1)
+    body = sign_in("replay@auth.test")
+    first = body["refresh_token"]
+    rotated = client.post("/auth/refresh", json={"refresh_token": first}).json()
+
+    r = client.post("/auth/refresh", json={"refresh_token": first})
+    assert r.status_code == 401
+    assert "reuse" in r.json()["detail"]
+    # the whole session is gone: the newer refresh token and access tokens too
+    assert client.post("/auth/refresh", json={"refresh_token": rotated["refresh_token"]}).status_code == 401
+    assert client.get("/auth/me", headers=bearer(rotated)).status_code == 401
+
+
+def test_logout_ends_session(client, sign_in):
+    body = sign_in("logout@auth.test")
+    assert client.post("/auth/logout", headers=bearer(body), json={}).status_code == 200
+    assert client.get("/auth/me", headers=bearer(body)).status_code == 401
+    assert client.post("/auth/refresh", json={"refresh_token": body["refresh_token"]}).status_code == 401
+
+
+def test_password_reset_signs_out_everywhere(client, sign_in):
+    email = "reset@auth.test"
+    a = sign_in(email)
+    b = sign_in(email)
+    otp = client.post("/auth/forgot-password", json={"email": email}).json()["otp"]
+    r = client.post("/auth/reset-password", json={"email": email, "otp": otp, "new_password": "pw67890"})
+    assert r.status_code == 200
+    for body in (a, b):
+        assert client.get("/auth/me", headers=bearer(body)).status_code == 401
+    assert client.post("/auth/login", json={"email": email, "password": "pw67890"}).status_code == 200
+
+
+@pytest.mark.parametrize("name", ["start_session", "revoke_user_sessions"])
+def test_session_writes_run_off_the_event_loop(client, sign_in, monkeypatch, name):
+    real = getattr(auth_sessions, name)
+    seen = []
+
+    def spy(*args, **kwargs):
+        try:
+            asyncio.get_running_loop()
+            seen.append("event loop")
+        except RuntimeError:
+            seen.append("worker thread")
+        return real(*args, **kwargs)
+
+    monkeypatch.setattr(auth_sessions, name, spy)
+    email = f"{name}@auth.test"
+    sign_in(email)
+    otp = client.post("/auth/forgot-password", json={"email": email}).json()["otp"]
+    client.post("/auth/reset-password", json={"email": email, "otp": otp, "new_password": "pw67890"})
+    assert seen and set(seen) == {"worker thread"}
@@ -0,0 +1,108 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import event
+
+import database
+from authz import AccessCache, access_cache, course_access, lesson_access
+from conftest import bearer
+
+STUDENT = "student@authz.test"
+
+
+@pytest.fixture(scope="module")
+def course(client, sign_in):
+    teacher = bearer(sign_in("teacher@authz.test", "teacher"))
+    student = bearer(sign_in(STUDENT))
+    course_id = client.post("/courses", json={"title": "Authz", "subject": "Law"}, headers=teacher).json()["id"]
+    client.post(f"/courses/{course_id}/enroll-student", json={"student_email": STUDENT}, headers=teacher)
+    lesson_id = client.post(
+        "/lessons", json={"course_id": course_id, "title": "Torts", "topic": "torts", "content_text": "negligence"},
+        headers=teacher,
+    ).json()["id"]
+    return {"teacher": teacher, "student": student, "id": course_id, "lesson_id": lesson_id}
+
+
+@pytest.fixture
+def access_queries():
+    """Statements that resolve access (they are the only ones joining enrollments)."""
+    seen = []
+
+    def record(conn, cursor, statement, *args):
+        if "JOIN enrollments" in statement:
+            seen.append(statement)
+
+    engines = {database.engine, database.read_engine}
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", record)
+    yield seen
+    for engine in engines:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+def test_lru_ttl_and_invalidation():
+    cache = AccessCache(max_entries=3)
+    cache.put(("course", "a@x", 1), ("t@x", True))
+    cache.put(("lesson", 10), 1)
+    cache.put(("quiz", 100), (10, 1))
+    cache.put(("course", "b@x", 2), ("t@x", False))
+    assert cache.get(("course", "a@x", 1)) is None  # evicted
+
+    cache.invalidate_course(1)
+    assert cache.get(("lesson", 10)) is None and cache.get(("quiz", 100)) is None
+    cache.invalidate_student("b@x")
+    assert cache.stats()["size"] == 0 and cache.stats()["invalidations"] == 3
+
+    expired = AccessCache(ttl_seconds=-1)
+    expired.put(("lesson", 1), 1)
+    assert expired.get(("lesson", 1)) is None
+
+
+def test_one_query_per_session_then_served_from_the_cache(db, course, access_queries):
+    access_cache.invalidate_course(course["id"])
+    first = lesson_access(db, STUDENT, course["lesson_id"])
+    assert course_access(db, STUDENT, course["id"]) == first._replace(lesson_id=None)
+    assert len(access_queries) == 1
+
+    other = database.SessionLocal()
+    try:
+        again = lesson_access(other, STUDENT, course["lesson_id"])
+    finally:
+        other.close()
+    assert again == first
+    assert len(access_queries) == 1
+
+
+def test_repeat_requests_skip_the_access_query(client, course, access_queries):
+    access_cache.invalidate_course(course["id"])
+    for _ in range(3):
+        r = client.get(f"/lessons/course/{course['id']}", headers=course["student"])
+        assert r.status_code == 200
+    assert len(access_queries) == 1
+    assert access_cache.stats()["hits"] >= 2
+
+
+def test_enrollment_changes_apply_immediately(client, course):
+    teacher, course_id = course["teacher"], course["id"]
+    url = f"/lessons/course/{course_id}"
+    assert client.get(url, headers=course["student"]).status_code == 200
+
+    client.delete(f"/courses/{course_id}/students/{STUDENT}", headers=teacher)
+    assert client.get(url, headers=course["student"]).status_code == 403
+
+    client.post(f"/courses/{course_id}/enroll-student", json={"student_email": STUDENT}, headers=teacher)
+    assert client.get(url, headers=course["student"]).status_code == 200
+
+
+def test_deleted_course_is_not_served_from_the_cache(client, db, course):
+    teacher = course["teacher"]
+    course_id = client.post("/courses", json={"title": "Gone", "subject": "Law"}, headers=teacher).json()["id"]
+    assert course_access(db, "teacher@authz.test", course_id).teacher_email == "teacher@authz.test"
+
+    assert client.delete(f"/courses/{course_id}", headers=teacher).status_code == 200
+    fresh = database.SessionLocal()
+    try:
+        with pytest.raises(HTTPException) as e:
+            course_access(fresh, "teacher@authz.test", course_id)
+    finally:
+        fresh.close()
+    assert e.value.status_code == 404
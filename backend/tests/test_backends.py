@@ -0,0 +1,42 @@
+"""Re-runs the suite against PostgreSQL.
+
+Uses EDUMATE_TEST_PG_URL (an empty database) if set, otherwise a throwaway local
+cluster from the optional `pgserver` package; skipped when neither is available.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+TESTS = Path(__file__).resolve().parent
+
+pytestmark = pytest.mark.skipif(
+    bool(os.getenv("EDUMATE_TEST_DATABASE_URL")), reason="already running against a non-default database"
+)
+
+
+@pytest.fixture(scope="module")
+def postgres_url():
+    url = os.getenv("EDUMATE_TEST_PG_URL")
+    if url:
+        yield url
+        return
+    pgserver = pytest.importorskip("pgserver")
+    try:
+        server = pgserver.get_server(tempfile.mkdtemp(prefix="edumate-pg-"), cleanup_mode="stop")
+    except Exception as e:
+        pytest.skip(f"could not start a local PostgreSQL: {e}")
+    yield server.get_uri().replace("postgresql://", "postgresql+psycopg2://", 1)
+    server.cleanup()
+
+
+def test_suite_passes_on_postgres(postgres_url):
+    env = {**os.environ, "EDUMATE_TEST_DATABASE_URL": postgres_url}
+    run = subprocess.run(
+        [sys.executable, "-m", "pytest", "-q", "-p", "no:cacheprovider", str(TESTS)],
+        cwd=TESTS.parent, env=env, capture_output=True, text=True, timeout=600,
+    )
+    assert run.returncode == 0, run.stdout[-4000:] + run.stderr[-2000:]
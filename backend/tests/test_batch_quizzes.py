@@ -0,0 +1,96 @@
+import pytest
+from fastapi import HTTPException
+
+import quizzes
+from ai import llm
+from conftest import bearer
+from models import Quiz
+
+
+@pytest.fixture(scope="module")
+def lessons(client, sign_in):
+    def make(teacher, title):
+        course_id = client.post("/courses", json={"title": title, "subject": "Bio"}, headers=teacher).json()["id"]
+        return [
+            client.post(
+                "/lessons",
+                json={"course_id": course_id, "title": f"{title} {i}", "topic": "cells", "content_text": "cells divide"},
+                headers=teacher,
+            ).json()["id"]
+            for i in range(2)
+        ]
+
+    teacher = bearer(sign_in("teacher@batch.test", "teacher"))
+    other = bearer(sign_in("other@batch.test", "teacher"))
+    return {"teacher": teacher, "mine": make(teacher, "Mine"), "theirs": make(other, "Theirs")}
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Prompts sent to llm.generate; set `reply` to override the fake provider."""
+    seen = []
+    real = llm.generate
+
+    async def spy(model_name, contents, **kwargs):
+        text = contents if isinstance(contents, str) else "\n".join(p for p in contents if isinstance(p, str))
+        seen.append(text)
+        override = spy.reply(text) if spy.reply else None
+        if isinstance(override, Exception):
+            raise override
+        return override if override is not None else await real(model_name, contents, **kwargs)
+
+    spy.reply = None
+    monkeypatch.setattr(llm, "generate", spy)
+    return spy, seen
+
+
+def test_pack_groups_by_question_budget():
+    entries = [(0, "easy", 8), (1, "hard", 8), (2, "easy", 5), (3, "medium", 20), (4, "easy", 1)]
+    assert quizzes._pack(entries, 20) == [[entries[0], entries[1]], [entries[2]], [entries[3]], [entries[4]]]
+
+
+def test_batch_packs_per_lesson_and_reports_each_item(client, lessons, calls, db):
+    _spy, seen = calls
+    a, b = lessons["mine"]
+    items = [
+        {"lesson_id": a, "difficulty": "easy", "num_questions": 3},
+        {"lesson_id": a, "difficulty": "hard", "num_questions": 4},
+        {"lesson_id": b, "difficulty": "medium", "num_questions": 2},
+        {"lesson_id": lessons["theirs"][0]},
+        {"lesson_id": 987654},
+        {"lesson_id": b, "num_questions": 15},
+    ]
+    body = client.post("/quizzes/generate-batch", json={"items": items}, headers=lessons["teacher"]).json()
+
+    assert (body["succeeded"], body["failed"]) == (3, 3)
+    results = body["results"]
+    assert [r.get("error", {}).get("status_code") for r in results] == [None, None, None, 403, 404, 403]
+    assert [r.get("question_count") for r in results[:3]] == [3, 4, 2]
+    assert len(seen) == 2  # one packed prompt for lesson a, one for lesson b
+
+    for r in results[:3]:
+        quiz = db.query(Quiz).filter(Quiz.id == r["quiz_id"]).one()
+        assert (quiz.lesson_id, quiz.difficulty) == (r["lesson_id"], r["difficulty"])
+
+
+def test_unparseable_packed_answer_falls_back_to_one_call_per_set(client, lessons, calls):
+    spy, seen = calls
+    spy.reply = lambda text: "sorry, no JSON today" if '"set_1"' in text else None
+    a = lessons["mine"][0]
+    items = [{"lesson_id": a, "difficulty": d, "num_questions": 2} for d in ("easy", "medium")]
+    body = client.post("/quizzes/generate-batch", json={"items": items}, headers=lessons["teacher"]).json()
+
+    assert body["succeeded"] == 2
+    assert len(seen) == 3
+
+
+def test_unavailable_model_fails_the_chunk_without_retrying_each_set(client, lessons, calls):
+    spy, seen = calls
+    spy.reply = lambda text: HTTPException(status_code=503, detail="AI service is busy")
+    a = lessons["mine"][0]
+    items = [{"lesson_id": a, "difficulty": d, "num_questions": 2} for d in ("easy", "hard")]
+    body = client.post("/quizzes/generate-batch", json={"items": items}, headers=lessons["teacher"]).json()
+
+    assert body["failed"] == 2
+    assert {r["error"]["status_code"] for r in body["results"]} == {503}
+    assert len(seen) == 1
@@ -0,0 +1,56 @@
+import time
+
+from ai.cache import ResponseCache, make_key, response_cache
+from conftest import bearer
+
+
+def test_key_ignores_case_spacing_and_trailing_punctuation():
+    assert make_key("  Explain   RECURSION? ", "m", 1024) == make_key("explain recursion", "m", 1024)
+    assert make_key("explain recursion", "m", 1024) != make_key("explain recursion", "m", 2048)
+    assert make_key("explain recursion", "m", 1024) != make_key("explain recursion", "other", 1024)
+
+
+def test_memory_tier_is_lru_bounded():
+    cache = ResponseCache(max_entries=2)
+    cache.set("a", "A")
+    cache.set("b", "B")
+    assert cache.get("a") == "A"
+    cache.set("c", "C")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "A" and cache.get("c") == "C"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire():
+    cache = ResponseCache(ttl_seconds=-1)
+    cache.set("a", "A")
+    assert cache.get("a") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    path = str(tmp_path / "cache.db")
+    ResponseCache(db_path=path).set("k", "reply")
+
+    restarted = ResponseCache(db_path=path)
+    assert restarted.get("k") == "reply"
+    assert restarted.get("k") == "reply"
+    stats = restarted.stats()
+    assert stats["hits_disk"] == 1 and stats["hits_memory"] == 1
+
+
+def test_repeated_question_is_served_from_cache(client, sign_in):
+    student = bearer(sign_in("student@cache.test"))
+    message = f"what is a binary heap {time.time()}"
+
+    first = client.post("/ai/chat", json={"message": message}, headers=student).json()
+    again = client.post("/ai/chat", json={"message": message.upper() + "?"}, headers=student).json()
+    assert first["cached"] is False
+    assert again["cached"] is True and again["cache_tier"] == "exact"
+    assert again["reply"] == first["reply"]
+
+    stores = response_cache.stats()["stores"]
+    fresh = client.post("/ai/chat", json={"message": message, "no_cache": True}, headers=student).json()
+    assert fresh["cached"] is False
+    assert response_cache.stats()["stores"] == stores + 1
@@ -0,0 +1,116 @@
+import contextlib
+import io
+
+import pytest
+
+import course_progress
+from conftest import bearer
+from models import CourseProgress
+
+STUDENTS = ["amy@progress.test", "bob@progress.test", "cat@progress.test"]
+QUESTIONS = [{"question": f"Q{i}", "options": ["a", "b", "c", "d"], "answer": "a"} for i in range(2)]
+
+
+@pytest.fixture(scope="module")
+def course(client, sign_in):
+    teacher = bearer(sign_in("teacher@progress.test", "teacher"))
+    students = {email: bearer(sign_in(email)) for email in STUDENTS}
+    course_id = client.post("/courses", json={"title": "Progress", "subject": "Geo"}, headers=teacher).json()["id"]
+    for email in STUDENTS:
+        client.post(f"/courses/{course_id}/enroll-student", json={"student_email": email}, headers=teacher)
+    lesson_id = client.post(
+        "/lessons", json={"course_id": course_id, "title": "Rivers", "topic": "rivers", "content_text": "deltas"},
+        headers=teacher,
+    ).json()["id"]
+
+    def new_quiz():
+        return client.post(f"/quizzes/manual/{lesson_id}", json={"questions": QUESTIONS}, headers=teacher).json()["quiz_id"]
+
+    kept, dropped = new_quiz(), new_quiz()
+    # amy 100 then 0, bob 50, cat never attempts
+    for email, quiz_id, answers in (
+        (STUDENTS[0], kept, ["a", "a"]),
+        (STUDENTS[0], dropped, ["b", "b"]),
+        (STUDENTS[1], kept, ["a", "b"]),
+    ):
+        client.post(f"/attempts/submit/{quiz_id}", json={"answers": answers}, headers=students[email])
+    return {"teacher": teacher, "id": course_id, "dropped": dropped}
+
+
+def _progress(client, course, **params):
+    r = client.get(f"/teacher/course/{course['id']}/students-progress", params=params, headers=course["teacher"])
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def _rows(db, course_id):
+    db.expire_all()
+    return {
+        r.student_email: (r.attempt_count, r.score_sum, r.avg_score, r.last_attempt_at)
+        for r in db.query(CourseProgress).filter(CourseProgress.course_id == course_id)
+    }
+
+
+def test_submissions_fold_into_the_rollup(db, course):
+    rows = _rows(db, course["id"])
+    assert {email: row[:3] for email, row in rows.items()} == {
+        STUDENTS[0]: (2, 100.0, 50.0),
+        STUDENTS[1]: (1, 50.0, 50.0),
+        STUDENTS[2]: (0, 0.0, 0.0),
+    }
+    assert rows[STUDENTS[2]][3] is None
+
+    course_progress.rebuild(db, course["id"])
+    db.commit()
+    assert _rows(db, course["id"]) == rows
+
+
+def test_sorting_and_paging(client, course):
+    def emails(**params):
+        return [s["student_email"] for s in _progress(client, course, **params)["students"]]
+
+    assert emails(sort="quizzes_done") == STUDENTS
+    assert emails(sort="quizzes_done", order="asc") == STUDENTS[::-1]
+    assert emails(sort="avg_score") == STUDENTS  # ties broken by email
+    # students who never attempted go last in either direction
+    assert emails(sort="last_attempt_at")[-1] == STUDENTS[2]
+    assert emails(sort="last_attempt_at", order="asc")[-1] == STUDENTS[2]
+
+    page = _progress(client, course, sort="student_email", order="asc", offset=1, limit=1)
+    assert [s["student_email"] for s in page["students"]] == [STUDENTS[1]]
+    assert page["total"] == 3
+
+    only = _progress(client, course, sort="student_email", fields="student_email,avg_score")["students"]
+    assert all(set(s) == {"student_email", "avg_score"} for s in only)
+
+    for params in ({"sort": "score"}, {"order": "sideways"}):
+        r = client.get(f"/teacher/course/{course['id']}/students-progress", params=params, headers=course["teacher"])
+        assert r.status_code == 400
+
+
+def test_reenrolled_student_keeps_earlier_attempts(client, db, course):
+    teacher, course_id = course["teacher"], course["id"]
+    before = _rows(db, course_id)[STUDENTS[1]]
+
+    assert client.delete(f"/courses/{course_id}/students/{STUDENTS[1]}", headers=teacher).status_code == 200
+    assert STUDENTS[1] not in _rows(db, course_id)
+    assert _progress(client, course)["total"] == 2
+
+    client.post(f"/courses/{course_id}/enroll-student", json={"student_email": STUDENTS[1]}, headers=teacher)
+    assert _rows(db, course_id)[STUDENTS[1]] == before
+
+
+def test_deleting_a_quiz_recomputes_affected_students(client, db, course):
+    assert client.delete(f"/quizzes/{course['dropped']}", headers=course["teacher"]).status_code == 200
+    assert _rows(db, course["id"])[STUDENTS[0]][:3] == (1, 100.0, 100.0)
+
+
+def test_rebuild_cli_restores_lost_rows(db, course):
+    course_progress.forget_courses(db, [course["id"]])
+    db.commit()
+    assert not _rows(db, course["id"])
+
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        assert course_progress.main(["rebuild", str(course["id"])]) == 0
+    assert "rebuilt 1 / 1 courses" in out.getvalue()
+    assert set(_rows(db, course["id"])) == set(STUDENTS)
@@ -0,0 +1,85 @@
+import hashlib
+from io import BytesIO
+
+import pytest
+from docx import Document
+
+import extraction
+import lessons
+from ai.files import path_hashes
+from conftest import bearer
+from models import AttachmentText
+
+
+@pytest.fixture(scope="module")
+def course(client, sign_in):
+    teacher = bearer(sign_in("teacher@extract.test", "teacher"))
+    course_id = client.post("/courses", json={"title": "Extract", "subject": "CS"}, headers=teacher).json()["id"]
+    return {"teacher": teacher, "id": course_id}
+
+
+@pytest.fixture
+def upload_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(lessons, "UPLOAD_DIR", str(tmp_path))
+    return tmp_path
+
+
+def _docx(text: str) -> bytes:
+    doc = Document()
+    for para in text.split("\n\n"):
+        doc.add_paragraph(para)
+    out = BytesIO()
+    doc.save(out)
+    return out.getvalue()
+
+
+def test_lesson_upload_is_streamed_hashed_and_extracted(client, course, upload_dir, db, monkeypatch):
+    monkeypatch.setattr(lessons, "UPLOAD_CHUNK_BYTES", 7)
+    raw = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 4
+    r = client.post(
+        "/lessons/upload", params={"course_id": course["id"]},
+        files={"file": ("diagram.png", raw, "image/png")}, headers=course["teacher"],
+    )
+    assert r.status_code == 200, r.text
+
+    path = upload_dir / r.json()["file_url"].rsplit("/", 1)[1]
+    assert path.read_bytes() == raw
+    digest = hashlib.sha256(raw).hexdigest()
+    assert db.query(AttachmentText).filter(AttachmentText.file_hash == digest).count() == 1
+    # remembered at upload, so the quiz path lookup needs no read
+    assert path_hashes.get(path_hashes.stamp(str(path))) == digest
+
+
+def test_oversized_lesson_upload_is_refused(client, course, upload_dir, monkeypatch):
+    monkeypatch.setattr(lessons, "LESSON_UPLOAD_MAX_MB", 1)
+    raw = b"x" * (1024 * 1024 + 1)
+    r = client.post(
+        "/lessons/upload", params={"course_id": course["id"]},
+        files={"file": ("big.pdf", raw, "application/pdf")}, headers=course["teacher"],
+    )
+    assert r.status_code == 413
+    assert list(upload_dir.iterdir()) == []
+
+
+def test_chat_uploads_are_extracted_in_memory(client, sign_in, db):
+    student = bearer(sign_in("student@extract.test"))
+    raw = _docx("Photosynthesis turns light into sugar.\n\nChlorophyll absorbs red and blue light.")
+    before = db.query(AttachmentText).count()
+    hits = extraction.chat_texts.stats()["hits"]
+
+    for _ in range(2):
+        r = client.post(
+            "/ai/chat-file", data={"message": "summarize"},
+            files={"file": ("notes.docx", raw, extraction.DOCX_TYPE)}, headers=student,
+        )
+        assert r.status_code == 200, r.text
+
+    assert db.query(AttachmentText).count() == before
+    assert extraction.chat_texts.stats()["hits"] == hits + 1
+
+
+def test_chat_text_cache_is_bounded():
+    cache = extraction.ChatTextCache(max_entries=2)
+    for i in range(4):
+        assert cache.text(f"para {i}".encode(), "text") == f"para {i}"
+    assert cache.stats()["entries"] == 2
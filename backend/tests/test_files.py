@@ -0,0 +1,49 @@
+import asyncio
+from types import SimpleNamespace
+
+from ai import files
+
+
+def test_cancelled_caller_does_not_cancel_shared_upload(monkeypatch):
+    uploads = []
+
+    async def slow_upload(fileobj, mime_type=None):
+        uploads.append(mime_type)
+        await asyncio.sleep(0.05)
+        return SimpleNamespace(name=f"files/{len(uploads)}", expiration_time=None)
+
+    monkeypatch.setattr(files.llm, "upload_file", slow_upload)
+
+    async def run():
+        registry = files.FileRegistry()
+        first = asyncio.create_task(registry.get_or_upload(b"pdf", "application/pdf"))
+        second = asyncio.create_task(registry.get_or_upload(b"pdf", "application/pdf"))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        handle = await second
+        assert handle.name == "files/1"
+        assert first.cancelled()
+        # the upload finished and is reused from the registry
+        assert (await registry.get_or_upload(b"pdf", "application/pdf")).name == "files/1"
+        assert uploads == ["application/pdf"]
+
+    asyncio.run(run())
+
+
+def test_path_hashes_are_bounded(monkeypatch, tmp_path):
+    async def upload(fileobj, mime_type=None):
+        return SimpleNamespace(name="files/x", expiration_time=None)
+
+    monkeypatch.setattr(files.llm, "upload_file", upload)
+
+    async def run():
+        registry = files.FileRegistry(max_entries=3)
+        for i in range(6):
+            path = tmp_path / f"a{i}.txt"
+            path.write_bytes(f"file {i}".encode())
+            await registry.get_or_upload_path(str(path), "text/plain")
+        stats = registry.stats()
+        assert stats["path_hashes"] == 3
+        assert stats["entries"] == 3
+
+    asyncio.run(run())
@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from ai.governor import LLMGovernor
+
+
+class Upstream(Exception):
+    def __init__(self, code: int):
+        super().__init__(f"upstream {code}")
+        self.code = code
+
+
+def _governor(**kwargs) -> LLMGovernor:
+    opts = dict(retry_base_seconds=0.001, breaker_failures=2, breaker_cooldown_seconds=0.05, max_retries=0)
+    opts.update(kwargs)
+    return LLMGovernor(**opts)
+
+
+async def _fail():
+    raise Upstream(503)
+
+
+async def _ok():
+    return "ok"
+
+
+async def _trip(g: LLMGovernor):
+    for _ in range(g.breaker_failures):
+        with pytest.raises(HTTPException):
+            await g.call("m", _fail)
+    assert g.stats()["m"]["breaker"] == "open"
+
+
+def test_breaker_opens_and_closes_after_probe():
+    async def run():
+        g = _governor()
+        await _trip(g)
+        with pytest.raises(HTTPException) as exc:
+            await g.call("m", _ok)
+        assert exc.value.status_code == 503
+
+        await asyncio.sleep(g.breaker_cooldown_seconds)
+        assert await g.call("m", _ok) == "ok"
+        assert g.stats()["m"]["breaker"] == "closed"
+
+    asyncio.run(run())
+
+
+def test_failed_probe_reopens_breaker():
+    async def run():
+        g = _governor()
+        await _trip(g)
+        await asyncio.sleep(g.breaker_cooldown_seconds)
+        with pytest.raises(HTTPException):
+            await g.call("m", _fail)
+        assert g.stats()["m"]["breaker"] == "open"
+
+    asyncio.run(run())
+
+
+def test_cancelled_probe_does_not_wedge_breaker():
+    async def run():
+        g = _governor()
+        await _trip(g)
+        await asyncio.sleep(g.breaker_cooldown_seconds)
+
+        probe = asyncio.create_task(g.call("m", lambda: asyncio.sleep(10)))
+        await asyncio.sleep(0.01)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+        m = g._model("m")
+        assert not m.probing and m.state == "open" and m.in_flight == 0
+        await asyncio.sleep(g.breaker_cooldown_seconds)
+        assert await g.call("m", _ok) == "ok"
+        assert m.state == "closed"
+
+    asyncio.run(run())
+
+
+def test_stream_probe_closed_early_does_not_wedge_breaker():
+    async def chunks():
+        for part in ("a", "b", "c"):
+            yield part
+
+    async def run():
+        g = _governor()
+        await _trip(g)
+        await asyncio.sleep(g.breaker_cooldown_seconds)
+
+        agen = g.stream("m", chunks)
+        assert await agen.__anext__() == "a"
+        await agen.aclose()
+
+        m = g._model("m")
+        assert not m.probing and m.state == "open" and m.in_flight == 0
+        await asyncio.sleep(g.breaker_cooldown_seconds)
+        assert [c async for c in g.stream("m", chunks)] == ["a", "b", "c"]
+        assert m.state == "closed"
+
+    asyncio.run(run())
+
+
+def test_slots_are_released_and_queue_sheds():
+    async def run():
+        g = _governor(max_in_flight=1, queue_max=1)
+        gate = asyncio.Event()
+
+        async def hold():
+            await gate.wait()
+            return "held"
+
+        first = asyncio.create_task(g.call("m", hold))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(g.call("m", _ok))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as exc:
+            await g.call("m", _ok)
+        assert exc.value.status_code == 503
+
+        gate.set()
+        assert await asyncio.gather(first, second) == ["held", "ok"]
+        assert g.stats()["m"]["in_flight"] == 0
+
+    asyncio.run(run())
@@ -0,0 +1,75 @@
+import pytest
+from sqlalchemy import event
+
+import database
+from conftest import bearer
+from grading_cache import GradingPlan, GradingPlanCache, grading_cache
+
+QUESTIONS = [{"question": f"Q{i}", "options": ["a", "b", "c", "d"], "answer": "b"} for i in range(2)]
+
+
+def _plan(quiz_id, lesson_id=1, course_id=1):
+    return GradingPlan(quiz_id, lesson_id, course_id, "Math", "sets", (("Q", "A"),))
+
+
+@pytest.fixture(scope="module")
+def quiz(client, sign_in):
+    teacher = bearer(sign_in("teacher@grading.test", "teacher"))
+    student = bearer(sign_in("student@grading.test"))
+    course_id = client.post("/courses", json={"title": "Grading", "subject": "Math"}, headers=teacher).json()["id"]
+    client.post(f"/courses/{course_id}/enroll-student", json={"student_email": "student@grading.test"}, headers=teacher)
+    lesson_id = client.post(
+        "/lessons", json={"course_id": course_id, "title": "Sets", "topic": "sets", "content_text": "unions"},
+        headers=teacher,
+    ).json()["id"]
+    quiz_id = client.post(f"/quizzes/manual/{lesson_id}", json={"questions": QUESTIONS}, headers=teacher).json()["quiz_id"]
+    return {"teacher": teacher, "student": student, "id": quiz_id, "lesson_id": lesson_id}
+
+
+@pytest.fixture
+def statements():
+    seen = []
+
+    def record(conn, cursor, statement, *args):
+        seen.append(statement)
+
+    engines = {database.engine, database.read_engine}
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", record)
+    yield seen
+    for engine in engines:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+def test_lru_ttl_and_invalidation():
+    cache = GradingPlanCache(max_entries=2)
+    for quiz_id in (1, 2, 3):
+        cache.put(_plan(quiz_id, lesson_id=quiz_id, course_id=10 + quiz_id % 2))
+    assert cache.get(1) is None and cache.get(2) is not None
+
+    cache.invalidate_course(11)  # quiz 3
+    cache.invalidate_lesson(2)
+    assert cache.get(2) is None and cache.get(3) is None
+    assert cache.stats()["invalidations"] == 2
+
+    expired = GradingPlanCache(ttl_seconds=-1)
+    expired.put(_plan(1))
+    assert expired.get(1) is None
+
+
+def test_repeat_submissions_skip_the_answer_key_query(client, quiz, statements):
+    grading_cache.invalidate_quiz(quiz["id"])
+    for _ in range(2):
+        r = client.post(f"/attempts/submit/{quiz['id']}", json={"answers": ["b", "a"]}, headers=quiz["student"])
+        assert r.json()["score"] == 50.0
+    assert sum("FROM quiz_questions" in s for s in statements) == 1
+
+
+def test_deleting_the_quiz_drops_its_plan(client, quiz):
+    client.post(f"/attempts/submit/{quiz['id']}", json={"answers": ["b", "b"]}, headers=quiz["student"])
+    assert grading_cache.get(quiz["id"]) is not None
+
+    assert client.delete(f"/quizzes/{quiz['id']}", headers=quiz["teacher"]).status_code == 200
+    assert grading_cache.get(quiz["id"]) is None
+    r = client.post(f"/attempts/submit/{quiz['id']}", json={"answers": ["b", "b"]}, headers=quiz["student"])
+    assert r.status_code == 404
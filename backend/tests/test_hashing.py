@@ -0,0 +1,78 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+import hashing
+from hashing import BCRYPT_ROUNDS, HashingService, hasher
+from models import User
+
+
+def _blocked(release: threading.Event):
+    release.wait(5)
+    return "done"
+
+
+def test_saturated_pool_refuses_with_retry_after():
+    service = HashingService(workers=0, queue_max=1)  # one running + one waiting
+    release = threading.Event()
+
+    async def storm():
+        held = [asyncio.ensure_future(service._run(_blocked, release)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(HTTPException) as e:
+            await service._run(_blocked, release)
+        release.set()
+        return e.value, await asyncio.gather(*held)
+
+    try:
+        refused, results = asyncio.run(storm())
+    finally:
+        release.set()
+        service.shutdown()
+    assert (refused.status_code, refused.headers["Retry-After"]) == (429, "1")
+    assert results == ["done", "done"]
+    stats = service.stats()
+    assert (stats["rejected"], stats["completed"], stats["in_flight"]) == (1, 2, 0)
+
+
+def test_slow_worker_times_out_with_503_and_keeps_its_slot():
+    service = HashingService(workers=0, queue_max=0, timeout_seconds=0.05)
+    release = threading.Event()
+    try:
+        with pytest.raises(HTTPException) as e:
+            asyncio.run(service._run(_blocked, release))
+        assert e.value.status_code == 503
+        assert service.stats()["in_flight"] == 1  # still running in the worker
+    finally:
+        release.set()
+        service.shutdown()
+    assert service.stats()["timeouts"] == 1
+
+
+def test_login_rehashes_an_old_cost_once(client, db):
+    old = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4)
+    db.add(User(email="legacy@hashing.test", role="student",
+                hashed_password=old.hash(hashing._pre_hash("pw12345"))))
+    db.commit()
+    before = hasher.rehashed
+
+    def stored():
+        db.expire_all()
+        return db.query(User.hashed_password).filter(User.email == "legacy@hashing.test").scalar()
+
+    for _ in range(2):
+        r = client.post("/auth/login", json={"email": "legacy@hashing.test", "password": "pw12345"})
+        assert r.status_code == 200, r.text
+        assert stored().startswith(f"$2b${BCRYPT_ROUNDS:02d}$")
+    assert hasher.rehashed == before + 1
+
+
+def test_login_during_a_storm_gets_429(client, sign_in, monkeypatch):
+    sign_in("storm@hashing.test")
+    monkeypatch.setattr(hasher, "_in_flight", hasher.capacity)
+    r = client.post("/auth/login", json={"email": "storm@hashing.test", "password": "pw12345"})
+    assert r.status_code == 429
+    assert r.headers["Retry-After"] == "1"
@@ -0,0 +1,141 @@
+import itertools
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from ai import llm
+from ai.limits import RateLimiter, UsageMeter, usage_meter
+from conftest import bearer
+from models import AIUsage
+
+PLANS = {
+    "free": {"per_minute": 60.0, "burst": 3.0, "daily_tokens": 100},
+    "premium": {"per_minute": 600.0, "burst": 10.0, "daily_tokens": 0},
+}
+
+_emails = (f"user{i}@limits.test" for i in itertools.count())
+
+
+def _stored(db, email):
+    db.expire_all()
+    return (
+        db.query(AIUsage.requests, AIUsage.prompt_tokens, AIUsage.output_tokens)
+        .filter(AIUsage.user_email == email, AIUsage.day == datetime.utcnow().date())
+        .first()
+    )
+
+
+def test_rate_limiter_allows_burst_then_429():
+    limiter = RateLimiter(plans=PLANS)
+    for _ in range(3):
+        limiter.check("a@x", "free")
+    with pytest.raises(HTTPException) as exc:
+        limiter.check("a@x", "free")
+    assert exc.value.status_code == 429
+    assert int(exc.value.headers["Retry-After"]) >= 1
+    # buckets are per user
+    limiter.check("b@x", "free")
+
+
+def test_rate_limiter_evicts_least_recent_users():
+    limiter = RateLimiter(plans=PLANS, max_users=2)
+    for email in ("a", "b", "c"):
+        limiter.check(email, "free")
+    assert limiter.stats()["users"] == 2
+
+
+def test_budget_blocks_after_flush(app_db, db):
+    email = next(_emails)
+    meter = UsageMeter(plans=PLANS, flush_seconds=60, session_factory=app_db)
+    meter.check(db, email, "free")
+    meter.record(email, {"prompt_tokens": 60, "output_tokens": 50})
+    with pytest.raises(HTTPException) as exc:
+        meter.check(db, email, "free")
+    assert exc.value.status_code == 429
+
+    assert meter.flush() == 1
+    assert tuple(_stored(db, email)) == (1, 60, 50)
+    # still over budget once the total comes from the database
+    with pytest.raises(HTTPException):
+        meter.check(db, email, "free")
+    # unlimited plan
+    meter.check(db, email, "premium")
+
+
+def test_failed_flush_keeps_every_count(app_db, db):
+    email = next(_emails)
+    calls = {"n": 0}
+
+    def flaky_factory():
+        calls["n"] += 1
+        if calls["n"] == 1:
+            raise ConnectionError("database unavailable")
+        session = app_db()
+        if calls["n"] == 2:
+            def boom():
+                raise RuntimeError("commit failed")
+            session.commit = boom
+        return session
+
+    meter = UsageMeter(plans=PLANS, flush_seconds=60, session_factory=flaky_factory)
+    meter.record(email, {"prompt_tokens": 7, "output_tokens": 3})
+    with pytest.raises(ConnectionError):
+        meter.flush()
+    meter.record(email, {"prompt_tokens": 1, "output_tokens": 1})
+    with pytest.raises(RuntimeError):
+        meter.flush()
+    assert meter.stats()["pending_flush"] == 1
+    assert meter.stats()["flush_errors"] == 2
+
+    assert meter.flush() == 1
+    assert tuple(_stored(db, email)) == (2, 8, 4)
+    assert meter.stats()["pending_flush"] == 0
+    assert meter.flush() == 0
+
+
+def test_flush_adds_to_other_workers_usage(app_db, db):
+    email = next(_emails)
+    a = UsageMeter(plans=PLANS, session_factory=app_db)
+    b = UsageMeter(plans=PLANS, session_factory=app_db)
+    a.record(email, {"prompt_tokens": 10, "output_tokens": 10})
+    b.record(email, {"prompt_tokens": 5, "output_tokens": 5})
+    a.flush()
+    b.flush()
+    assert tuple(_stored(db, email)) == (2, 15, 15)
+    assert a.used_today(db, email) == 30
+
+
+def _requests_today(email):
+    entry = usage_meter._usage.get((email, datetime.utcnow().date()))
+    return entry["requests"] if entry else 0
+
+
+def test_only_calls_that_reached_the_model_are_metered(client, sign_in, monkeypatch):
+    email = next(_emails)
+    student = bearer(sign_in(email))
+    refuse = HTTPException(status_code=503, detail="busy", headers={"Retry-After": "1"})
+
+    async def refused_stream(*args, **kwargs):
+        raise refuse
+        yield
+
+    async def cut_short(*args, **kwargs):
+        yield "half an ans"
+        raise RuntimeError("connection reset")
+
+    async def refused_generate(*args, **kwargs):
+        raise refuse
+
+    monkeypatch.setattr(llm, "stream", refused_stream)
+    r = client.post("/ai/chat/stream", json={"message": "never started", "no_cache": True}, headers=student)
+    assert "event: error" in r.text
+    monkeypatch.setattr(llm, "generate", refused_generate)
+    r = client.post("/ai/chat-file", files={"file": ("q.txt", b"what is 2 + 2", "text/plain")}, headers=student)
+    assert r.status_code == 503
+    assert _requests_today(email) == 0
+
+    monkeypatch.setattr(llm, "stream", cut_short)
+    r = client.post("/ai/chat/stream", json={"message": "cut short", "no_cache": True}, headers=student)
+    assert "event: error" in r.text
+    assert _requests_today(email) == 1
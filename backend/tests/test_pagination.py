@@ -0,0 +1,66 @@
+import pytest
+
+from conftest import bearer
+from models import Lesson
+from pagination import encode_cursor, page_params
+
+
+@pytest.fixture(scope="module")
+def course(client, sign_in):
+    teacher = bearer(sign_in("teacher@paging.test", "teacher"))
+    course_id = client.post("/courses", json={"title": "Paging", "subject": "CS"}, headers=teacher).json()["id"]
+    lesson_ids = [
+        client.post(
+            "/lessons",
+            json={"course_id": course_id, "title": f"L{i}", "topic": "t", "content_text": "x"},
+            headers=teacher,
+        ).json()["id"]
+        for i in range(7)
+    ]
+    return {"teacher": teacher, "id": course_id, "lesson_ids": lesson_ids}
+
+
+def _walk(client, url, headers, key, limit):
+    seen, cursor = [], None
+    while True:
+        params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+        body = client.get(url, params=params, headers=headers).json()
+        assert len(body[key]) <= limit
+        seen += body[key]
+        cursor = body["next_cursor"]
+        if not cursor:
+            return seen
+
+
+def test_unpaged_request_returns_whole_list(client, course):
+    params = page_params(default_limit=2)(limit=None, cursor=None, fields=None)
+    assert params.limit is None
+
+    body = client.get(f"/lessons/course/{course['id']}", headers=course["teacher"]).json()
+    assert [l["id"] for l in body["lessons"]] == course["lesson_ids"]
+    assert body["next_cursor"] is None
+    assert page_params(default_limit=2)(limit=None, cursor=encode_cursor({"k": [1]}), fields=None).limit == 2
+
+
+def test_keyset_walk_covers_rows_with_null_created_at(client, course, db):
+    # rows from before created_at had a default
+    db.query(Lesson).filter(Lesson.id.in_(course["lesson_ids"][1::2])).update(
+        {Lesson.created_at: None}, synchronize_session=False
+    )
+    db.commit()
+
+    lessons = _walk(client, f"/lessons/course/{course['id']}", course["teacher"], "lessons", limit=2)
+    assert [l["id"] for l in lessons] == course["lesson_ids"]
+
+
+def test_cursor_without_limit_keeps_paging(client, course):
+    first = client.get(f"/lessons/course/{course['id']}", params={"limit": 3}, headers=course["teacher"]).json()
+    rest = client.get(
+        f"/lessons/course/{course['id']}", params={"cursor": first["next_cursor"]}, headers=course["teacher"]
+    ).json()
+    assert [l["id"] for l in first["lessons"] + rest["lessons"]] == course["lesson_ids"]
+
+
+def test_invalid_cursor_is_400(client, course):
+    r = client.get(f"/lessons/course/{course['id']}", params={"cursor": "nope"}, headers=course["teacher"])
+    assert r.status_code == 400
@@ -0,0 +1,43 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from ai import providers
+
+
+def test_unknown_provider_is_named():
+    with pytest.raises(RuntimeError, match="Unknown LLM_PROVIDER 'nope'"):
+        providers.get_provider("nope")
+
+
+def test_constructor_errors_are_not_reported_as_unknown(monkeypatch):
+    class Broken:
+        def __init__(self):
+            raise KeyError("GEMINI_API_KEY")
+
+    monkeypatch.setitem(providers.PROVIDERS, "broken", Broken)
+    with pytest.raises(KeyError):
+        providers.get_provider("broken")
+
+
+def test_gemini_embed_awaits_the_async_client():
+    calls = []
+
+    async def embed_content_async(**kwargs):
+        calls.append(kwargs)
+        return {"embedding": [[0.1, 0.2]] * len(kwargs["content"])}
+
+    provider = providers.GeminiProvider.__new__(providers.GeminiProvider)
+    provider._genai = SimpleNamespace(embed_content_async=embed_content_async)
+    usage = {}
+    vectors = asyncio.run(provider.embed("models/text-embedding-004", ["a question", "another"], usage))
+
+    assert vectors == [[0.1, 0.2], [0.1, 0.2]]
+    assert calls[0]["task_type"] == "semantic_similarity"
+    assert usage["prompt_tokens"] > 0 and usage["output_tokens"] == 0
+
+
+def test_fake_provider_is_deterministic():
+    a, b = providers.FakeProvider(), providers.FakeProvider()
+    assert asyncio.run(a.generate("m", "same prompt")) == asyncio.run(b.generate("m", "same prompt"))
@@ -0,0 +1,67 @@
+import contextlib
+import io
+import json
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+import database
+import query_audit
+from database import Base
+
+
+def test_every_model_index_exists(app_db):
+    inspector = inspect(database.engine)
+    for table in Base.metadata.sorted_tables:
+        existing = {i["name"] for i in inspector.get_indexes(table.name)}
+        # unique constraints may be reported as constraints rather than indexes
+        existing |= {u["name"] for u in inspector.get_unique_constraints(table.name)}
+        missing = {i.name for i in table.indexes} - existing
+        assert not missing, f"{table.name}: {sorted(missing)}"
+
+
+def test_full_scans_are_read_from_both_plan_formats():
+    assert query_audit.full_scans("sqlite", [
+        "SEARCH quiz_attempts USING INDEX ix_quiz_attempts_student_email (student_email=?)",
+        "SCAN lessons",
+        "SCAN CONSTANT ROW",
+    ]) == ["lessons"]
+    assert query_audit.full_scans("postgresql", [
+        "Nested Loop  (cost=0.15..16.50 rows=1 width=8)",
+        "  ->  Seq Scan on enrollments  (cost=0.00..1.01 rows=1 width=4)",
+        "  ->  Index Scan using courses_pkey on courses c  (cost=0.15..8.17 rows=1 width=4)",
+    ]) == ["enrollments"]
+
+
+def test_record_keeps_each_select_once(tmp_path):
+    log = tmp_path / "queries.jsonl"
+    engine = create_engine("sqlite://")
+    query_audit.record_to(str(log), engine, engine)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE audit_t (id INTEGER PRIMARY KEY, v TEXT)"))
+        conn.execute(text("INSERT INTO audit_t (v) VALUES ('x')"))
+        for v in ("x", "y"):
+            conn.execute(text("SELECT id FROM audit_t WHERE v = :v"), {"v": v})
+
+    entries = [json.loads(line) for line in log.read_text().splitlines()]
+    assert [e["sql"] for e in entries] == ["SELECT id FROM audit_t WHERE v = ?"]
+    assert entries[0]["params"] == ["x"]
+
+
+@pytest.mark.skipif(not database.IS_SQLITE, reason="tiny test tables make PostgreSQL prefer seq scans anyway")
+def test_audit_passes_hot_queries_and_flags_scans(app_db, tmp_path):
+    hot = [
+        ("SELECT id FROM enrollments WHERE course_id = ? AND student_email = ?", [1, "a@x"]),
+        ("SELECT id, score FROM quiz_attempts WHERE student_email = ?", ["a@x"]),
+        ("SELECT id FROM quizzes WHERE lesson_id = ? ORDER BY id", [1]),
+        ("SELECT id FROM course_progress WHERE course_id = ? ORDER BY avg_score DESC, student_email", [1]),
+    ]
+    log = tmp_path / "hot.jsonl"
+    log.write_text("".join(json.dumps({"sql": sql, "params": p}) + "\n" for sql, p in hot))
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        assert query_audit.main([str(log)]) == 0, out.getvalue()
+
+    log.write_text(json.dumps({"sql": "SELECT id FROM quiz_attempts WHERE score > ?", "params": [50]}) + "\n")
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        assert query_audit.main([str(log)]) == 1
+    assert "FULL SCAN (quiz_attempts)" in out.getvalue()
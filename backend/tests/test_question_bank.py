@@ -0,0 +1,72 @@
+import contextlib
+import importlib
+import io
+import json
+
+import pytest
+
+from conftest import bearer
+from database import engine
+from migrate import MigrationContext
+from models import Quiz, QuizJob, QuizQuestion
+from question_bank import add_quiz, delete_quizzes, load_answer_key, load_questions
+
+QUESTIONS = [
+    {"question": f"Q{i}", "options": [f"{i}a", f"{i}b", f"{i}c", f"{i}d"], "answer": f"{i}c", "explanation": f"E{i}"}
+    for i in range(4)
+]
+
+
+@pytest.fixture(scope="module")
+def lesson_id(client, sign_in):
+    teacher = bearer(sign_in("teacher@bank.test", "teacher"))
+    course_id = client.post("/courses", json={"title": "Bank", "subject": "Chem"}, headers=teacher).json()["id"]
+    return client.post(
+        "/lessons",
+        json={"course_id": course_id, "title": "Bonds", "topic": "bonds", "content_text": "ionic and covalent"},
+        headers=teacher,
+    ).json()["id"]
+
+
+def test_questions_round_trip_in_order(db, lesson_id):
+    quiz = add_quiz(db, lesson_id, "medium", QUESTIONS)
+    db.commit()
+
+    assert quiz.question_count == 4
+    assert load_questions(db, quiz.id) == QUESTIONS
+    assert [tuple(r) for r in load_answer_key(db, quiz.id)] == [(q["question"], q["answer"]) for q in QUESTIONS]
+
+
+def test_delete_removes_questions_and_detaches_jobs(db, lesson_id):
+    quiz = add_quiz(db, lesson_id, "easy", QUESTIONS[:2])
+    db.flush()
+    job = QuizJob(lesson_id=lesson_id, teacher_email="teacher@bank.test", difficulty="easy",
+                  num_questions=2, status="done", quiz_id=quiz.id)
+    db.add(job)
+    db.commit()
+    quiz_id, job_id = quiz.id, job.id
+
+    delete_quizzes(db, [quiz_id])
+    db.commit()
+    assert not db.query(QuizQuestion).filter(QuizQuestion.quiz_id == quiz_id).count()
+    assert not db.query(Quiz).filter(Quiz.id == quiz_id).count()
+    assert db.query(QuizJob.quiz_id).filter(QuizJob.id == job_id).scalar() is None
+
+
+def test_migration_backfills_legacy_blobs(db, lesson_id):
+    # a quiz written before quiz_questions existed, plus one with a broken blob
+    legacy = Quiz(lesson_id=lesson_id, difficulty="hard", questions_json=json.dumps(QUESTIONS), question_count=0)
+    broken = Quiz(lesson_id=lesson_id, difficulty="hard", questions_json="not json", question_count=0)
+    db.add_all([legacy, broken])
+    db.commit()
+
+    m0004 = importlib.import_module("migrations.m0004_quiz_questions")
+    with contextlib.redirect_stdout(io.StringIO()):
+        m0004.upgrade(MigrationContext(engine, batch_size=1))
+        m0004.upgrade(MigrationContext(engine, batch_size=1))  # re-runnable
+
+    db.expire_all()
+    assert load_questions(db, legacy.id) == QUESTIONS
+    assert db.query(Quiz.question_count).filter(Quiz.id == legacy.id).scalar() == 4
+    assert db.query(Quiz.question_count).filter(Quiz.id == broken.id).scalar() == 0
+    assert load_questions(db, broken.id) == []
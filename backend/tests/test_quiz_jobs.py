@@ -0,0 +1,136 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.exc import OperationalError
+
+import quiz_jobs
+from conftest import bearer
+from models import Quiz, QuizJob
+from quiz_jobs import QuizJobQueue
+
+
+@pytest.fixture(scope="module")
+def lesson(client, sign_in):
+    teacher = bearer(sign_in("teacher@jobs.test", "teacher"))
+    course_id = client.post("/courses", json={"title": "Jobs", "subject": "CS"}, headers=teacher).json()["id"]
+    lesson_id = client.post(
+        "/lessons",
+        json={"course_id": course_id, "title": "Sorting", "topic": "sort", "content_text": "merge sort splits"},
+        headers=teacher,
+    ).json()["id"]
+    return {"teacher": teacher, "id": lesson_id}
+
+
+@pytest.fixture
+def new_job(client, lesson):
+    def _new_job() -> int:
+        r = client.post("/quizzes/jobs", json={"lesson_id": lesson["id"], "num_questions": 2}, headers=lesson["teacher"])
+        assert r.status_code == 202
+        return r.json()["job_id"]
+    return _new_job
+
+
+def _job(db, job_id) -> QuizJob:
+    db.expire_all()
+    return db.query(QuizJob).filter(QuizJob.id == job_id).one()
+
+
+def test_job_is_claimed_once(app_db, new_job):
+    job_id = new_job()
+    a, b = QuizJobQueue(session_factory=app_db), QuizJobQueue(session_factory=app_db)
+    claims = [a.claim(job_id), b.claim(job_id)]
+    assert sum(c is not None for c in claims) == 1
+
+
+def test_concurrent_runs_produce_one_quiz(app_db, db, new_job, sql_on_loop):
+    job_id = new_job()
+    queues = [QuizJobQueue(session_factory=app_db) for _ in range(3)]
+
+    async def run():
+        await asyncio.gather(*[q._run(job_id) for q in queues])
+
+    asyncio.run(run())
+    job = _job(db, job_id)
+    assert job.status == "done" and job.attempts == 1
+    assert db.query(Quiz).filter(Quiz.id == job.quiz_id).count() == 1
+    assert sql_on_loop == []
+
+
+def test_only_stale_running_jobs_are_requeued(app_db, db, new_job):
+    live, dead = new_job(), new_job()
+    worker = QuizJobQueue(session_factory=app_db, heartbeat_seconds=1, stale_seconds=30)
+    assert worker.claim(live) and worker.claim(dead)
+    db.query(QuizJob).filter(QuizJob.id == dead).update(
+        {QuizJob.heartbeat_at: datetime.utcnow() - timedelta(minutes=5)}, synchronize_session=False
+    )
+    db.commit()
+
+    restarted = QuizJobQueue(session_factory=app_db, heartbeat_seconds=1, stale_seconds=30)
+    assert restarted.recover() == [dead]
+    assert _job(db, live).status == "running"
+    assert _job(db, dead).status == "queued" and _job(db, dead).claimed_by is None
+    assert live not in restarted.recover(include_queued=True)
+
+
+def test_forgotten_queued_jobs_are_picked_up_once(app_db, db, new_job):
+    fresh, forgotten = new_job(), new_job()
+    db.query(QuizJob).filter(QuizJob.id == forgotten).update(
+        {QuizJob.updated_at: datetime.utcnow() - timedelta(minutes=5)}, synchronize_session=False
+    )
+    db.commit()
+
+    a = QuizJobQueue(session_factory=app_db, heartbeat_seconds=1, stale_seconds=30)
+    b = QuizJobQueue(session_factory=app_db, heartbeat_seconds=1, stale_seconds=30)
+    assert a.recover() == [forgotten]
+    assert b.recover() == []
+    assert _job(db, forgotten).status == "queued" and _job(db, fresh).status == "queued"
+
+
+@pytest.mark.parametrize("error, retry", [
+    (HTTPException(status_code=503, detail="busy"), True),
+    (HTTPException(status_code=504, detail="timed out"), True),
+    (HTTPException(status_code=500, detail="Gemini quiz generation failed: bad JSON"), False),
+    (HTTPException(status_code=404, detail="Lesson not found"), False),
+    (asyncio.TimeoutError(), True),
+    (ConnectionResetError(), True),
+    (OperationalError("UPDATE quiz_jobs", {}, Exception("database is locked")), True),
+    (KeyError("answer"), False),
+    (TypeError("'NoneType' object is not subscriptable"), False),
+])
+def test_only_transient_errors_are_retried(error, retry):
+    assert quiz_jobs._is_transient(error) is retry
+
+
+def test_worker_that_lost_its_claim_saves_nothing(app_db, db, new_job):
+    job_id = new_job()
+    slow = QuizJobQueue(session_factory=app_db)
+    job = slow.claim(job_id)
+    # presumed dead and re-run elsewhere
+    db.query(QuizJob).filter(QuizJob.id == job_id).update(
+        {QuizJob.status: "queued", QuizJob.claimed_by: None}, synchronize_session=False
+    )
+    db.commit()
+    other = QuizJobQueue(session_factory=app_db)
+    asyncio.run(other._run(job_id))
+
+    quizzes = db.query(Quiz).count()
+    questions = [{"question": "q", "options": ["a", "b", "c", "d"], "answer": "a", "explanation": ""}]
+    assert slow._finish(job, questions) is None
+    assert db.query(Quiz).count() == quizzes
+    assert _job(db, job_id).claimed_by == other.worker_id
+
+
+def test_permanent_error_fails_job(app_db, db, new_job):
+    job_id = new_job()
+    queue = QuizJobQueue(session_factory=app_db)
+
+    def lesson_gone(job):
+        # e.g. deleted between enqueue and claim
+        raise HTTPException(status_code=404, detail="Lesson not found")
+
+    queue._load = lesson_gone
+    asyncio.run(queue._run(job_id))
+    job = _job(db, job_id)
+    assert job.status == "failed" and job.error == "Lesson not found"
@@ -0,0 +1,60 @@
+import pytest
+
+from conftest import bearer
+from lessons import PREVIEW_CHARS
+
+BODY = " ".join(["photosynthesis"] * 40)
+
+
+@pytest.fixture(scope="module")
+def course(client, sign_in):
+    teacher = bearer(sign_in("teacher@views.test", "teacher"))
+    student = bearer(sign_in("student@views.test"))
+    admin = bearer(sign_in("admin@views.test", "admin"))
+    course_id = client.post("/courses", json={"title": "Views", "subject": "Bio"}, headers=teacher).json()["id"]
+    client.post(f"/courses/{course_id}/enroll-student", json={"student_email": "student@views.test"}, headers=teacher)
+    lesson_ids = [
+        client.post(
+            "/lessons", json={"course_id": course_id, "title": f"Plants {i}", "topic": "plants", "content_text": BODY},
+            headers=teacher,
+        ).json()["id"]
+        for i in range(2)
+    ]
+    return {"teacher": teacher, "student": student, "admin": admin, "id": course_id, "lessons": lesson_ids}
+
+
+def _lessons(client, course, **params):
+    return client.get(f"/lessons/course/{course['id']}", params=params, headers=course["student"])
+
+
+def test_summary_view_ships_a_preview_instead_of_the_body(client, course):
+    full = _lessons(client, course).json()["lessons"]
+    assert all(l["content_text"] == BODY and "content_preview" not in l for l in full)
+
+    summary = _lessons(client, course, view="summary").json()["lessons"]
+    assert [l["id"] for l in summary] == course["lessons"]
+    for lesson in summary:
+        assert "content_text" not in lesson
+        assert lesson["content_preview"] == BODY[:PREVIEW_CHARS]
+
+    one = client.get(f"/lessons/{course['lessons'][0]}", headers=course["student"]).json()
+    assert one["content_text"] == BODY and "content_preview" not in one
+
+    assert _lessons(client, course, view="brief").status_code == 400
+
+
+def test_fields_projection_leaves_out_unrequested_keys(client, course):
+    body = _lessons(client, course, fields="id,title").json()
+    assert [set(l) for l in body["lessons"]] == [{"id", "title"}] * 2
+
+    paged = _lessons(client, course, fields="title", limit=1).json()
+    assert [set(l) for l in paged["lessons"]] == [{"title"}]
+    assert paged["next_cursor"]
+
+    assert _lessons(client, course, fields="id,secret").status_code == 400
+
+    mine = client.get("/courses/my", params={"fields": "id"}, headers=course["teacher"]).json()["courses"]
+    assert mine and all(set(c) == {"id"} for c in mine)
+
+    admin = client.get("/admin/courses", params={"fields": "title,subject"}, headers=course["admin"]).json()
+    assert admin["courses"] and all(set(c) == {"title", "subject"} for c in admin["courses"])
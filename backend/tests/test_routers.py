@@ -0,0 +1,204 @@
+"""Walks every router end to end on whichever database the run is pointed at
+(SQLite by default, PostgreSQL via test_backends.py)."""
+import pytest
+
+import course_progress
+import migrate
+import student_stats
+from conftest import bearer
+from database import insert_ignore
+from models import CourseProgress, Enrollment, QuizAttempt, StudentStats
+
+QUESTIONS = [
+    {"question": f"Q{i}", "options": ["a", "b", "c", "d"], "answer": "a", "explanation": ""}
+    for i in range(3)
+]
+
+
+@pytest.fixture(scope="module")
+def world(client, sign_in):
+    admin = bearer(sign_in("admin@routers.test", "admin"))
+    teacher = bearer(sign_in("teacher@routers.test", "teacher"))
+    students = {e: bearer(sign_in(e)) for e in ("s1@routers.test", "s2@routers.test", "s3@routers.test")}
+
+    course_id = client.post("/courses", json={"title": "Routers", "subject": "Physics"}, headers=teacher).json()["id"]
+    for email in students:
+        r = client.post(f"/courses/{course_id}/enroll-student", json={"student_email": email}, headers=teacher)
+        assert r.json()["message"] == "Student enrolled"
+
+    lesson = client.post(
+        "/lessons",
+        json={"course_id": course_id, "title": "Motion", "topic": "kinematics", "content_text": "v = d / t"},
+        headers=teacher,
+    )
+    assert lesson.status_code == 200, lesson.text
+    lesson_id = lesson.json()["id"]
+
+    quiz = client.post(f"/quizzes/manual/{lesson_id}", json={"questions": QUESTIONS}, headers=teacher)
+    assert quiz.status_code == 200, quiz.text
+    return {
+        "admin": admin, "teacher": teacher, "students": students,
+        "course_id": course_id, "lesson_id": lesson_id, "quiz_id": quiz.json()["quiz_id"],
+    }
+
+
+def test_schema_is_current(app_db):
+    assert migrate.pending() == []
+
+
+def test_auth_flow(client, sign_in):
+    body = sign_in("auth@routers.test")
+    assert client.get("/auth/me", headers=bearer(body)).json()["email"] == "auth@routers.test"
+
+    dup = client.post("/auth/register", json={"email": "auth@routers.test", "password": "x", "role": "student"})
+    assert dup.status_code == 400
+
+    fresh = client.post("/auth/refresh", json={"refresh_token": body["refresh_token"]})
+    assert fresh.status_code == 200
+    assert client.post("/auth/logout", json={"refresh_token": fresh.json()["refresh_token"]}).status_code == 200
+    assert client.post("/auth/refresh", json={"refresh_token": fresh.json()["refresh_token"]}).status_code == 401
+
+
+def test_courses_and_lessons(client, world):
+    teacher, course_id = world["teacher"], world["course_id"]
+
+    again = client.post(
+        f"/courses/{course_id}/enroll-student", json={"student_email": "s1@routers.test"}, headers=teacher
+    )
+    assert again.json()["message"] == "Student already enrolled"
+
+    mine = client.get("/courses/my", headers=teacher).json()
+    assert course_id in [c["id"] for c in mine["courses"]]
+    student_view = client.get("/courses/my", headers=world["students"]["s1@routers.test"]).json()
+    assert [c["id"] for c in student_view["courses"]] == [course_id]
+
+    roster = client.get(f"/courses/{course_id}/students", headers=teacher).json()["students"]
+    assert [s["student_email"] for s in roster] == sorted(world["students"])
+
+    lessons = client.get(f"/lessons/course/{course_id}", params={"view": "summary"}, headers=teacher).json()
+    assert [l["id"] for l in lessons["lessons"]] == [world["lesson_id"]]
+    assert "content_text" not in lessons["lessons"][0]
+
+    outsider = bearer(client.post("/auth/login", json={"email": "auth@routers.test", "password": "pw12345"}).json())
+    assert client.get(f"/lessons/{world['lesson_id']}", headers=outsider).status_code == 403
+
+
+def test_quizzes_and_attempts(client, world):
+    student = world["students"]["s1@routers.test"]
+    quiz_id = world["quiz_id"]
+
+    listed = client.get(f"/quizzes/lesson/{world['lesson_id']}", headers=student).json()["quizzes"]
+    assert [q["quiz_id"] for q in listed] == [quiz_id]
+    assert len(client.get(f"/quizzes/{quiz_id}", headers=student).json()["questions"]) == 3
+
+    scores = []
+    for answers in (["a", "a", "a"], ["a", "b", "b"]):
+        r = client.post(f"/attempts/submit/{quiz_id}", json={"answers": answers}, headers=student)
+        assert r.status_code == 200, r.text
+        scores.append(r.json()["score"])
+    assert scores == [100.0, 33.33]
+
+    stats = client.get("/attempts/my/stats", headers=student).json()
+    assert stats["total_attempts"] == 2
+    assert client.get("/attempts/my/report", headers=student).status_code == 200
+    assert client.get("/attempts/my/weekly-progress", headers=student).status_code == 200
+
+    bad = client.post(f"/attempts/submit/{quiz_id}", json={"answers": ["a"]}, headers=student)
+    assert bad.status_code == 400
+
+
+def test_teacher_progress(client, world):
+    teacher, course_id = world["teacher"], world["course_id"]
+    client.post(f"/attempts/submit/{world['quiz_id']}", json={"answers": ["b", "b", "b"]},
+                headers=world["students"]["s2@routers.test"])
+
+    for sort in ("avg_score", "quizzes_done", "student_email", "last_attempt_at"):
+        seen, cursor = [], None
+        while True:
+            params = {"sort": sort, "limit": 1, **({"cursor": cursor} if cursor else {})}
+            body = client.get(f"/teacher/course/{course_id}/students-progress", params=params, headers=teacher).json()
+            seen += [s["student_email"] for s in body["students"]]
+            cursor = body["next_cursor"]
+            if not cursor:
+                break
+        assert sorted(seen) == sorted(world["students"]), sort
+        assert body["total"] == 3
+
+    weekly = client.get(
+        f"/teacher/course/{course_id}/student/s1@routers.test/weekly-progress", headers=teacher
+    )
+    assert weekly.status_code == 200
+    weak = client.get(f"/teacher/course/{course_id}/student/s2@routers.test/weak-topics", headers=teacher)
+    assert weak.status_code == 200
+
+
+def test_rollups_match_attempts(world, db):
+    # the incremental UPDATEs and a rebuild from quiz_attempts must agree
+    course_id = world["course_id"]
+    before = {
+        r.student_email: (r.attempt_count, round(r.avg_score, 6))
+        for r in db.query(CourseProgress).filter(CourseProgress.course_id == course_id)
+    }
+    course_progress.rebuild(db, course_id)
+    db.commit()
+    after = {
+        r.student_email: (r.attempt_count, round(r.avg_score, 6))
+        for r in db.query(CourseProgress).filter(CourseProgress.course_id == course_id)
+    }
+    assert before == after
+    assert after["s3@routers.test"] == (0, 0.0)
+
+    email = "s1@routers.test"
+    counted = db.query(QuizAttempt).filter(QuizAttempt.student_email == email).count()
+    stats = db.query(StudentStats.attempt_count, StudentStats.score_sum).filter(StudentStats.student_email == email)
+    before = stats.one()
+    assert before.attempt_count == counted
+    student_stats.rebuild(db, [email])
+    db.commit()
+    assert stats.one() == before
+
+
+def test_insert_ignore_keeps_existing_row(world, db):
+    key = {"course_id": world["course_id"], "student_email": "s1@routers.test"}
+    count = db.query(CourseProgress.attempt_count).filter_by(**key).scalar()
+    insert_ignore(db, CourseProgress, {**key, "attempt_count": 0, "score_sum": 0.0, "avg_score": 0.0})
+    db.commit()
+    assert db.query(CourseProgress.attempt_count).filter_by(**key).scalar() == count
+
+
+def test_admin(client, world):
+    admin = world["admin"]
+    stats = client.get("/admin/stats", headers=admin).json()
+    assert stats["totalCourses"] >= 1
+
+    users = client.get("/admin/users", params={"q": "routers.test", "limit": 2}, headers=admin)
+    cursor = users.headers.get("X-Next-Cursor")
+    assert len(users.json()) == 2 and cursor
+    rest = client.get("/admin/users", params={"q": "routers.test", "cursor": cursor}, headers=admin).json()
+    assert not {u["id"] for u in users.json()} & {u["id"] for u in rest}
+
+    s3 = next(u for u in users.json() + rest if u["email"] == "s3@routers.test")
+    r = client.patch(f"/admin/users/{s3['id']}/role", json={"role": "teacher"}, headers=admin)
+    assert r.json()["role"] == "teacher"
+    assert client.get("/admin/metrics", headers=admin).status_code == 200
+    assert client.get("/admin/courses", params={"subject": "Physics"}, headers=admin).json()["courses"]
+
+
+def test_deletes(client, world, db):
+    teacher, admin, course_id = world["teacher"], world["admin"], world["course_id"]
+
+    gone = client.delete(f"/courses/{course_id}/students/s3@routers.test", headers=teacher)
+    assert gone.status_code == 200
+    assert not db.query(CourseProgress).filter_by(course_id=course_id, student_email="s3@routers.test").count()
+
+    assert client.delete(f"/quizzes/{world['quiz_id']}", headers=teacher).status_code == 200
+    assert not db.query(QuizAttempt).filter(QuizAttempt.quiz_id == world["quiz_id"]).count()
+    assert client.delete(f"/lessons/{world['lesson_id']}", headers=teacher).status_code == 200
+
+    assert client.delete(f"/admin/courses/{course_id}", headers=admin).status_code == 200
+    assert not db.query(Enrollment).filter(Enrollment.course_id == course_id).count()
+    assert not db.query(CourseProgress).filter(CourseProgress.course_id == course_id).count()
+
+    victim = next(u for u in client.get("/admin/users", headers=admin).json() if u["email"] == "s2@routers.test")
+    assert client.delete(f"/admin/users/{victim['id']}", headers=admin).status_code == 200
+    assert not db.query(StudentStats).filter(StudentStats.student_email == "s2@routers.test").count()
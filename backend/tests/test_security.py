@@ -0,0 +1,91 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from jose import jwt
+from sqlalchemy import event
+
+import database
+import security
+from conftest import bearer
+from models import User
+
+
+@pytest.fixture
+def user_queries():
+    seen = []
+
+    def record(conn, cursor, statement, *args):
+        if "FROM users" in statement:
+            seen.append(statement)
+
+    engines = {database.engine, database.read_engine}
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", record)
+    yield seen
+    for engine in engines:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+def test_expiring_lru():
+    cache = security.ExpiringLRU(max_entries=2)
+    later = time.time() + 60
+    for key in ("a", "b", "c"):
+        cache.put(key, key.upper(), later)
+    assert cache.get("a") is None and cache.get("b") == "B"
+
+    cache.put("old", 1, time.time() - 1)
+    assert cache.get("old") is None
+    cache.invalidate("b")
+    assert cache.get("b") is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_verified_tokens_are_cached_until_exp(monkeypatch):
+    calls = []
+    real = security.jwt.decode
+    monkeypatch.setattr(security.jwt, "decode", lambda *a, **kw: calls.append(1) or real(*a, **kw))
+
+    token = security.create_access_token("cached@security.test", "student")
+    for _ in range(3):
+        assert security.decode_token(token)["sub"] == "cached@security.test"
+    assert len(calls) == 1
+
+    with pytest.raises(HTTPException) as e:
+        security.decode_token(token[:-2] + "xx")
+    assert e.value.status_code == 401
+
+    expired = jwt.encode(
+        {"sub": "old@security.test", "role": "student", "exp": datetime.utcnow() - timedelta(seconds=5)},
+        security.SECRET_KEY, algorithm=security.ALGORITHM,
+    )
+    for _ in range(2):
+        with pytest.raises(HTTPException):
+            security.decode_token(expired)
+    assert security.token_cache.get(expired) is None
+
+
+def test_profile_is_cached_and_refreshed_on_plan_change(client, sign_in, user_queries):
+    headers = bearer(sign_in("plan@security.test"))
+    security.invalidate_user("plan@security.test")
+    del user_queries[:]  # registration and login
+    for _ in range(3):
+        assert client.get("/auth/me", headers=headers).json()["plan"] == "free"
+    assert len(user_queries) == 1
+
+    client.post("/auth/upgrade", headers=headers)
+    assert client.get("/auth/me", headers=headers).json()["plan"] == "premium"
+    client.post("/billing/dev-downgrade", headers=headers)
+    assert client.get("/auth/me", headers=headers).json()["plan"] == "free"
+
+
+def test_admin_role_change_is_visible_at_once(client, sign_in, db):
+    admin = bearer(sign_in("admin@security.test", "admin"))
+    headers = bearer(sign_in("promote@security.test"))
+    assert client.get("/auth/me", headers=headers).json()["role"] == "student"
+
+    user_id = db.query(User.id).filter(User.email == "promote@security.test").scalar()
+    r = client.patch(f"/admin/users/{user_id}/role", json={"role": "teacher"}, headers=admin)
+    assert r.status_code == 200
+    assert client.get("/auth/me", headers=headers).json()["role"] == "teacher"
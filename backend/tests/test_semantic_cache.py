@@ -0,0 +1,88 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from ai import semantic_cache as semantic
+from ai.governor import governor
+from ai.limits import usage_meter
+from conftest import bearer
+
+
+def _vec(i: int, dim: int = 8) -> np.ndarray:
+    v = np.zeros(dim, dtype=np.float32)
+    v[i % dim] = 1.0
+    return v
+
+
+def test_scopes_are_lru_bounded():
+    cache = semantic.SemanticCache(semantic.HashingEmbedder(), max_scopes=2)
+    cache.add("a", _vec(0), "A")
+    cache.add("b", _vec(1), "B")
+    assert cache.lookup("a", _vec(0))[0] == "A"  # a is now the most recent
+    cache.add("c", _vec(2), "C")
+
+    assert cache.lookup("b", _vec(1))[0] is None
+    assert cache.lookup("a", _vec(0))[0] == "A"
+    stats = cache.stats()
+    assert stats["scopes"] == 2 and stats["scope_evictions"] == 1
+
+
+def test_topic_is_normalized_and_capped():
+    assert semantic.make_scope("m", 1, 3, "  Loops\tAND  Recursion ") == semantic.make_scope("m", 1, 3, "loops and recursion")
+    long_topic = "x" * (semantic.TOPIC_MAX_CHARS * 3)
+    assert len(semantic.make_scope("m", 1, None, long_topic)) < semantic.TOPIC_MAX_CHARS + 20
+
+
+@pytest.fixture(scope="module")
+def course(client, sign_in):
+    teacher = bearer(sign_in("teacher@semantic.test", "teacher"))
+    course_id = client.post("/courses", json={"title": "Sem", "subject": "CS"}, headers=teacher).json()["id"]
+    sign_in("member@semantic.test")
+    client.post(f"/courses/{course_id}/enroll-student", json={"student_email": "member@semantic.test"}, headers=teacher)
+    return course_id
+
+
+def test_course_scope_requires_membership(client, sign_in, course):
+    member = bearer(sign_in("member@semantic.test"))
+    outsider = bearer(sign_in("outsider@semantic.test"))
+
+    assert client.post("/ai/chat", json={"message": "hi", "course_id": course}, headers=member).status_code == 200
+    assert client.post("/ai/chat", json={"message": "hi", "course_id": course}, headers=outsider).status_code == 403
+    assert client.post("/ai/chat", json={"message": "hi", "course_id": 987654}, headers=outsider).status_code == 404
+
+    r = client.post("/ai/chat", json={"message": "hi", "topic": "t" * (semantic.TOPIC_MAX_CHARS + 1)}, headers=member)
+    assert r.status_code == 422
+
+
+def test_remote_embeddings_are_governed_and_metered(client, sign_in):
+    email = "embed@semantic.test"
+    student = bearer(sign_in(email))
+    cache = semantic.semantic_cache
+    local = cache.embedder
+    cache.set_embedder(semantic.GeminiEmbedder())
+    try:
+        r = client.post("/ai/chat", json={"message": "what does an embedding measure"}, headers=student)
+        assert r.status_code == 200
+    finally:
+        cache.set_embedder(local)
+
+    assert governor.stats()[semantic.EMBED_MODEL]["succeeded"] >= 1
+    entry = usage_meter._usage[(email, datetime.utcnow().date())]
+    assert entry["requests"] == 2  # the embedding and the chat reply
+
+
+def test_semantic_hit_stays_in_its_scope(client, sign_in, course):
+    member = bearer(sign_in("member@semantic.test"))
+
+    def ask(message, **scope):
+        r = client.post("/ai/chat", json={"message": message, **scope}, headers=member)
+        assert r.status_code == 200, r.text
+        return r.json()
+
+    ask("please explain how recursion works", course_id=course)
+    hit = ask("explain how recursion works please", course_id=course)
+    assert hit.get("cache_tier") == "semantic"
+
+    # the paraphrase was never answered outside the course
+    assert ask("explain how recursion works please")["cached"] is False
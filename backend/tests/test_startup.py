@@ -0,0 +1,45 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import migrate
+
+
+@pytest.fixture(autouse=True)
+def quiet_lifespan(monkeypatch):
+    # the rest of the suite shares the bcrypt pool and background workers;
+    # only the schema check is under test here
+    async def noop():
+        pass
+
+    monkeypatch.setattr(main.job_queue, "start", noop)
+    monkeypatch.setattr(main.job_queue, "stop", noop)
+    monkeypatch.setattr(main.usage_meter, "start", noop)
+    monkeypatch.setattr(main.usage_meter, "stop", noop)
+    monkeypatch.setattr(main.hasher, "shutdown", lambda: None)
+
+
+def test_app_starts_on_current_schema(app_db):
+    assert migrate.pending() == []
+    with TestClient(main.app) as client:
+        assert client.get("/").status_code == 200
+
+
+def test_pending_migrations_stop_startup(app_db, monkeypatch):
+    behind = migrate.discover()[-1:]
+    monkeypatch.setattr(migrate, "pending", lambda *a, **kw: behind)
+    monkeypatch.setattr(main, "MIGRATE_ON_STARTUP", False)
+    with pytest.raises(RuntimeError, match="pending migrations"):
+        with TestClient(main.app):
+            pass
+
+
+def test_migrate_on_startup_applies_them(app_db, monkeypatch):
+    behind = migrate.discover()[-1:]
+    applied = []
+    monkeypatch.setattr(migrate, "pending", lambda *a, **kw: [] if applied else behind)
+    monkeypatch.setattr(migrate, "upgrade", lambda *a, **kw: applied.append(True) or len(behind))
+    monkeypatch.setattr(main, "MIGRATE_ON_STARTUP", True)
+    with TestClient(main.app) as client:
+        assert client.get("/").status_code == 200
+    assert applied == [True]
@@ -0,0 +1,86 @@
+import contextlib
+import io
+from datetime import datetime, timedelta
+
+import pytest
+
+import student_stats
+from conftest import bearer
+from models import QuizAttempt, StudentStats, StudentWeekly
+
+QUESTIONS = [{"question": "Q", "options": ["a", "b", "c", "d"], "answer": "a"}]
+
+
+@pytest.fixture(scope="module")
+def quiz_id(client, sign_in):
+    teacher = bearer(sign_in("teacher@stats.test", "teacher"))
+    course_id = client.post("/courses", json={"title": "Stats", "subject": "Art"}, headers=teacher).json()["id"]
+    lesson_id = client.post(
+        "/lessons", json={"course_id": course_id, "title": "Colour", "topic": "colour", "content_text": "hue"},
+        headers=teacher,
+    ).json()["id"]
+    return client.post(f"/quizzes/manual/{lesson_id}", json={"questions": QUESTIONS}, headers=teacher).json()["quiz_id"]
+
+
+def _submit(db, quiz_id, email, score, at):
+    # what submit_attempt does, with a chosen timestamp
+    db.add(QuizAttempt(quiz_id=quiz_id, student_email=email, score=score, submitted_at=at))
+    student_stats.record_attempt(db, email, score, at)
+    db.commit()
+
+
+def _rollup(db, email):
+    db.expire_all()
+    s = db.query(StudentStats).filter(StudentStats.student_email == email).one()
+    weeks = {
+        w.week_start: (w.attempt_count, w.score_sum)
+        for w in db.query(StudentWeekly).filter(StudentWeekly.student_email == email)
+    }
+    return (s.attempt_count, s.score_sum, s.min_score, s.max_score, s.last_attempt_at, s.streak_days), weeks
+
+
+def test_streak_counts_consecutive_days(db, quiz_id):
+    email = "streak@stats.test"
+    day = datetime(2026, 3, 2, 9)  # a Monday
+    for offset, score in ((0, 40.0), (1, 60.0), (1.2, 80.0), (3, 100.0), (4, 20.0)):
+        _submit(db, quiz_id, email, score, day + timedelta(days=offset))
+
+    (count, total, lo, hi, last, streak), weeks = _rollup(db, email)
+    assert (count, total, lo, hi) == (5, 300.0, 20.0, 100.0)
+    assert last == day + timedelta(days=4)
+    assert streak == 2  # day 2 was skipped
+    assert weeks == {day.date(): (5, 300.0)}
+
+    # a late-arriving older timestamp is counted but doesn't move the streak
+    _submit(db, quiz_id, email, 50.0, day + timedelta(days=2))
+    (count, _t, _lo, _hi, last, streak), _w = _rollup(db, email)
+    assert (count, last, streak) == (6, day + timedelta(days=4), 2)
+
+
+def test_rebuild_matches_incremental_rollups(db, quiz_id):
+    email = "rebuild@stats.test"
+    start = datetime(2026, 3, 1, 18)  # a Sunday, so the attempts span two weeks
+    for i in range(5):
+        _submit(db, quiz_id, email, 10.0 * (i + 1), start + timedelta(days=i, hours=i))
+    incremental = _rollup(db, email)
+    assert len(incremental[1]) == 2
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert student_stats.main(["rebuild", email]) == 0
+    assert _rollup(db, email) == incremental
+
+
+def test_dashboard_reads_the_rollup(client, sign_in, db, quiz_id):
+    email = "dash@stats.test"
+    student = bearer(sign_in(email))
+    empty = client.get("/attempts/my/stats", headers=student).json()
+    assert empty["total_attempts"] == 0 and empty["streak_days"] == 0
+
+    now = datetime.utcnow()
+    _submit(db, quiz_id, email, 70.0, now - timedelta(days=1))
+    _submit(db, quiz_id, email, 90.0, now)
+    stats = client.get("/attempts/my/stats", headers=student).json()
+    assert (stats["total_attempts"], stats["avg_score"], stats["highest_score"], stats["streak_days"]) == (2, 80.0, 90.0, 2)
+
+    weekly = client.get("/attempts/my/weekly-progress", params={"weeks": 2}, headers=student).json()
+    assert sum(weekly["attempts"]) == 2 and len(weekly["weeks_data"]) == 2
@@ -0,0 +1,58 @@
+import threading
+import time
+
+import pytest
+
+import database
+from models import User
+
+pytestmark = pytest.mark.skipif(not database.IS_SQLITE, reason="the write lock is SQLite only")
+
+
+def _write(session):
+    session.query(User).filter(User.id == -1).update({User.role: "student"}, synchronize_session=False)
+
+
+def test_second_writer_on_same_thread_fails_fast(app_db):
+    first, second = app_db(), app_db()
+    try:
+        _write(first)
+        started = time.monotonic()
+        with pytest.raises(RuntimeError, match="write lock"):
+            _write(second)
+        assert time.monotonic() - started < 1
+        first.commit()
+
+        # released with the first transaction
+        _write(second)
+        second.commit()
+    finally:
+        first.close()
+        second.close()
+
+
+def test_writers_on_other_threads_wait_their_turn(app_db):
+    holder = app_db()
+    order = []
+
+    def other():
+        s = app_db()
+        try:
+            _write(s)
+            order.append("other")
+            s.commit()
+        finally:
+            s.close()
+
+    try:
+        _write(holder)
+        t = threading.Thread(target=other)
+        t.start()
+        time.sleep(0.1)
+        order.append("holder")
+        holder.commit()
+        t.join(5)
+    finally:
+        holder.close()
+    assert order == ["holder", "other"]
+    assert database._write_owner is None
@@ -1,9 +1,9 @@
 // src/api/axios.js
 import axios from "axios";
 
-const api = axios.create({
-  baseURL: process.env.REACT_APP_API_BASE_URL || "http://127.0.0.1:8000",
-});
+const baseURL = process.env.REACT_APP_API_BASE_URL || "http://127.0.0.1:8000";
+
+const api = axios.create({ baseURL });
 
 api.interceptors.request.use((config) => {
   const token = localStorage.getItem("edumate_token");
@@ -11,4 +11,53 @@ api.interceptors.request.use((config) => {
   return config;
 });
 
+// Access tokens are short-lived. On a 401, trade the refresh token for a new
+// pair once (shared by every request that failed meanwhile) and retry.
+let refreshing = null;
+
+const refreshTokens = async () => {
+  const refreshToken = localStorage.getItem("edumate_refresh_token");
+  if (!refreshToken) throw new Error("Not signed in");
+  try {
+    const res = await axios.post(`${baseURL}/auth/refresh`, { refresh_token: refreshToken });
+    localStorage.setItem("edumate_token", res.data.access_token);
+    localStorage.setItem("edumate_refresh_token", res.data.refresh_token);
+  } catch (err) {
+    // another tab may have rotated it first; use what it stored
+    if (localStorage.getItem("edumate_refresh_token") !== refreshToken) return;
+    throw err;
+  }
+};
+
+const endSession = () => {
+  localStorage.removeItem("edumate_token");
+  localStorage.removeItem("edumate_refresh_token");
+  localStorage.removeItem("edumate_user");
+  if (window.location.pathname !== "/login") window.location.assign("/login");
+};
+
+api.interceptors.response.use(
+  (res) => res,
+  async (error) => {
+    const config = error.config;
+    const url = config?.url || "";
+    const isAuthCall = url.includes("/auth/login") || url.includes("/auth/refresh") || url.includes("/auth/logout");
+
+    if (error.response?.status !== 401 || !config || config._retried || isAuthCall) {
+      return Promise.reject(error);
+    }
+    if (!localStorage.getItem("edumate_refresh_token")) return Promise.reject(error);
+
+    config._retried = true;
+    try {
+      if (!refreshing) refreshing = refreshTokens().finally(() => (refreshing = null));
+      await refreshing;
+    } catch (refreshError) {
+      endSession();
+      return Promise.reject(error);
+    }
+    return api(config);
+  }
+);
+
 export default api;
@@ -1,5 +1,6 @@
 // src/context/AuthContext.js
 import React, { createContext, useContext, useEffect, useMemo, useState } from "react";
+import api from "../api/axios";
 
 const AuthContext = createContext(null);
 
@@ -16,17 +17,23 @@ export function AuthProvider({ children }) {
 
   const isAuthenticated = !!token;
 
-  const login = ({ token, email, role }) => {
+  const login = ({ token, refreshToken, email, role }) => {
     setToken(token);
     setUser({ email, role });
     localStorage.setItem("edumate_token", token);
+    if (refreshToken) localStorage.setItem("edumate_refresh_token", refreshToken);
     localStorage.setItem("edumate_user", JSON.stringify({ email, role }));
   };
 
   const logout = () => {
+    // end the session server-side too; best effort, the local sign-out happens regardless
+    const refreshToken = localStorage.getItem("edumate_refresh_token");
+    if (refreshToken) api.post("/auth/logout", { refresh_token: refreshToken }).catch(() => {});
+
     setToken(null);
     setUser(null);
     localStorage.removeItem("edumate_token");
+    localStorage.removeItem("edumate_refresh_token");
     localStorage.removeItem("edumate_user");
   };
 
@@ -44,7 +44,7 @@ export default function AuthLoginPage() {
 
     try {
       // Backend expects: { email, password }
-      // Backend returns: { access_token, token_type, role }
+      // Backend returns: { access_token, refresh_token, token_type, role, ... }
       const res = await api.post("/auth/login", { email, password });
 
       const token = res.data?.access_token;
@@ -54,7 +54,7 @@ export default function AuthLoginPage() {
       if (!token) throw new Error("No token returned from server.");
 
       // Store session
-      login({ token, email: userEmail, role: userRole });
+      login({ token, refreshToken: res.data?.refresh_token, email: userEmail, role: userRole });
 
       // Redirect back if user was blocked by protected route
       const redirectTo = location.state?.from;